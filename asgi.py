@@ -0,0 +1,312 @@
+"""
+Async ASGI entry point for the Pokemon TCG Scanner
+Serves /, /scan, /health and /status without blocking on OpenAI or Google Sheets,
+so one process can hold hundreds of in-flight scans. Every other route falls through to the Flask app.
+
+Run with: uvicorn asgi:application --host 0.0.0.0 --port $PORT
+"""
+import asyncio
+import json
+import os
+import time
+from contextlib import asynccontextmanager
+from urllib.parse import quote
+
+import httpx
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Mount, Route
+
+import railway_deploy as scanner
+from card_database import content_version
+from database_refresher import DatabaseRefresher, DEFAULT_REFRESH_INTERVAL
+from image_preprocessing import preprocess_image
+from recognition_cache import image_key
+from single_flight import AsyncSingleFlight
+from uploads import SCAN_MAX_REQUEST_BYTES, SCAN_MAX_UPLOAD_BYTES, UploadTooLarge, megabytes
+from startup_timing import startup
+from upstream import UpstreamError, UpstreamUnavailable, google_sheets, openai_api
+from web_assets import PAGE_CACHE_CONTROL, conditional_response
+
+SHEETS_API_URL = os.environ.get('SHEETS_API_URL', 'https://sheets.googleapis.com/v4').rstrip('/')
+DRIVE_API_URL = os.environ.get('DRIVE_API_URL', 'https://www.googleapis.com/drive/v3').rstrip('/')
+ASYNC_MAX_CONNECTIONS = int(os.environ.get('ASYNC_MAX_CONNECTIONS', '200'))
+
+http_client = None
+_credentials = None
+# The async /scan path coalesces on the event loop; routes that fall through to Flask use scanner.scan_flights
+scan_flights = AsyncSingleFlight()
+
+
+async def analyze_card_async(image, mime_type='image/jpeg'):
+    """Non-blocking twin of railway_deploy.analyze_card_with_openai"""
+    try:
+        vision = await run_in_threadpool(scanner.vision_request, image, mime_type)
+        if vision is None:
+            return None
+        headers, body = vision
+        with body, scanner.openai_in_flight.track_inprogress(), scanner.scan_stages['openai_request'].time():
+            # A fresh body iterator per attempt, as a rate-limited call may be retried
+            response = await openai_api.arequest(http_client, 'POST', f'{scanner.OPENAI_BASE_URL}/chat/completions',
+                                                 headers=headers, content=body.aiter_bytes)
+        if response.status_code == 200:
+            return scanner.parse_vision_response(response.json())
+        if response.status_code >= 500:
+            raise UpstreamUnavailable(f'OpenAI answered HTTP {response.status_code}', status_code=response.status_code)
+        scanner.openai_errors_total.labels(response.status_code).inc()
+        return None
+    except UpstreamError as e:
+        scanner.openai_errors_total.labels(e.status_code or type(e).__name__).inc()
+        raise
+    except Exception as e:
+        scanner.openai_errors_total.labels(type(e).__name__).inc()
+        print(f"OpenAI analysis error: {e}")
+        return None
+
+
+async def recognize_card_async(image_bytes):
+    """Same stages as railway_deploy.recognize_card; CPU work goes to the thread pool"""
+    stages = scanner.scan_stages
+    with stages['cache_lookup'].time():
+        # Hashing a full-size upload and the SQLite read would stall every other scan on the loop
+        key, card_info = await run_in_threadpool(cached_recognition, image_bytes)
+    if card_info is not None:
+        return card_info, 'cache'
+
+    (card_info, source), shared = await scan_flights.do(key, lambda: recognize_uncached_async(image_bytes, key))
+    if shared:
+        scanner.scans_coalesced_total.inc()
+    return card_info, source
+
+
+def cached_recognition(image_bytes):
+    """(cache key, cached card info or None) for an upload"""
+    key = image_key(image_bytes, scanner.RECOGNITION_NAMESPACE)
+    return key, scanner.recognition_cache.get(key)
+
+
+async def recognize_uncached_async(image_bytes, key):
+    """Same stages as railway_deploy.recognize_uncached"""
+    stages = scanner.scan_stages
+    if scanner.card_recognizer is not None:
+        with stages['local_match'].time():
+            card_info = await run_in_threadpool(scanner.card_recognizer.match, image_bytes)
+        if card_info is not None:
+            await run_in_threadpool(scanner.recognition_cache.put, key, card_info)
+            return card_info, 'local'
+
+    prepared = await run_in_threadpool(preprocess_image, image_bytes)
+    stages['preprocess'].observe(prepared.elapsed_ms / 1000)
+    card_info = await analyze_card_async(prepared.data, prepared.mime_type)
+    if card_info and card_info != scanner.UNPARSED_CARD_INFO:
+        await run_in_threadpool(scanner.recognition_cache.put, key, card_info)
+    return card_info, 'openai'
+
+
+async def scan_image_async(image_bytes):
+    """Async twin of railway_deploy.scan_image"""
+    with scanner.scans_in_flight.track_inprogress(), scanner.scan_stages['total'].time():
+        source = 'none'
+        try:
+            card_info, source = await recognize_card_async(image_bytes)
+            if card_info:
+                with scanner.scan_stages['search_database'].time():
+                    matches = await run_in_threadpool(scanner.search_database, card_info)
+                if matches:
+                    scanner.scans_total.labels(source, 'matched').inc()
+                    return {'cards': matches, 'recognized_by': source}, 200
+            scanner.scans_total.labels(source, 'unmatched').inc()
+            return scanner.unrecognized_response(), 200
+        except UpstreamError as e:
+            scanner.scans_total.labels(source, 'unavailable').inc()
+            return scanner.upstream_error_response(e), 503
+        except Exception as e:
+            scanner.scans_total.labels(source, 'error').inc()
+            return {'error': f'Analysis failed: {str(e)}'}, 500
+
+
+def google_access_token():
+    """Service-account bearer token, refreshed when expired (blocking; call from the thread pool)"""
+    global _credentials
+    if _credentials is None:
+        from google.oauth2.service_account import Credentials
+        _credentials = Credentials.from_service_account_info(
+            json.loads(os.environ['GOOGLE_CREDENTIALS_JSON']),
+            scopes=[
+                'https://www.googleapis.com/auth/spreadsheets.readonly',
+                'https://www.googleapis.com/auth/drive.readonly'
+            ]
+        )
+    if not _credentials.valid:
+        from google.auth.transport.requests import Request
+        _credentials.refresh(Request())
+    return _credentials.token
+
+
+async def sheet_modified_time_async(headers):
+    """Drive modifiedTime, the same value gspread's get_lastUpdateTime() returns"""
+    try:
+        response = await google_sheets.arequest(http_client, 'GET', f'{DRIVE_API_URL}/files/{scanner.SPREADSHEET_ID}',
+                                                params={'fields': 'modifiedTime', 'supportsAllDrives': 'true'},
+                                                headers=headers)
+        if response.status_code == 200:
+            return response.json().get('modifiedTime')
+    except Exception as e:
+        print(f"Could not read spreadsheet modification time: {e}")
+    return None
+
+
+async def fetch_records_async(headers):
+    """First worksheet as get_all_records() would return it"""
+    from gspread.utils import fill_gaps, numericise_all, to_records
+
+    base = f'{SHEETS_API_URL}/spreadsheets/{scanner.SPREADSHEET_ID}'
+    response = await google_sheets.arequest(http_client, 'GET', base, params={'fields': 'sheets.properties.title'},
+                                            headers=headers)
+    response.raise_for_status()
+    title = response.json()['sheets'][0]['properties']['title']
+
+    response = await google_sheets.arequest(http_client, 'GET', f"{base}/values/{quote(title, safe='')}", headers=headers)
+    response.raise_for_status()
+    values = response.json().get('values', [])
+    if len(values) < 2:
+        return []
+    rows = fill_gaps(values)
+    return to_records(rows[0], [numericise_all(row) for row in rows[1:]])
+
+
+async def refresh_database_async():
+    """Async twin of railway_deploy.refresh_database; only the index build runs on a thread"""
+    if not os.environ.get('GOOGLE_CREDENTIALS_JSON'):
+        # Without credentials the only source is the CSV export, fetched once per interval
+        return await run_in_threadpool(scanner.refresh_database)
+    token = await run_in_threadpool(google_access_token)
+    headers = {'Authorization': f'Bearer {token}'}
+
+    modified_time = await sheet_modified_time_async(headers)
+    if scanner.sheet_unchanged(modified_time):
+        return False
+
+    started = time.perf_counter()
+    records = await fetch_records_async(headers)
+    if not records:
+        print("Google Sheets returned empty data")
+        return False
+
+    def build():
+        import pandas as pd
+        new_df = pd.DataFrame(records)
+        return scanner.apply_fetched_database(new_df, content_version(new_df), modified_time, started)
+    return await run_in_threadpool(build)
+
+
+async def refresh_loop(refresher, run_now):
+    if run_now:
+        await refresh_once(refresher)
+    if refresher.interval <= 0:
+        return
+    while True:
+        await asyncio.sleep(refresher.interval)
+        await refresh_once(refresher)
+
+
+async def refresh_once(refresher):
+    try:
+        if scanner.refresh_lock.acquire():
+            published = await refresh_database_async()
+        else:
+            # Another worker polls the sheet; follow the snapshots it writes
+            published = await run_in_threadpool(scanner.follow_snapshot)
+        refresher.record_check(published)
+    except Exception as e:
+        refresher.record_check(False, e)
+
+
+async def health(request):
+    return JSONResponse({'status': 'healthy', 'scanner_ready': scanner.scanner_ready})
+
+
+async def status(request):
+    payload = scanner.status_payload()
+    payload['scan_coalescing_async'] = scan_flights.stats()
+    return JSONResponse(payload)
+
+
+async def index(request):
+    status, body, headers = conditional_response(
+        scanner.current_page(), request.headers.get('accept-encoding'), request.headers.get('if-none-match'),
+        PAGE_CACHE_CONTROL
+    )
+    return Response(body, status, headers)
+
+
+async def scan(request):
+    if not scanner.scanner_ready:
+        return JSONResponse({'error': 'Database not loaded. Please check Google Sheets configuration.'}, 503)
+
+    # Refused before parsing; Starlette spools the parsed file parts to disk past 1 MB
+    if int(request.headers.get('content-length') or 0) > SCAN_MAX_REQUEST_BYTES:
+        return JSONResponse({'error': f'Request too large: at most {megabytes(SCAN_MAX_REQUEST_BYTES)}'}, 413)
+    form = await request.form()
+    file = form.get('file')
+    if file is None or isinstance(file, str):
+        return JSONResponse({'error': 'No file uploaded'}, 400)
+    if not file.filename:
+        return JSONResponse({'error': 'No file selected'}, 400)
+
+    with scanner.scan_stages['read_upload'].time():
+        image_bytes = await file.read(SCAN_MAX_UPLOAD_BYTES + 1)
+    if len(image_bytes) > SCAN_MAX_UPLOAD_BYTES:
+        return JSONResponse({'error': str(UploadTooLarge())}, 413)
+    result, status_code = await scan_image_async(image_bytes)
+    try:
+        quantity = scanner.requested_quantity(form.get('add_to_inventory'))
+        if quantity is not None:
+            await run_in_threadpool(scanner.queue_scanned_card, result, quantity)
+    except ValueError as e:
+        result['inventory_error'] = str(e)
+    return JSONResponse(result, status_code, scanner.retry_after_headers(result))
+
+
+@asynccontextmanager
+async def lifespan(app):
+    global http_client
+    http_client = httpx.AsyncClient(
+        limits=httpx.Limits(max_connections=ASYNC_MAX_CONNECTIONS, max_keepalive_connections=ASYNC_MAX_CONNECTIONS),
+        timeout=httpx.Timeout(30.0)
+    )
+
+    # Warm start from the preloaded database or the snapshot, then keep the sheet in sync from the event loop
+    loaded = scanner.database is not None or await run_in_threadpool(scanner.load_database_snapshot)
+    scanner.refresher = DatabaseRefresher(None, interval=DEFAULT_REFRESH_INTERVAL)
+    refresh_task = asyncio.create_task(refresh_loop(scanner.refresher, run_now=True))
+    scanner.start_inventory_flusher()
+    if not loaded:
+        startup.ready("No database snapshot; serving the loading page while Google Sheets loads")
+
+    try:
+        yield
+    finally:
+        refresh_task.cancel()
+        await http_client.aclose()
+
+
+startup.mark('asgi_import')
+
+# gunicorn.conf.py loads the database in the master before forking UvicornWorkers
+preload_database = scanner.preload_database
+
+application = Starlette(
+    routes=[
+        Route('/', index),
+        Route('/health', health),
+        Route('/healthz', health),
+        Route('/status', status),
+        Route('/scan', scan, methods=['POST']),
+        # Batch, job and any other routes are served by the Flask app on the thread pool
+        Mount('/', app=WSGIMiddleware(scanner.app)),
+    ],
+    lifespan=lifespan
+)
@@ -0,0 +1,71 @@
+"""
+Card Index Benchmark
+Per-query latency of the inverted card index versus the original df.iterrows() scan
+
+Usage: python benchmarks/bench_card_index.py [rows ...]
+"""
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from card_index import CardIndex
+from synthetic_catalog import generate_catalog, sample_queries
+
+
+def legacy_search(df, card_name):
+    """The pre-index search_database loop"""
+    matches = []
+    card_name = card_name.lower()
+    for _, row in df.iterrows():
+        db_name = str(row.get('Name', '')).lower()
+        if card_name and (card_name in db_name or db_name in card_name):
+            matches.append(row)
+            if len(matches) >= 3:
+                break
+    return matches
+
+
+def legacy_contains(df, card_name):
+    """The pre-index str.contains name filter"""
+    return df[df['Name'].astype(str).str.lower().str.contains(card_name.lower(), na=False, regex=False)]
+
+
+def time_queries(fn, queries):
+    timings = []
+    for query in queries:
+        start = time.perf_counter()
+        fn(query)
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    return timings[len(timings) // 2] * 1000, timings[int(len(timings) * 0.99)] * 1000
+
+
+def run(rows):
+    df = generate_catalog(rows)
+    queries = sample_queries(df, 200)
+
+    start = time.perf_counter()
+    index = CardIndex.from_dataframe(df, 'Name')
+    build_ms = (time.perf_counter() - start) * 1000
+
+    print(f"\n{rows:,} rows (index build {build_ms:.0f} ms)")
+    # Typeahead: every keystroke prefix of the sampled names
+    keystrokes = [q[:n] for q in queries[:50] for n in range(1, len(q) + 1)]
+    results = [
+        ('index.complete (typeahead, 20)', lambda q: index.complete(q, 20), keystrokes),
+        ('index.search (search_database)', lambda q: index.search(q, limit=3), queries),
+        ('index.contains (substring)', index.contains, queries),
+        ('str.contains scan', lambda q: legacy_contains(df, q), queries[:20]),
+        ('iterrows scan', lambda q: legacy_search(df, q), queries[:20]),
+    ]
+    for label, fn, sample in results:
+        p50, p99 = time_queries(fn, sample)
+        print(f"  {label:34s} p50 {p50:9.3f} ms   p99 {p99:9.3f} ms")
+
+
+if __name__ == '__main__':
+    sizes = [int(arg) for arg in sys.argv[1:]] or [19120, 200000]
+    for size in sizes:
+        run(size)
@@ -0,0 +1,87 @@
+"""
+Card Matcher Benchmark
+Top-1/top-3 accuracy and per-query latency of the ranked matcher on noisy vision output
+
+Usage: python benchmarks/bench_card_matcher.py [rows ...]
+"""
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from card_index import CardIndex
+from card_matcher import CardMatcher
+from synthetic_catalog import generate_catalog
+
+
+def misread(text, rng):
+    """Drop, swap or duplicate one character, like an OCR slip"""
+    if len(text) < 4:
+        return text
+    i = rng.randrange(1, len(text) - 1)
+    op = rng.random()
+    if op < 0.33:
+        return text[:i] + text[i + 1:]
+    if op < 0.66:
+        return text[:i - 1] + text[i] + text[i - 1] + text[i + 1:]
+    return text[:i] + text[i] + text[i:]
+
+
+def vision_outputs(df, count, seed=2):
+    """(row_id, card_info) pairs shaped like analyze_card_with_openai results"""
+    rng = random.Random(seed)
+    samples = []
+    for _ in range(count):
+        row_id = rng.randrange(len(df))
+        row = df.iloc[row_id]
+        number = str(row['Card Number'])
+        if '/' in number and rng.random() < 0.5:
+            left, right = number.split('/')
+            number = f"{int(left):03d}/{right}" if left.isdigit() else number
+        name = row['Name'] if rng.random() < 0.7 else misread(row['Name'], rng)
+        samples.append((row_id, {
+            'name': name,
+            'set': row['Set'] if rng.random() < 0.8 else row['Set'].upper(),
+            'number': number if rng.random() < 0.9 else '???',
+            'rarity': row['Rarity'] if rng.random() < 0.7 else 'Unknown',
+        }))
+    return samples
+
+
+def is_same_card(df, a, b):
+    """Synthetic catalogs repeat cards, so compare the fields instead of row ids"""
+    columns = ['Name', 'Set', 'Card Number']
+    return df.iloc[a][columns].tolist() == df.iloc[b][columns].tolist()
+
+
+def run(rows):
+    df = generate_catalog(rows)
+    start = time.perf_counter()
+    index = CardIndex.from_dataframe(df, 'Name')
+    matcher = CardMatcher.from_dataframe(df, index)
+    build_ms = (time.perf_counter() - start) * 1000
+
+    samples = vision_outputs(df, 300)
+    timings = []
+    top1 = top3 = 0
+    for row_id, card_info in samples:
+        start = time.perf_counter()
+        ranked = matcher.top_k(card_info, k=3)
+        timings.append(time.perf_counter() - start)
+        hits = [is_same_card(df, row_id, r) for r, _ in ranked]
+        top1 += bool(hits[:1] and hits[0])
+        top3 += any(hits)
+
+    timings.sort()
+    p50 = timings[len(timings) // 2] * 1000
+    p99 = timings[int(len(timings) * 0.99)] * 1000
+    print(f"{rows:>9,} rows  build {build_ms:7.0f} ms  top-1 {top1 / len(samples):6.1%}  "
+          f"top-3 {top3 / len(samples):6.1%}  p50 {p50:7.3f} ms  p99 {p99:7.3f} ms")
+
+
+if __name__ == '__main__':
+    sizes = [int(arg) for arg in sys.argv[1:]] or [19120, 200000]
+    for size in sizes:
+        run(size)
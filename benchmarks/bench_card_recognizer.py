@@ -0,0 +1,89 @@
+"""
+Card Recognizer Benchmark
+Lookup latency and local hit rate of the perceptual-hash recognizer on synthetic photos
+
+Usage: python benchmarks/bench_card_recognizer.py [references ...]
+"""
+import io
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageEnhance
+from card_recognizer import CardRecognizer, image_hash, MAX_MATCH_DISTANCE, MIN_MATCH_MARGIN
+
+CARD_SIZE = (245, 342)
+
+
+def reference_card(seed):
+    """A distinct card-like image: border, art box with random shapes, text bars"""
+    rng = random.Random(seed)
+    image = Image.new('RGB', CARD_SIZE, tuple(rng.randrange(256) for _ in range(3)))
+    draw = ImageDraw.Draw(image)
+    draw.rectangle([12, 40, 233, 190], fill=tuple(rng.randrange(256) for _ in range(3)))
+    for _ in range(6):
+        x, y = rng.randrange(12, 200), rng.randrange(40, 160)
+        w, h = rng.randrange(15, 90), rng.randrange(15, 90)
+        shape = draw.ellipse if rng.random() < 0.5 else draw.rectangle
+        shape([x, y, x + w, y + h], fill=tuple(rng.randrange(256) for _ in range(3)))
+    for row in range(5):
+        y = 205 + row * 24
+        draw.rectangle([20, y, 20 + rng.randrange(60, 205), y + 10], fill=tuple(rng.randrange(120) for _ in range(3)))
+    return image
+
+
+def phone_photo(image, rng):
+    """Upscale, re-light, crop slightly and JPEG-compress like a phone capture"""
+    w, h = image.size
+    dx, dy = int(w * rng.uniform(0, 0.03)), int(h * rng.uniform(0, 0.03))
+    photo = image.crop((dx, dy, w - dx, h - dy)).resize((w * 3, h * 3), Image.BICUBIC)
+    photo = ImageEnhance.Brightness(photo).enhance(rng.uniform(0.85, 1.15))
+    photo = photo.rotate(rng.uniform(-1.5, 1.5), resample=Image.BICUBIC, fillcolor=(255, 255, 255))
+    buffer = io.BytesIO()
+    photo.save(buffer, format='JPEG', quality=rng.randrange(60, 90))
+    return buffer.getvalue()
+
+
+def run(references, queries=200):
+    rng = random.Random(references)
+    start = time.perf_counter()
+    hashes = np.array([image_hash(reference_card(i)) for i in range(references)], dtype=np.uint8)
+    labels = [{'name': f"Card {i}", 'set': 'Synthetic', 'number': str(i), 'rarity': ''} for i in range(references)]
+    recognizer = CardRecognizer(hashes, labels)
+    build_s = time.perf_counter() - start
+
+    known = [(i, phone_photo(reference_card(i), rng)) for i in rng.sample(range(references), min(queries, references))]
+    unknown = [(None, phone_photo(reference_card(references + i), rng)) for i in range(queries // 4)]
+
+    timings = []
+    correct = wrong = fallthrough = false_accept = 0
+    for expected, photo in known + unknown:
+        t0 = time.perf_counter()
+        match = recognizer.match(photo)
+        timings.append(time.perf_counter() - t0)
+        if match is None:
+            fallthrough += expected is not None
+        elif expected is None:
+            false_accept += 1
+        elif match['number'] == str(expected):
+            correct += 1
+        else:
+            wrong += 1
+
+    timings.sort()
+    p50 = timings[len(timings) // 2] * 1000
+    p99 = timings[int(len(timings) * 0.99)] * 1000
+    print(f"{references:>7,} refs  build {build_s:6.1f}s  local hit {correct / len(known):6.1%}  "
+          f"wrong {wrong / len(known):5.1%}  to OpenAI {fallthrough / len(known):6.1%}  "
+          f"unknown accepted {false_accept / max(1, len(unknown)):5.1%}  p50 {p50:6.2f} ms  p99 {p99:6.2f} ms")
+
+
+if __name__ == '__main__':
+    print(f"thresholds: distance <= {MAX_MATCH_DISTANCE}, margin >= {MIN_MATCH_MARGIN}")
+    sizes = [int(arg) for arg in sys.argv[1:]] or [1000, 20000]
+    for size in sizes:
+        run(size)
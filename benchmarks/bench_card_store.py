@@ -0,0 +1,87 @@
+"""
+Card Store Benchmark
+Memory of the compact card store vs the sheet DataFrame, the cost of building one result row
+and of an exact set + number lookup
+
+Usage: python benchmarks/bench_card_store.py [rows ...]
+"""
+import gc
+import random
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import pandas as pd
+from card_store import CardStore
+from synthetic_catalog import generate_records
+
+
+def retained(build):
+    """(object, bytes still allocated on the Python heap once build() returns)"""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    value = build()
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return value, after - before
+
+
+def legacy_row(df, row_id):
+    """The result dict as search_database built it from the DataFrame"""
+    row = df.iloc[row_id]
+    return {
+        'name': str(row.get('Name', 'Unknown')),
+        'set': str(row.get('Set', 'Unknown Set')),
+        'number': str(row.get('Card Number', '???')),
+        'rarity': str(row.get('Rarity', 'Unknown')),
+        'market_price': str(row.get('Market Price', 'N/A')),
+        'tcgplayer_url': str(row.get('TCGPlayer Link', '')) if 'TCGPlayer Link' in row else '',
+    }
+
+
+def run(rows):
+    # Each structure is built from fresh records, so it is the only owner of its cells.
+    # get_all_records() output as pandas 2 stores it: one Python object per cell
+    df, df_bytes = retained(lambda: pd.DataFrame(generate_records(rows), dtype=object))
+    _, store_bytes = retained(lambda: CardStore.from_dataframe(pd.DataFrame(generate_records(rows), dtype=object)))
+    default_bytes = pd.DataFrame(generate_records(rows)).memory_usage(deep=True, index=False).sum()
+
+    start = time.perf_counter()
+    store = CardStore.from_dataframe(df)
+    build_ms = (time.perf_counter() - start) * 1000
+
+    rng = random.Random(rows)
+    ids = [rng.randrange(rows) for _ in range(2000)]
+    start = time.perf_counter()
+    for row_id in ids:
+        legacy_row(df, row_id)
+    legacy_us = (time.perf_counter() - start) / len(ids) * 1e6
+    start = time.perf_counter()
+    for row_id in ids:
+        store.record(row_id).to_dict()
+    store_us = (time.perf_counter() - start) / len(ids) * 1e6
+
+    keys = [(store.record(row_id).set, store.record(row_id).number) for row_id in ids]
+    start = time.perf_counter()
+    for set_name, number in keys:
+        store.lookup(set_name, number)
+    lookup_us = (time.perf_counter() - start) / len(keys) * 1e6
+
+    print(f"{rows:>9,} rows  DataFrame (object) {df_bytes / 2**20:7.1f} MB  "
+          f"DataFrame (pandas default) {default_bytes / 2**20:7.1f} MB  "
+          f"CardStore {store_bytes / 2**20:7.1f} MB ({store_bytes / df_bytes:5.1%}) built in {build_ms:6.0f} ms")
+    print(f"{'':>15}result row: DataFrame {legacy_us:6.1f} us  CardStore {store_us:5.2f} us  "
+          f"set + number lookup {lookup_us:5.2f} us")
+    for column, size in sorted(store.memory_usage().items(), key=lambda item: -item[1]):
+        print(f"{'':>15}{column:<16} {size / 2**20:7.2f} MB")
+
+
+if __name__ == '__main__':
+    sizes = [int(arg) for arg in sys.argv[1:]] or [19120, 500000]
+    for size in sizes:
+        run(size)
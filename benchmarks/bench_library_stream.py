@@ -0,0 +1,61 @@
+"""
+Library Export Benchmark
+Peak Python heap while streaming /library vs building the whole catalog as one JSON response
+
+Usage: python benchmarks/bench_library_stream.py [rows ...]
+"""
+import gc
+import json
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import railway_deploy
+from card_database import CardDatabase
+from synthetic_catalog import generate_catalog
+
+
+def measure(consume):
+    """(bytes produced, peak heap MB, seconds)"""
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    size = consume()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return size, peak / 2**20, elapsed
+
+
+def run(rows, client):
+    db = CardDatabase(generate_catalog(rows))
+    railway_deploy.database = db
+
+    def one_blob():
+        return len(json.dumps({'cards': [db.cards.record(r).to_dict() for r in range(len(db))]}))
+
+    def streamed(query, headers=None):
+        def consume():
+            response = client.get(f'/library{query}', headers=headers, buffered=False)
+            size = sum(len(chunk) for chunk in response.response)
+            response.close()
+            return size
+        return consume
+
+    print(f"{rows:>9,} rows")
+    for name, consume in (('one JSON blob', one_blob),
+                          ('NDJSON', streamed('')),
+                          ('NDJSON gzip', streamed('', {'Accept-Encoding': 'gzip'})),
+                          ('CSV', streamed('?format=csv'))):
+        size, peak, elapsed = measure(consume)
+        print(f"{'':>4}{name:<14} {size / 2**20:7.1f} MB out  peak heap {peak:7.1f} MB  {elapsed * 1000:7.0f} ms")
+
+
+if __name__ == '__main__':
+    sizes = [int(arg) for arg in sys.argv[1:]] or [19120, 200000]
+    client = railway_deploy.app.test_client()
+    for size in sizes:
+        run(size, client)
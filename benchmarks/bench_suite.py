@@ -0,0 +1,235 @@
+"""
+Benchmark Suite
+Load, index build and lookup timings (p50/p99) plus memory on synthetic catalogs, saved as JSON
+and optionally compared against a baseline run
+
+Usage: python benchmarks/bench_suite.py [--sizes 19120 100000 1000000] [--output bench_results.json]
+                                        [--baseline baseline.json] [--threshold 0.10]
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT))
+
+import numpy as np
+import pandas as pd
+
+import railway_deploy
+from bench_card_matcher import vision_outputs
+from card_database import CardDatabase, content_version
+from card_index import CardIndex
+from card_matcher import CardMatcher
+from card_store import CardStore
+from database_snapshot import load_snapshot, save_snapshot
+from synthetic_catalog import generate_records
+
+DEFAULT_SIZES = [19120, 100000, 1000000]
+# Fewest timed queries per lookup case, however slow it is
+MIN_SAMPLES = 100
+
+
+def elapsed_ms(fn):
+    """(fn(), milliseconds)"""
+    gc.collect()
+    start = time.perf_counter()
+    value = fn()
+    return value, round((time.perf_counter() - start) * 1000, 2)
+
+
+def latency(fn, queries, repeat=1, budget=None):
+    """p50/p99/mean of fn over the queries, run `repeat` times, in microseconds.
+    Slow cases stop after `budget` seconds once MIN_SAMPLES queries have run"""
+    timings = []
+    gc.collect()
+    deadline = time.perf_counter() + budget if budget else None
+    for query in queries * repeat:
+        start = time.perf_counter()
+        fn(query)
+        timings.append(time.perf_counter() - start)
+        if deadline is not None and start > deadline and len(timings) >= MIN_SAMPLES:
+            break
+    timings.sort()
+    return {
+        'samples': len(timings),
+        'p50_us': round(timings[len(timings) // 2] * 1e6, 2),
+        'p99_us': round(timings[min(len(timings) - 1, int(len(timings) * 0.99))] * 1e6, 2),
+        'mean_us': round(sum(timings) / len(timings) * 1e6, 2),
+    }
+
+
+def traced_mb(build):
+    """(value, MB still allocated once build() returns, peak MB while it ran)"""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    value = build()
+    gc.collect()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return value, round((current - before) / 2**20, 2), round((peak - before) / 2**20, 2)
+
+
+def substring_queries(names, count, rng):
+    """One word, or a word fragment, of a catalog name"""
+    queries = []
+    for _ in range(count):
+        words = rng.choice(names).split()
+        word = rng.choice(words)
+        queries.append(word if rng.random() < 0.5 or len(word) < 5 else word[1:-1])
+    return queries
+
+
+def run(rows, query_count, seed, repeat, budget):
+    print(f"\n{rows:,} rows")
+    records = generate_records(rows, seed=seed)
+    result = {'rows': rows, 'load': {}, 'memory': {}, 'lookups': {}}
+    load = result['load']
+
+    df, load['parse_records_ms'] = elapsed_ms(lambda: pd.DataFrame(records))
+    _, load['content_version_ms'] = elapsed_ms(lambda: content_version(df))
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'card_database.arrow')
+        _, load['snapshot_save_ms'] = elapsed_ms(lambda: save_snapshot(df, path, source='synthetic', version='bench'))
+        _, load['snapshot_load_ms'] = elapsed_ms(lambda: load_snapshot(path))
+    _, load['build_card_store_ms'] = elapsed_ms(lambda: CardStore.from_dataframe(df))
+    index, load['build_card_index_ms'] = elapsed_ms(lambda: CardIndex.from_dataframe(df, 'Name'))
+    _, load['build_card_matcher_ms'] = elapsed_ms(lambda: CardMatcher.from_dataframe(df, index))
+    del index
+    db, load['build_database_ms'] = elapsed_ms(lambda: CardDatabase(df, version='bench'))
+    for name, value in load.items():
+        print(f"  {name:28s} {value:10.1f} ms")
+
+    # Memory: the database is built from fresh records so it owns everything it holds. pandas may keep
+    # strings in Arrow buffers tracemalloc cannot see, so the DataFrame reports its own size
+    memory = result['memory']
+    memory['dataframe_mb'] = round(df.memory_usage(deep=True, index=False).sum() / 2**20, 2)
+    _, memory['database_mb'], memory['database_build_peak_mb'] = traced_mb(
+        lambda: CardDatabase(pd.DataFrame(generate_records(rows, seed=seed)), version='bench')
+    )
+    for name, value in memory.items():
+        print(f"  {name:28s} {value:10.1f} MB")
+
+    rng = random.Random(seed + 1)
+    row_ids = [rng.randrange(rows) for _ in range(query_count)]
+    names = df['Name'].tolist()
+    exact = [(df['Set'].iat[r], str(df['Card Number'].iat[r])) for r in row_ids]
+    substrings = substring_queries(names, query_count, rng)
+    vision = [card_info for _, card_info in vision_outputs(df, query_count, seed=seed + 2)]
+    keystrokes = [name[:n] for name in (names[r] for r in row_ids[:query_count // 10 or 1])
+                  for n in range(1, len(name) + 1)]
+
+    railway_deploy.database = db
+    del df
+
+    lookups = result['lookups']
+    cases = [
+        ('exact_set_number', lambda q: db.cards.lookup(*q), exact),
+        ('substring_contains', db.card_index.contains, substrings),
+        ('fuzzy_top_k', lambda q: db.card_matcher.top_k(q, k=3), vision),
+        ('search_database', railway_deploy.search_database, vision),
+        ('typeahead_complete', lambda q: db.card_index.complete(q, 20), keystrokes),
+    ]
+    for name, fn, queries in cases:
+        lookups[name] = latency(fn, queries, repeat, budget)
+        print(f"  {name:28s} p50 {lookups[name]['p50_us']:10.1f} us   p99 {lookups[name]['p99_us']:10.1f} us")
+    railway_deploy.database = None
+    return result
+
+
+def environment(args):
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                                text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    import pyarrow
+    return {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'git_commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'pyarrow': pyarrow.__version__,
+        'seed': args.seed,
+        'queries': args.queries,
+        'repeat': args.repeat,
+    }
+
+
+def flatten(results, prefix=''):
+    """{'19120.lookups.fuzzy_top_k.p50_us': 81.2, ...}; every value is lower-is-better"""
+    flat = {}
+    for key, value in results.items():
+        name = f'{prefix}{key}'
+        if isinstance(value, dict):
+            flat.update(flatten(value, f'{name}.'))
+        elif isinstance(value, (int, float)) and key not in ('rows', 'samples'):
+            flat[name] = value
+    return flat
+
+
+def compare(current, baseline, threshold):
+    """Print each metric against the baseline; returns the names that got slower or bigger than threshold"""
+    now, before = flatten(current['results']), flatten(baseline['results'])
+    regressions = []
+    print(f"\nCompared with baseline {baseline['meta'].get('git_commit')} ({baseline['meta'].get('timestamp')})")
+    for name in sorted(now.keys() & before.keys()):
+        if name.endswith('mean_us') or not before[name]:
+            continue
+        change = now[name] / before[name] - 1
+        flag = ''
+        if change > threshold:
+            flag = '  REGRESSION'
+            regressions.append(name)
+        elif change < -threshold:
+            flag = '  faster/smaller'
+        print(f"  {name:52s} {before[name]:12.2f} -> {now[name]:12.2f}  {change:+7.1%}{flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Time database loading and card lookups on synthetic catalogs')
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES)
+    parser.add_argument('--queries', type=int, default=500, help='queries per lookup benchmark')
+    parser.add_argument('--repeat', type=int, default=3, help='passes over the queries, pooled to steady p50/p99')
+    parser.add_argument('--budget', type=float, default=20, help='seconds per lookup case before sampling stops')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='bench_results.json')
+    parser.add_argument('--baseline', help='results JSON from an earlier run to compare against')
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help='relative slowdown or growth reported as a regression')
+    args = parser.parse_args(argv)
+
+    current = {'meta': environment(args), 'results': {}}
+    for rows in args.sizes:
+        current['results'][str(rows)] = run(rows, args.queries, args.seed, args.repeat, args.budget)
+
+    with open(args.output, 'w') as f:
+        json.dump(current, f, indent=2)
+    print(f"\nResults saved to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(current, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} metrics regressed by more than {args.threshold:.0%}")
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,115 @@
+"""
+Worker Memory Benchmark
+Per-worker unique and proportional memory with N gunicorn workers, each loading its own
+database vs the master preloading it once (gunicorn.conf.py)
+
+Usage: python benchmarks/bench_worker_memory.py [--workers 4] [--rows 19120]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT))
+
+import httpx
+
+from card_database import content_version
+from database_snapshot import save_snapshot
+from synthetic_catalog import generate_catalog
+
+APP_PORT = 8903
+
+# Without preloading, every worker runs warm_start() itself
+PER_WORKER_CONFIG = """
+def post_worker_init(worker):
+    import railway_deploy
+    railway_deploy.warm_start()
+"""
+
+
+def memory_kb(pid):
+    """(USS, PSS) in KB from smaps_rollup"""
+    fields = {}
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 2 and parts[1].isdigit():
+                fields[parts[0].rstrip(':')] = int(parts[1])
+    return fields.get('Private_Clean', 0) + fields.get('Private_Dirty', 0), fields.get('Pss', 0)
+
+
+def worker_pids(master_pid):
+    with open(f'/proc/{master_pid}/task/{master_pid}/children') as f:
+        return [int(pid) for pid in f.read().split()]
+
+
+def wait_ready(workers, timeout=120):
+    """Poll /status until every worker has answered ready"""
+    seen = {}
+    deadline = time.time() + timeout
+    while time.time() < deadline and len(seen) < workers:
+        try:
+            status = httpx.get(f'http://127.0.0.1:{APP_PORT}/status', timeout=2).json()
+            if status.get('scanner_ready'):
+                seen[status['worker_pid']] = status
+        except (httpx.HTTPError, ValueError):
+            pass
+        time.sleep(0.05)
+    return seen
+
+
+def run_mode(name, config, env, workers):
+    server = subprocess.Popen([
+        sys.executable, '-m', 'gunicorn', 'railway_deploy:app', '--bind', f'127.0.0.1:{APP_PORT}',
+        '--workers', str(workers), '--config', config
+    ], cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        statuses = wait_ready(workers)
+        if len(statuses) < workers:
+            print(f"{name:<12} only {len(statuses)} of {workers} workers became ready")
+            return
+        time.sleep(1)
+        pids = worker_pids(server.pid)
+        usage = [memory_kb(pid) for pid in pids]
+        uss = sum(u for u, _ in usage) / len(usage) / 1024
+        pss = sum(p for _, p in usage) / len(usage) / 1024
+        master_uss, master_pss = memory_kb(server.pid)
+        total = (sum(p for _, p in usage) + master_pss) / 1024
+        leaders = sum(bool(s.get('refresh_leader')) for s in statuses.values())
+        print(f"{name:<12} per worker USS {uss:6.1f} MB  PSS {pss:6.1f} MB  "
+              f"total PSS {total:6.1f} MB  sheets pollers {leaders}")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compare per-worker memory with and without preloading')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--rows', type=int, default=19120)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        snapshot = os.path.join(tmp, 'card_database.arrow')
+        catalog = generate_catalog(args.rows)
+        save_snapshot(catalog, snapshot, source='synthetic', version=content_version(catalog))
+        per_worker = os.path.join(tmp, 'per_worker.py')
+        with open(per_worker, 'w') as f:
+            f.write(PER_WORKER_CONFIG)
+
+        env = dict(os.environ, DATABASE_SNAPSHOT_PATH=snapshot, RECOGNITION_CACHE_PATH='',
+                   DATABASE_REFRESH_INTERVAL='0', REFERENCE_INDEX_PATH=os.path.join(tmp, 'none.npz'))
+        env.pop('GOOGLE_CREDENTIALS_JSON', None)
+
+        print(f"{args.workers} workers, {args.rows:,} cards")
+        run_mode('per-worker', per_worker, env, args.workers)
+        run_mode('preloaded', str(ROOT / 'gunicorn.conf.py'), env, args.workers)
+
+
+if __name__ == '__main__':
+    main()
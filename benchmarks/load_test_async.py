@@ -0,0 +1,147 @@
+"""
+Serving Mode Load Test
+Throughput and latency of /scan under gunicorn sync workers vs the async ASGI app,
+with OpenAI replaced by a stub that answers after a fixed delay
+
+Usage: python benchmarks/load_test_async.py [--requests 400] [--concurrency 200] [--latency-ms 800]
+"""
+import argparse
+import asyncio
+import io
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT))
+
+import httpx
+from PIL import Image
+
+from card_database import content_version
+from database_snapshot import save_snapshot
+from synthetic_catalog import generate_catalog
+
+STUB_PORT = 8901
+APP_PORT = 8902
+
+# gunicorn only runs warm_start under __main__, so load the snapshot once the worker is up
+GUNICORN_CONFIG = """
+def post_worker_init(worker):
+    import railway_deploy
+    railway_deploy.load_database_snapshot()
+"""
+
+
+def upload(seed):
+    """A small, unique JPEG so the recognition cache never answers"""
+    rng = random.Random(seed)
+    image = Image.new('RGB', (126, 176), tuple(rng.randrange(256) for _ in range(3)))
+    image.putpixel((rng.randrange(126), rng.randrange(176)), (rng.randrange(256), 0, 0))
+    buffer = io.BytesIO()
+    image.save(buffer, format='JPEG', quality=80)
+    return buffer.getvalue()
+
+
+def wait_for(url, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if httpx.get(url, timeout=1).status_code == 200:
+                return True
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    return False
+
+
+async def drive(total, concurrency):
+    """Fire `total` scans with at most `concurrency` in flight; returns (latencies, errors, seconds)"""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, errors = [], 0
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=300) as client:
+        async def one(i):
+            nonlocal errors
+            async with semaphore:
+                start = time.perf_counter()
+                try:
+                    response = await client.post(f'http://127.0.0.1:{APP_PORT}/scan',
+                                                 files={'file': (f'{i}.jpg', upload(i), 'image/jpeg')})
+                    if response.status_code != 200 or 'cards' not in response.json():
+                        errors += 1
+                except httpx.HTTPError:
+                    errors += 1
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(total)))
+        return sorted(latencies), errors, time.perf_counter() - start
+
+
+def run_mode(name, command, env, total, concurrency):
+    server = subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        if not wait_for(f'http://127.0.0.1:{APP_PORT}/health'):
+            print(f"{name:<14} failed to start")
+            return
+        latencies, errors, elapsed = asyncio.run(drive(total, concurrency))
+        p50 = latencies[len(latencies) // 2] * 1000
+        p99 = latencies[int(len(latencies) * 0.99)] * 1000
+        print(f"{name:<14} {total / elapsed:7.1f} req/s  p50 {p50:7.0f} ms  p99 {p99:7.0f} ms  errors {errors}")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compare sync and async serving modes under load')
+    parser.add_argument('--requests', type=int, default=400)
+    parser.add_argument('--concurrency', type=int, default=200)
+    parser.add_argument('--latency-ms', type=float, default=800)
+    parser.add_argument('--threads', type=int, default=8, help='gunicorn threads in sync mode')
+    parser.add_argument('--rows', type=int, default=19120)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        snapshot = os.path.join(tmp, 'card_database.arrow')
+        catalog = generate_catalog(args.rows)
+        save_snapshot(catalog, snapshot, source='synthetic', version=content_version(catalog))
+        config = os.path.join(tmp, 'gunicorn_conf.py')
+        with open(config, 'w') as f:
+            f.write(GUNICORN_CONFIG)
+
+        env = dict(os.environ,
+                   OPENAI_API_KEY='stub',
+                   OPENAI_BASE_URL=f'http://127.0.0.1:{STUB_PORT}/v1',
+                   DATABASE_SNAPSHOT_PATH=snapshot,
+                   DATABASE_REFRESH_INTERVAL='0',
+                   RECOGNITION_CACHE_PATH='',
+                   REFERENCE_INDEX_PATH=os.path.join(tmp, 'none.npz'))
+        env.pop('GOOGLE_CREDENTIALS_JSON', None)
+
+        stub = subprocess.Popen([sys.executable, str(Path(__file__).parent / 'stub_servers.py'),
+                                 '--port', str(STUB_PORT), '--latency-ms', str(args.latency_ms)],
+                                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            time.sleep(1.5)
+            print(f"{args.requests} scans, {args.concurrency} concurrent, OpenAI stub at {args.latency_ms:.0f} ms")
+            run_mode(f'sync ({args.threads} thr)', [
+                sys.executable, '-m', 'gunicorn', 'railway_deploy:app', '--bind', f'127.0.0.1:{APP_PORT}',
+                '--workers', '1', '--threads', str(args.threads), '--timeout', '300', '--config', config
+            ], env, args.requests, args.concurrency)
+            run_mode('async', [
+                sys.executable, '-m', 'uvicorn', 'asgi:application', '--host', '127.0.0.1',
+                '--port', str(APP_PORT), '--log-level', 'warning'
+            ], env, args.requests, args.concurrency)
+        finally:
+            stub.terminate()
+            stub.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,214 @@
+"""
+Scan Load Test
+Drives concurrent /scan traffic at the app with OpenAI and the Google Sheets export replaced by local stubs
+(benchmarks/stub_servers.py), and reports throughput, tail latency and error rates
+
+Usage: python benchmarks/load_test_scan.py [--server sync|async] [--requests 300] [--concurrency 50]
+                                           [--latency-ms 800] [--error-rate 0.02] [--rate-limit-rate 0.05]
+       python benchmarks/load_test_scan.py --command "gunicorn wsgi:application --bind 127.0.0.1:{port}"
+       python benchmarks/load_test_scan.py --url http://127.0.0.1:5000   # an app you started yourself
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import shlex
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT))
+
+import httpx
+
+from load_test_async import upload, wait_for
+
+STUB_PORT = 8901
+APP_PORT = 8904
+
+# {port} is filled in; WEB_CONCURRENCY and GUNICORN_CMD_ARGS from the environment still apply
+SERVER_COMMANDS = {
+    'sync': 'gunicorn railway_deploy:app --config gunicorn.conf.py --bind 127.0.0.1:{port} --threads 8 --timeout 120',
+    'async': 'uvicorn asgi:application --host 127.0.0.1 --port {port} --log-level warning',
+}
+
+
+def wait_ready(base_url, timeout=120):
+    """Poll /status until the app has loaded its database from the Sheets stub"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            status = httpx.get(f'{base_url}/status', timeout=2).json()
+            if status.get('scanner_ready'):
+                return status
+        except (httpx.HTTPError, ValueError):
+            pass
+        time.sleep(0.25)
+    return None
+
+
+def percentile(ordered, share):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * share))] if ordered else 0.0
+
+
+async def drive(base_url, total, concurrency, repeat_ratio, seed):
+    """Fire `total` scans with at most `concurrency` in flight; returns per-request outcomes and wall time"""
+    rng = random.Random(seed)
+    images = [upload(seed * 1000003 + i) for i in range(total)]
+    # Some uploads repeat an earlier image, as rescans of the same card do
+    for i in range(1, total):
+        if rng.random() < repeat_ratio:
+            images[i] = images[rng.randrange(i)]
+
+    semaphore = asyncio.Semaphore(concurrency)
+    outcomes = []
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=300) as client:
+        async def one(i):
+            async with semaphore:
+                start = time.perf_counter()
+                status, error, source = None, None, None
+                try:
+                    response = await client.post(f'{base_url}/scan',
+                                                 files={'file': (f'{i}.jpg', images[i], 'image/jpeg')})
+                    status = response.status_code
+                    body = response.json()
+                    error = body.get('error')
+                    source = body.get('recognized_by')
+                except (httpx.HTTPError, ValueError) as e:
+                    error = type(e).__name__
+                outcomes.append({'seconds': time.perf_counter() - start, 'status': status,
+                                 'error': error, 'recognized_by': source})
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(total)))
+        return outcomes, time.perf_counter() - start
+
+
+def summarize(outcomes, elapsed):
+    latencies = sorted(o['seconds'] for o in outcomes)
+    failed = [o for o in outcomes if o['status'] != 200 or o['error']]
+    return {
+        'requests': len(outcomes),
+        'seconds': round(elapsed, 2),
+        'throughput_rps': round(len(outcomes) / elapsed, 2),
+        'latency_ms': {
+            'p50': round(percentile(latencies, 0.50) * 1000, 1),
+            'p90': round(percentile(latencies, 0.90) * 1000, 1),
+            'p99': round(percentile(latencies, 0.99) * 1000, 1),
+            'max': round(latencies[-1] * 1000, 1) if latencies else 0.0,
+        },
+        'error_rate': round(len(failed) / len(outcomes), 4) if outcomes else 0.0,
+        'status_codes': dict(Counter(str(o['status']) for o in outcomes)),
+        'errors': dict(Counter(o['error'] for o in failed if o['error'])),
+        'recognized_by': dict(Counter(o['recognized_by'] for o in outcomes if o['recognized_by'])),
+    }
+
+
+def report(summary, stub_counters):
+    latency = summary['latency_ms']
+    print(f"\n{summary['requests']} scans in {summary['seconds']} s: {summary['throughput_rps']} req/s")
+    print(f"latency p50 {latency['p50']:.0f} ms  p90 {latency['p90']:.0f} ms  "
+          f"p99 {latency['p99']:.0f} ms  max {latency['max']:.0f} ms")
+    print(f"error rate {summary['error_rate']:.1%}  status codes {summary['status_codes']}")
+    for error, count in sorted(summary['errors'].items(), key=lambda item: -item[1]):
+        print(f"  {count:6d}  {error}")
+    print(f"recognized by {summary['recognized_by']}")
+    if stub_counters:
+        print(f"stub: {stub_counters['openai_requests']} OpenAI calls "
+              f"({stub_counters['openai_rate_limited']} answered 429, {stub_counters['openai_errors']} answered 500), "
+              f"{stub_counters['sheets_requests']} Sheets exports")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Load test /scan against local OpenAI and Sheets stubs')
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument('--server', choices=sorted(SERVER_COMMANDS), default='sync',
+                        help='start the app the way this mode is deployed')
+    target.add_argument('--command', help='start the app with this command; {port} is replaced')
+    target.add_argument('--url', help='load an app that is already running (point it at the stubs yourself)')
+    parser.add_argument('--requests', type=int, default=300)
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--repeat-ratio', type=float, default=0.0, help='share of uploads that repeat an image')
+    parser.add_argument('--latency-ms', type=float, default=800, help='OpenAI stub delay')
+    parser.add_argument('--jitter-ms', type=float, default=200)
+    parser.add_argument('--error-rate', type=float, default=0.0, help='share of OpenAI calls answered 500')
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help='share of OpenAI calls answered 429')
+    parser.add_argument('--sheets-latency-ms', type=float, default=200)
+    parser.add_argument('--sheets-error-rate', type=float, default=0.0)
+    parser.add_argument('--sheets-rate-limit-rate', type=float, default=0.0)
+    parser.add_argument('--refresh-interval', type=int, default=0, help='DATABASE_REFRESH_INTERVAL for the app')
+    parser.add_argument('--rows', type=int, default=19120)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write the summary as JSON')
+    args = parser.parse_args(argv)
+
+    stub_url = f'http://127.0.0.1:{STUB_PORT}'
+    stub = subprocess.Popen([
+        sys.executable, str(Path(__file__).parent / 'stub_servers.py'), '--port', str(STUB_PORT),
+        '--latency-ms', str(args.latency_ms), '--jitter-ms', str(args.jitter_ms),
+        '--error-rate', str(args.error_rate), '--rate-limit-rate', str(args.rate_limit_rate),
+        '--sheets-latency-ms', str(args.sheets_latency_ms), '--sheets-error-rate', str(args.sheets_error_rate),
+        '--sheets-rate-limit-rate', str(args.sheets_rate_limit_rate), '--rows', str(args.rows),
+    ], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    server = None
+    try:
+        if not wait_for(f'{stub_url}/stub/stats'):
+            print("Stub server failed to start")
+            return 1
+
+        with tempfile.TemporaryDirectory() as tmp:
+            base_url = args.url.rstrip('/') if args.url else f'http://127.0.0.1:{APP_PORT}'
+            if not args.url:
+                command = (args.command or SERVER_COMMANDS[args.server]).format(port=APP_PORT)
+                # The app's own OpenAI rate limit would cap throughput; set OPENAI_REQUESTS_PER_MINUTE to test it
+                env = dict(os.environ,
+                           OPENAI_REQUESTS_PER_MINUTE=os.environ.get('OPENAI_REQUESTS_PER_MINUTE', '1000000'),
+                           OPENAI_API_KEY='stub',
+                           OPENAI_BASE_URL=f'{stub_url}/v1',
+                           SHEETS_EXPORT_BASE_URL=stub_url,
+                           DATABASE_SNAPSHOT_PATH=os.path.join(tmp, 'card_database.arrow'),
+                           DATABASE_REFRESH_INTERVAL=str(args.refresh_interval),
+                           RECOGNITION_CACHE_PATH='',
+                           REFERENCE_INDEX_PATH=os.path.join(tmp, 'none.npz'))
+                env.pop('GOOGLE_CREDENTIALS_JSON', None)
+                print(f"Starting: {command}")
+                server = subprocess.Popen(shlex.split(command), cwd=ROOT, env=env,
+                                          stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+            status = wait_ready(base_url)
+            if status is None:
+                print(f"App at {base_url} never became ready")
+                return 1
+            print(f"App ready with {status.get('database_size')} cards from {status.get('data_source')}")
+            httpx.post(f'{stub_url}/stub/reset')
+
+            print(f"{args.requests} scans, {args.concurrency} concurrent, OpenAI stub "
+                  f"{args.latency_ms:.0f}±{args.jitter_ms:.0f} ms, {args.error_rate:.0%} 500s, "
+                  f"{args.rate_limit_rate:.0%} 429s")
+            outcomes, elapsed = asyncio.run(drive(base_url, args.requests, args.concurrency,
+                                                  args.repeat_ratio, args.seed))
+            summary = summarize(outcomes, elapsed)
+            stub_counters = httpx.get(f'{stub_url}/stub/stats').json()['counters']
+            report(summary, stub_counters)
+
+            if args.output:
+                with open(args.output, 'w') as f:
+                    json.dump({'config': vars(args), 'summary': summary, 'stub': stub_counters}, f, indent=2)
+                print(f"Summary saved to {args.output}")
+        return 0
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+        stub.terminate()
+        stub.wait()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
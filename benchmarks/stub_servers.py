@@ -0,0 +1,143 @@
+"""
+Stub Servers
+Stand-ins for the OpenAI chat completions API and the Google Sheets CSV export, with configurable
+latency, server errors and 429s, so the app can be load tested offline
+
+Usage: python benchmarks/stub_servers.py [--port 8901] [--latency-ms 800] [--error-rate 0] [--rate-limit-rate 0]
+                                         [--sheets-latency-ms 200] [--rows 19120]
+Point the app at it with OPENAI_BASE_URL=http://127.0.0.1:8901/v1 and SHEETS_EXPORT_BASE_URL=http://127.0.0.1:8901
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+from contextlib import asynccontextmanager
+from pathlib import Path
+
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+# Every knob can also be set from the environment, which is how a parent process configures an import
+STUB = {
+    'latency_ms': float(os.environ.get('STUB_LATENCY_MS', '800')),
+    'jitter_ms': float(os.environ.get('STUB_JITTER_MS', '0')),
+    'error_rate': float(os.environ.get('STUB_ERROR_RATE', '0')),
+    'rate_limit_rate': float(os.environ.get('STUB_RATE_LIMIT_RATE', '0')),
+    'sheets_latency_ms': float(os.environ.get('STUB_SHEETS_LATENCY_MS', '200')),
+    'sheets_error_rate': float(os.environ.get('STUB_SHEETS_ERROR_RATE', '0')),
+    'sheets_rate_limit_rate': float(os.environ.get('STUB_SHEETS_RATE_LIMIT_RATE', '0')),
+    'rows': int(os.environ.get('STUB_ROWS', '19120')),
+}
+STUB_CARD = {'name': 'Charizard', 'set': 'Base Set', 'number': '4/102', 'rarity': 'Holo Rare'}
+
+counters = {'openai_requests': 0, 'openai_errors': 0, 'openai_rate_limited': 0,
+            'sheets_requests': 0, 'sheets_errors': 0, 'sheets_rate_limited': 0}
+_catalog = {'csv': None, 'cards': [STUB_CARD]}
+_rng = random.Random(0)
+
+
+def load_catalog():
+    """The synthetic sheet served as CSV, and its cards for vision answers to name"""
+    if _catalog['csv'] is None:
+        from synthetic_catalog import generate_catalog
+        df = generate_catalog(STUB['rows'])
+        _catalog['csv'] = df.to_csv(index=False).encode('utf-8')
+        _catalog['cards'] = [
+            {'name': name, 'set': set_name, 'number': str(number), 'rarity': rarity}
+            for name, set_name, number, rarity in zip(df['Name'], df['Set'], df['Card Number'], df['Rarity'])
+        ]
+    return _catalog
+
+
+async def delay(latency_ms, jitter_ms=0):
+    await asyncio.sleep(max(0.0, latency_ms + _rng.uniform(-jitter_ms, jitter_ms)) / 1000)
+
+
+def injected_failure(prefix, error_rate, rate_limit_rate):
+    """A 429 or 500 response, drawn at the configured rates, or None"""
+    roll = _rng.random()
+    if roll < rate_limit_rate:
+        counters[f'{prefix}_rate_limited'] += 1
+        return JSONResponse({'error': {'message': 'Rate limit reached (stub)', 'type': 'rate_limit_exceeded',
+                                       'code': 'rate_limit_exceeded'}}, 429, headers={'Retry-After': '1'})
+    if roll < rate_limit_rate + error_rate:
+        counters[f'{prefix}_errors'] += 1
+        return JSONResponse({'error': {'message': 'Internal error (stub)', 'type': 'server_error'}}, 500)
+    return None
+
+
+async def chat_completions(request):
+    await request.body()
+    counters['openai_requests'] += 1
+    await delay(STUB['latency_ms'], STUB['jitter_ms'])
+    failure = injected_failure('openai', STUB['error_rate'], STUB['rate_limit_rate'])
+    if failure is not None:
+        return failure
+    card = _rng.choice(_catalog['cards'])
+    return JSONResponse({
+        'id': 'chatcmpl-stub',
+        'object': 'chat.completion',
+        'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': json.dumps(card)},
+                     'finish_reason': 'stop'}],
+    })
+
+
+async def sheets_export(request):
+    counters['sheets_requests'] += 1
+    await delay(STUB['sheets_latency_ms'])
+    failure = injected_failure('sheets', STUB['sheets_error_rate'], STUB['sheets_rate_limit_rate'])
+    if failure is not None:
+        return failure
+    return Response(load_catalog()['csv'], media_type='text/csv')
+
+
+async def stats(request):
+    return JSONResponse({'config': STUB, 'counters': counters})
+
+
+async def reset(request):
+    for key in counters:
+        counters[key] = 0
+    return JSONResponse(counters)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    load_catalog()
+    yield
+
+
+app = Starlette(routes=[
+    Route('/v1/chat/completions', chat_completions, methods=['POST']),
+    Route('/spreadsheets/d/{spreadsheet_id}/export', sheets_export),
+    Route('/stub/stats', stats),
+    Route('/stub/reset', reset, methods=['POST']),
+], lifespan=lifespan)
+
+
+def main(argv=None):
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description='Run the OpenAI and Google Sheets stub server')
+    parser.add_argument('--port', type=int, default=8901)
+    parser.add_argument('--latency-ms', type=float, default=STUB['latency_ms'], help='OpenAI response delay')
+    parser.add_argument('--jitter-ms', type=float, default=STUB['jitter_ms'], help='+/- uniform delay jitter')
+    parser.add_argument('--error-rate', type=float, default=STUB['error_rate'], help='share of OpenAI 500s')
+    parser.add_argument('--rate-limit-rate', type=float, default=STUB['rate_limit_rate'],
+                        help='share of OpenAI 429s')
+    parser.add_argument('--sheets-latency-ms', type=float, default=STUB['sheets_latency_ms'])
+    parser.add_argument('--sheets-error-rate', type=float, default=STUB['sheets_error_rate'])
+    parser.add_argument('--sheets-rate-limit-rate', type=float, default=STUB['sheets_rate_limit_rate'])
+    parser.add_argument('--rows', type=int, default=STUB['rows'], help='cards in the served sheet')
+    args = parser.parse_args(argv)
+    STUB.update({key: getattr(args, key) for key in STUB})
+    uvicorn.run(app, host='127.0.0.1', port=args.port, log_level='warning')
+
+
+if __name__ == '__main__':
+    main()
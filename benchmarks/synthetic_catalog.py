@@ -0,0 +1,76 @@
+"""
+Synthetic Card Catalog
+Generates sheet-shaped card DataFrames of any size for benchmarks
+"""
+import random
+import pandas as pd
+
+POKEMON = [
+    'Bulbasaur', 'Ivysaur', 'Venusaur', 'Charmander', 'Charmeleon', 'Charizard', 'Squirtle',
+    'Wartortle', 'Blastoise', 'Caterpie', 'Pikachu', 'Raichu', 'Sandshrew', 'Nidoking',
+    'Clefairy', 'Vulpix', 'Ninetales', 'Jigglypuff', 'Zubat', 'Oddish', 'Psyduck', 'Growlithe',
+    'Arcanine', 'Poliwrath', 'Abra', 'Alakazam', 'Machamp', 'Gengar', 'Onix', 'Hitmonlee',
+    'Lickitung', 'Chansey', 'Kangaskhan', 'Scyther', 'Magikarp', 'Gyarados', 'Lapras', 'Ditto',
+    'Eevee', 'Vaporeon', 'Jolteon', 'Flareon', 'Snorlax', 'Articuno', 'Zapdos', 'Moltres',
+    'Dragonite', 'Mewtwo', 'Mew', 'Lugia', 'Ho-Oh', 'Umbreon', 'Espeon', 'Tyranitar',
+    'Rayquaza', 'Gardevoir', 'Lucario', 'Garchomp', 'Darkrai', 'Greninja', 'Mimikyu',
+    'Zacian', 'Zamazenta', 'Eternatus', 'Miraidon', 'Koraidon', 'Pokémon Center Lady',
+    "Professor's Research", "Boss's Orders", 'Ultra Ball', 'Rare Candy', 'Switch',
+]
+SUFFIXES = ['', '', '', '', ' ex', ' EX', ' GX', ' V', ' VMAX', ' VSTAR', ' Prime', ' LV.X', ' δ']
+PREFIXES = ['', '', '', '', '', 'Dark ', 'Radiant ', 'Shining ', "Team Rocket's ", 'Alolan ', 'Galarian ']
+SETS = [
+    ('Base Set', 102, ''), ('Jungle', 64, ''), ('Fossil', 62, ''), ('Team Rocket', 82, ''),
+    ('Neo Genesis', 111, ''), ('Skyridge', 144, ''), ('EX Dragon', 97, ''), ('Diamond & Pearl', 130, ''),
+    ('HeartGold & SoulSilver', 123, ''), ('Black & White', 114, ''), ('XY Evolutions', 108, ''),
+    ('Sun & Moon', 149, ''), ('Hidden Fates', 68, 'SV'), ('Sword & Shield', 202, ''),
+    ('SWSH Black Star Promos', 0, 'SWSH'), ('Evolving Skies', 203, ''), ('Brilliant Stars', 172, 'TG'),
+    ('Crown Zenith', 159, 'GG'), ('Scarlet & Violet', 198, ''), ('Paldea Evolved', 193, ''),
+    ('Obsidian Flames', 197, ''), ('151', 165, ''), ('Paradox Rift', 182, ''), ('Temporal Forces', 162, ''),
+]
+RARITIES = ['Common', 'Uncommon', 'Rare', 'Rare Holo', 'Rare Holo EX', 'Ultra Rare', 'Secret Rare',
+            'Illustration Rare', 'Special Illustration Rare', 'Promo']
+
+
+def card_number(rng, set_size, prefix):
+    """Card numbers in the formats the sheet actually contains"""
+    if prefix:
+        return f"{prefix}{rng.randint(1, 250):0{rng.choice([2, 3])}d}"
+    number = rng.randint(1, int(set_size * 1.1) + 1)
+    style = rng.random()
+    if style < 0.6:
+        return f"{number}/{set_size}"
+    if style < 0.8:
+        return f"{number:03d}/{set_size}"
+    return str(number)
+
+
+def generate_records(rows, seed=0):
+    """List of sheet-style record dicts, as worksheet.get_all_records() would return"""
+    rng = random.Random(seed)
+    records = []
+    for _ in range(rows):
+        set_name, set_size, prefix = rng.choice(SETS)
+        name = f"{rng.choice(PREFIXES)}{rng.choice(POKEMON)}{rng.choice(SUFFIXES)}"
+        number = card_number(rng, set_size or 200, prefix)
+        records.append({
+            'Name': name,
+            'Set': set_name,
+            'Card Number': number,
+            'Rarity': rng.choice(RARITIES),
+            'Market Price': f"${rng.lognormvariate(0, 1.5):.2f}",
+            'TCGPlayer Link': f"https://www.tcgplayer.com/product/{rng.randint(10000, 999999)}",
+        })
+    return records
+
+
+def generate_catalog(rows, seed=0):
+    """Sheet-shaped DataFrame with object columns, matching pd.DataFrame(records)"""
+    return pd.DataFrame(generate_records(rows, seed=seed))
+
+
+def sample_queries(df, count, seed=1):
+    """Card names drawn from the catalog, the way the vision model would report them"""
+    rng = random.Random(seed)
+    names = df['Name'].tolist()
+    return [rng.choice(names) for _ in range(count)]
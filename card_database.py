@@ -0,0 +1,49 @@
+"""
+Card Database
+Immutable, fully built version of the card table that request handlers read from
+"""
+import hashlib
+import time
+from card_index import CardIndex
+from card_matcher import CardMatcher
+from card_store import CardStore
+
+
+def content_version(df):
+    """Short content hash of a card DataFrame, stable across reloads of unchanged data"""
+    digest = hashlib.sha256()
+    digest.update('\x1f'.join(str(c) for c in df.columns).encode('utf-8'))
+    digest.update(df.to_csv(index=False, header=False).encode('utf-8'))
+    return digest.hexdigest()[:16]
+
+
+class CardDatabase:
+    def __init__(self, df, version=None, source='google_sheets', modified_time=None,
+                 name_column='Name', set_column='Set', number_column='Card Number', rarity_column='Rarity',
+                 price_column='Market Price', url_column='TCGPlayer Link'):
+        # Everything is built before the object is published, so readers never see a partial table.
+        # The DataFrame itself is not kept; rows are served from the compact store
+        self.cards = CardStore.from_dataframe(
+            df, name_column=name_column, set_column=set_column, number_column=number_column,
+            rarity_column=rarity_column, price_column=price_column, url_column=url_column
+        )
+        self.card_index = CardIndex.from_dataframe(df, name_column)
+        self.card_matcher = CardMatcher.from_dataframe(
+            df, self.card_index, set_column=set_column, number_column=number_column, rarity_column=rarity_column
+        )
+        self.version = version or content_version(df)
+        self.source = source
+        self.modified_time = modified_time
+        self.loaded_at = time.time()
+
+    def __len__(self):
+        return len(self.cards)
+
+    def status(self):
+        """Version details for /status"""
+        return {
+            'data_version': self.version,
+            'data_source': self.source,
+            'sheet_modified_time': self.modified_time,
+            'last_refresh': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(self.loaded_at)),
+        }
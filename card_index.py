@@ -0,0 +1,215 @@
+"""
+Card Index
+Inverted token and trigram index over card names, plus a sorted prefix index for autocomplete,
+built once when the database loads
+"""
+import re
+import unicodedata
+from bisect import bisect_left
+from itertools import islice
+import numpy as np
+
+NGRAM_SIZE = 3
+MAX_CONTAINED_QUERY_LENGTH = 80
+
+_separators = re.compile(r'[\W_]+')
+_empty_postings = np.empty(0, dtype=np.int32)
+
+
+def normalize_name(value):
+    """Lowercase, strip accents and collapse punctuation so 'Pokémon-EX' matches 'pokemon ex'"""
+    if value is None:
+        return ''
+    text = str(value)
+    # ASCII has no accents to strip, and most names are ASCII
+    if not text.isascii():
+        text = unicodedata.normalize('NFKD', text)
+        text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    return _separators.sub(' ', text.lower()).strip()
+
+
+def name_tokens(normalized):
+    """Split a normalized name into its word tokens"""
+    return normalized.split()
+
+
+def name_ngrams(normalized, size=NGRAM_SIZE):
+    """Character n-grams of a normalized name, including those that span spaces"""
+    return {normalized[i:i + size] for i in range(len(normalized) - size + 1)}
+
+
+def word_starts(normalized):
+    """Offsets where each word of a normalized name begins"""
+    return [0] + [i + 1 for i, ch in enumerate(normalized) if ch == ' ']
+
+
+def _freeze(postings):
+    return {key: np.asarray(rows, dtype=np.int32) for key, rows in postings.items()}
+
+
+def _merge_runs(postings):
+    """Posting arrays from lists of sorted row arrays, one per distinct name"""
+    return {key: runs[0] if len(runs) == 1 else np.sort(np.concatenate(runs)) for key, runs in postings.items()}
+
+
+class CardIndex:
+    def __init__(self, names):
+        # Positional row ids line up with df.iloc, so callers can materialize only the hits
+        # Reprints share names, so each distinct name is normalized and tokenized once
+        normalized = {}
+        self.names = [normalized[name] if name in normalized else normalized.setdefault(name, normalize_name(name))
+                      for name in names]
+        self.size = len(self.names)
+
+        exact = {}
+        for row_id, name in enumerate(self.names):
+            if name:
+                exact.setdefault(name, []).append(row_id)
+        # Rows are appended in order, so exact posting lists are already sorted; the others merge them
+        self.exact_postings = _freeze(exact)
+        tokens = {}
+        ngrams = {}
+        for name, rows in self.exact_postings.items():
+            for token in set(name_tokens(name)):
+                tokens.setdefault(token, []).append(rows)
+            for gram in name_ngrams(name):
+                ngrams.setdefault(gram, []).append(rows)
+        self.token_postings = _merge_runs(tokens)
+        self.ngram_postings = _merge_runs(ngrams)
+
+        # Sorted word-start suffixes of the distinct names for autocomplete: whole names first,
+        # then later words, so 'char' lists 'charizard' before 'dark charizard'
+        self.prefix_tiers = []
+        for inner in (False, True):
+            entries = sorted((name[start:], name) for name in exact for start in word_starts(name) if (start > 0) == inner)
+            self.prefix_tiers.append(([suffix for suffix, _ in entries], [name for _, name in entries]))
+
+    @classmethod
+    def from_dataframe(cls, df, name_column):
+        """Build the index from one column of the card DataFrame"""
+        if df is None or name_column not in df.columns:
+            return cls([])
+        return cls(df[name_column].tolist())
+
+    def __len__(self):
+        return self.size
+
+    def contains(self, query, limit=None):
+        """Row ids whose name contains the query, in sheet order"""
+        query = normalize_name(query)
+        if not query:
+            return _empty_postings
+
+        if len(query) < NGRAM_SIZE:
+            # Too short for the n-gram index; still cheaper than materializing rows
+            rows = (i for i, name in enumerate(self.names) if query in name)
+            return np.fromiter(islice(rows, limit), dtype=np.int32)
+
+        postings = []
+        for gram in name_ngrams(query):
+            rows = self.ngram_postings.get(gram)
+            if rows is None:
+                return _empty_postings
+            postings.append(rows)
+
+        postings.sort(key=len)
+        candidates = postings[0]
+        for rows in postings[1:]:
+            if len(candidates) == 0:
+                break
+            candidates = np.intersect1d(candidates, rows, assume_unique=True)
+
+        # Shared n-grams don't guarantee adjacency, so confirm the substring
+        names = self.names
+        rows = (i for i in candidates.tolist() if query in names[i])
+        return np.fromiter(islice(rows, limit), dtype=np.int32)
+
+    def contained_in(self, query):
+        """Row ids whose whole name appears inside the query, in sheet order"""
+        query = normalize_name(query)[:MAX_CONTAINED_QUERY_LENGTH]
+        if not query:
+            return _empty_postings
+
+        found = []
+        length = len(query)
+        for start in range(length):
+            if query[start] == ' ':
+                continue
+            for end in range(start + 1, length + 1):
+                rows = self.exact_postings.get(query[start:end])
+                if rows is not None:
+                    found.append(rows)
+        if not found:
+            return _empty_postings
+        return np.unique(np.concatenate(found))
+
+    def tokens(self, query):
+        """Row ids sharing at least one whole word with the query, in sheet order"""
+        found = [self.token_postings[t] for t in set(name_tokens(normalize_name(query))) if t in self.token_postings]
+        if not found:
+            return _empty_postings
+        return np.unique(np.concatenate(found))
+
+    def prefix_range(self, query, tier=0):
+        """[lo, hi) of one tier's prefix entries that start with the normalized query"""
+        keys = self.prefix_tiers[tier][0]
+        lo = bisect_left(keys, query)
+        return lo, bisect_left(keys, query + '\U0010ffff', lo)
+
+    def complete(self, query, limit, resume=None, distinct=False):
+        """One page of rows whose name has a word starting with the query.
+
+        Names starting with the query come first, then names with a later word starting with it,
+        each alphabetically. Returns (row_ids, resume): pass resume back for the next page; it is
+        None after the last one. With distinct, each name contributes only its first row.
+        """
+        query = normalize_name(query)
+        rows = []
+        if not query:
+            return rows, None
+        tier, position, skip = resume or (0, None, 0)
+        while tier < len(self.prefix_tiers):
+            names = self.prefix_tiers[tier][1]
+            lo, hi = self.prefix_range(query, tier)
+            position = lo if position is None else min(max(position, lo), hi)
+            while position < hi:
+                name = names[position]
+                if self._listed_at(query, tier, position):
+                    name_rows = self.exact_postings[name][:1] if distinct else self.exact_postings[name]
+                    taken = name_rows[skip:skip + limit - len(rows)]
+                    rows.extend(taken.tolist())
+                    skip += len(taken)
+                    if len(rows) >= limit:
+                        if skip < len(name_rows):
+                            return rows, (tier, position, skip)
+                        return rows, self._next_entry(query, tier, position + 1)
+                position += 1
+                skip = 0
+            tier, position, skip = tier + 1, None, 0
+        return rows, None
+
+    def _listed_at(self, query, tier, position):
+        """True if the entry lists its name; names already listed in the first tier, or under an earlier
+        word, are skipped"""
+        keys, names = self.prefix_tiers[tier]
+        name = names[position]
+        first = 0 if name.startswith(query) else name.find(' ' + query) + 1
+        return len(name) - len(keys[position]) == first
+
+    def _next_entry(self, query, tier, position):
+        """Resume point after a full page, or None when no listed entries are left"""
+        while tier < len(self.prefix_tiers):
+            lo, hi = self.prefix_range(query, tier)
+            for position in range(max(position, lo), hi):
+                if self._listed_at(query, tier, position):
+                    return tier, position, 0
+            tier, position = tier + 1, 0
+        return None
+
+    def search(self, query, limit=None):
+        """Substring match in either direction, mirroring the original name comparison"""
+        # The first `limit` of the union always come from the first `limit` of each side
+        rows = np.union1d(self.contains(query, limit=limit), self.contained_in(query))
+        if limit is not None:
+            rows = rows[:limit]
+        return rows
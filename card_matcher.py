@@ -0,0 +1,149 @@
+"""
+Card Matcher
+Ranks catalog rows against the vision model's name/set/number/rarity output
+"""
+import heapq
+import re
+import numpy as np
+from card_index import normalize_name, name_ngrams
+
+NAME_WEIGHT = 0.55
+NUMBER_WEIGHT = 0.25
+SET_WEIGHT = 0.15
+RARITY_WEIGHT = 0.05
+MIN_MATCH_SCORE = 0.35
+# Beyond this many candidates, narrow with argpartition before the heap
+HEAP_CANDIDATE_LIMIT = 256
+
+_number_pattern = re.compile(r'([a-z]*)\s*-?0*(\d+)([a-z]*)')
+_no_candidates = np.empty(0, dtype=np.int64)
+_no_scores = np.empty(0, dtype=np.float32)
+
+
+def normalize_card_number(value):
+    """Canonical card number: '4/102', '004' and '4' all become '4'; 'SWSH123' becomes 'swsh123'"""
+    if value is None:
+        return ''
+    text = str(value).strip().lower()
+    if not text or text in ('???', 'unknown', 'n/a'):
+        return ''
+    text = text.split('/')[0].strip()
+    match = _number_pattern.search(text)
+    if not match:
+        return text.replace(' ', '')
+    prefix, digits, suffix = match.groups()
+    return f"{prefix}{int(digits)}{suffix}"
+
+
+def text_similarity(a, b):
+    """Dice coefficient over character trigrams of two normalized strings"""
+    if not a or not b:
+        return 0.0
+    if a == b:
+        return 1.0
+    grams_a = name_ngrams(a)
+    grams_b = name_ngrams(b)
+    if not grams_a or not grams_b:
+        return 1.0 if a in b or b in a else 0.0
+    return 2.0 * len(grams_a & grams_b) / (len(grams_a) + len(grams_b))
+
+
+def _encode(values):
+    """Categorical codes plus the distinct values they index"""
+    codes = {}
+    encoded = np.fromiter((codes.setdefault(value, len(codes)) for value in values), dtype=np.int32, count=len(values))
+    return encoded, list(codes)
+
+
+def _normalized(values, normalize):
+    """normalize() applied to each row, calling it once per distinct value"""
+    cache = {}
+    return [cache[value] if value in cache else cache.setdefault(value, normalize(value)) for value in values]
+
+
+class CardMatcher:
+    def __init__(self, card_index, sets, numbers, rarities):
+        self.card_index = card_index
+        self.size = len(card_index)
+
+        # Per-row trigram counts turn shared-gram totals into a Dice score in one vector op
+        self.name_gram_counts = np.array(
+            _normalized(card_index.names, lambda name: len(name_ngrams(name))), dtype=np.float32
+        ).reshape(self.size)
+
+        self.number_codes, number_values = _encode(_normalized(numbers, normalize_card_number))
+        self.number_lookup = {value: code for code, value in enumerate(number_values) if value}
+        self.set_codes, self.set_values = _encode(_normalized(sets, normalize_name))
+        self.rarity_codes, self.rarity_values = _encode(_normalized(rarities, normalize_name))
+
+    @classmethod
+    def from_dataframe(cls, df, card_index, set_column='Set', number_column='Card Number', rarity_column='Rarity'):
+        """Build matcher arrays from the card DataFrame, aligned with the index's row ids"""
+        def column(name):
+            if df is not None and name in df.columns:
+                return df[name].tolist()
+            return [''] * len(card_index)
+        return cls(card_index, column(set_column), column(number_column), column(rarity_column))
+
+    def __len__(self):
+        return self.size
+
+    def _name_scores(self, name):
+        """Trigram Dice similarity against every row, zero where no gram is shared"""
+        grams = name_ngrams(name)
+        postings = [self.card_index.ngram_postings[g] for g in grams if g in self.card_index.ngram_postings]
+        if not postings:
+            return None
+        shared = np.bincount(np.concatenate(postings), minlength=self.size).astype(np.float32)
+        return 2.0 * shared / (len(grams) + self.name_gram_counts)
+
+    def _category_scores(self, query, values):
+        """Similarity of the query to each distinct category value"""
+        return np.array([text_similarity(query, value) for value in values], dtype=np.float32)
+
+    def score(self, card_info):
+        """Candidate row ids and their combined scores"""
+        name = normalize_name(card_info.get('name'))
+        number = normalize_card_number(card_info.get('number'))
+
+        name_scores = self._name_scores(name) if name else None
+        number_code = self.number_lookup.get(number, -1) if number else -1
+
+        if name_scores is not None:
+            candidate_mask = name_scores > 0
+            if number_code >= 0:
+                candidate_mask |= self.number_codes == number_code
+            candidates = np.flatnonzero(candidate_mask)
+        elif number_code >= 0:
+            candidates = np.flatnonzero(self.number_codes == number_code)
+        else:
+            return _no_candidates, _no_scores
+
+        scores = np.zeros(len(candidates), dtype=np.float32)
+        if name_scores is not None:
+            scores += NAME_WEIGHT * name_scores[candidates]
+        if number_code >= 0:
+            scores += NUMBER_WEIGHT * (self.number_codes[candidates] == number_code)
+
+        set_name = normalize_name(card_info.get('set'))
+        if set_name:
+            set_scores = self._category_scores(set_name, self.set_values)
+            scores += SET_WEIGHT * set_scores[self.set_codes[candidates]]
+
+        rarity = normalize_name(card_info.get('rarity'))
+        if rarity:
+            rarity_scores = self._category_scores(rarity, self.rarity_values)
+            scores += RARITY_WEIGHT * rarity_scores[self.rarity_codes[candidates]]
+
+        return candidates, scores
+
+    def top_k(self, card_info, k=3, min_score=MIN_MATCH_SCORE):
+        """Best k (row_id, score) pairs, highest score first and sheet order on ties"""
+        candidates, scores = self.score(card_info)
+        keep = np.flatnonzero(scores >= min_score)
+        if len(keep) > HEAP_CANDIDATE_LIMIT:
+            # Every candidate tied with the HEAP_CANDIDATE_LIMIT-th best stays, so ties still go by sheet order
+            boundary = -np.partition(-scores[keep], HEAP_CANDIDATE_LIMIT - 1)[HEAP_CANDIDATE_LIMIT - 1]
+            keep = keep[scores[keep] >= boundary]
+        best = heapq.nlargest(k, keep.tolist(), key=lambda i: (scores[i], -candidates[i]))
+        return [(int(candidates[i]), float(scores[i])) for i in best]
@@ -0,0 +1,206 @@
+"""
+Card Recognizer
+Local perceptual-hash recognition against a directory of reference card images
+
+Build the index offline, then the app answers confident matches without calling OpenAI:
+    python card_recognizer.py build reference_images/ [--output data/reference_index.npz]
+    python card_recognizer.py query photo.jpg
+
+Reference images are labelled by an optional labels.csv in the directory
+(filename,name,set,number,rarity) or by file names of the form Name__Set__Number.jpg.
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+import time
+from pathlib import Path
+import numpy as np
+
+DEFAULT_INDEX_PATH = os.environ.get('REFERENCE_INDEX_PATH', 'data/reference_index.npz')
+# Hamming distances are out of HASH_BITS; a match must be close and clearly ahead of the next card
+HASH_BITS = 128
+MAX_MATCH_DISTANCE = int(os.environ.get('LOCAL_MATCH_MAX_DISTANCE', '18'))
+MIN_MATCH_MARGIN = int(os.environ.get('LOCAL_MATCH_MIN_MARGIN', '10'))
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.webp', '.bmp', '.gif'}
+
+_dct_size = 32
+_dct_matrix = np.cos(
+    np.pi / (2 * _dct_size) * np.outer(np.arange(_dct_size), 2 * np.arange(_dct_size) + 1)
+).astype(np.float32)
+
+
+def _open_image(image):
+    """Grayscale, EXIF-upright PIL image from bytes, a path or an Image"""
+    from PIL import Image, ImageOps
+    if isinstance(image, (bytes, bytearray)):
+        image = Image.open(io.BytesIO(image))
+    elif not isinstance(image, Image.Image):
+        image = Image.open(image)
+    # JPEGs can be decoded straight at reduced scale; the hashes only need 32x32
+    image.draft('L', (_dct_size * 2, _dct_size * 2))
+    return ImageOps.exif_transpose(image).convert('L')
+
+
+def image_hash(image):
+    """128-bit perceptual hash (64-bit dHash + 64-bit DCT pHash) as 16 uint8 bytes"""
+    from PIL import Image
+    gray = _open_image(image)
+
+    # dHash: brightness gradient between horizontal neighbours
+    small = np.asarray(gray.resize((9, 8), Image.LANCZOS), dtype=np.int16)
+    dhash = (small[:, 1:] > small[:, :-1]).ravel()
+
+    # pHash: low-frequency DCT coefficients against their median
+    pixels = np.asarray(gray.resize((_dct_size, _dct_size), Image.LANCZOS), dtype=np.float32)
+    dct = _dct_matrix @ pixels @ _dct_matrix.T
+    low = dct[:8, :8].ravel()
+    phash = low > np.median(low[1:])
+
+    return np.packbits(np.concatenate([dhash, phash]))
+
+
+def hamming_distances(hashes, query):
+    """Bit distance from one packed hash to every row of a packed hash matrix"""
+    return np.unpackbits(np.bitwise_xor(hashes, query), axis=1).sum(axis=1, dtype=np.int32)
+
+
+def read_labels(directory):
+    """filename -> card info, from labels.csv if present"""
+    labels_file = Path(directory) / 'labels.csv'
+    if not labels_file.exists():
+        return {}
+    with open(labels_file, newline='', encoding='utf-8') as f:
+        return {
+            row['filename']: {key: row.get(key, '') or '' for key in ('name', 'set', 'number', 'rarity')}
+            for row in csv.DictReader(f)
+        }
+
+
+def label_from_filename(path):
+    """Card info encoded as Name__Set__Number in the file name"""
+    parts = Path(path).stem.split('__')
+    return {
+        'name': parts[0].replace('_', ' '),
+        'set': parts[1].replace('_', ' ') if len(parts) > 1 else '',
+        'number': parts[2].replace('-', '/') if len(parts) > 2 else '',
+        'rarity': parts[3].replace('_', ' ') if len(parts) > 3 else '',
+    }
+
+
+class CardRecognizer:
+    def __init__(self, hashes, labels):
+        self.hashes = np.asarray(hashes, dtype=np.uint8).reshape(-1, HASH_BITS // 8)
+        self.labels = labels
+        # Reference photos of the same printing share a card id, so the runner-up is a different card
+        card_keys = {}
+        self.card_ids = np.array(
+            [card_keys.setdefault((l['name'], l['set'], l['number']), len(card_keys)) for l in labels],
+            dtype=np.int32
+        )
+
+    def __len__(self):
+        return len(self.labels)
+
+    @classmethod
+    def build(cls, directory):
+        """Hash every reference image under a directory"""
+        directory = Path(directory)
+        labels_by_file = read_labels(directory)
+        hashes, labels = [], []
+        for path in sorted(directory.rglob('*')):
+            if path.suffix.lower() not in IMAGE_EXTENSIONS:
+                continue
+            try:
+                hashes.append(image_hash(path))
+            except Exception as e:
+                print(f"Skipping {path}: {e}")
+                continue
+            relative = str(path.relative_to(directory))
+            labels.append(labels_by_file.get(relative) or labels_by_file.get(path.name) or label_from_filename(path))
+        return cls(np.array(hashes, dtype=np.uint8), labels)
+
+    def save(self, path=DEFAULT_INDEX_PATH):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'wb') as f:
+            np.savez(f, hashes=self.hashes, labels=np.array(json.dumps(self.labels)))
+
+    @classmethod
+    def load(cls, path=DEFAULT_INDEX_PATH):
+        """Load a saved index, or None if there is none"""
+        try:
+            if not Path(path).exists():
+                return None
+            with np.load(path) as data:
+                recognizer = cls(data['hashes'], json.loads(str(data['labels'])))
+            print(f"✓ Local card recognizer loaded: {len(recognizer)} reference images")
+            return recognizer
+        except Exception as e:
+            print(f"Failed to load reference index: {e}")
+            return None
+
+    def nearest(self, image):
+        """(label, distance, margin) for the closest reference card, or None for an empty index"""
+        if len(self) == 0:
+            return None
+        distances = hamming_distances(self.hashes, image_hash(image))
+        best = int(np.argmin(distances))
+        others = distances[self.card_ids != self.card_ids[best]]
+        runner_up = int(others.min()) if len(others) else HASH_BITS
+        return self.labels[best], int(distances[best]), runner_up - int(distances[best])
+
+    def match(self, image, max_distance=MAX_MATCH_DISTANCE, min_margin=MIN_MATCH_MARGIN):
+        """Card info for a confident match, or None when the upload is ambiguous"""
+        try:
+            result = self.nearest(image)
+        except Exception as e:
+            print(f"Local recognition error: {e}")
+            return None
+        if result is None:
+            return None
+        label, distance, margin = result
+        if distance <= max_distance and margin >= min_margin:
+            return dict(label)
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Build or query the local card reference index')
+    commands = parser.add_subparsers(dest='command', required=True)
+    build_cmd = commands.add_parser('build', help='hash a directory of reference card images')
+    build_cmd.add_argument('directory')
+    build_cmd.add_argument('--output', default=DEFAULT_INDEX_PATH)
+    query_cmd = commands.add_parser('query', help='look up one image against the index')
+    query_cmd.add_argument('image')
+    query_cmd.add_argument('--index', default=DEFAULT_INDEX_PATH)
+    args = parser.parse_args(argv)
+
+    if args.command == 'build':
+        start = time.perf_counter()
+        recognizer = CardRecognizer.build(args.directory)
+        recognizer.save(args.output)
+        print(f"Indexed {len(recognizer)} reference images in {time.perf_counter() - start:.1f}s -> {args.output}")
+        return 0
+
+    recognizer = CardRecognizer.load(args.index)
+    if recognizer is None:
+        print(f"No reference index at {args.index}")
+        return 1
+    start = time.perf_counter()
+    result = recognizer.nearest(args.image)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    if result is None:
+        print("Reference index is empty")
+        return 1
+    label, distance, margin = result
+    confident = distance <= MAX_MATCH_DISTANCE and margin >= MIN_MATCH_MARGIN
+    print(json.dumps({'card': label, 'distance': distance, 'margin': margin,
+                      'confident': confident, 'lookup_ms': round(elapsed_ms, 3)}, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,295 @@
+"""
+Card Store
+Compact column store of the card table: categorical text columns, prices parsed once into cents,
+and an exact (set, number) lookup
+"""
+import math
+import os
+import re
+import sys
+import numpy as np
+from card_index import normalize_name
+from card_matcher import normalize_card_number
+
+# Columns with fewer distinct values than this share of rows are stored as codes + distinct values
+CATEGORICAL_MAX_RATIO = 0.5
+
+# Fields a client can ask for when projecting card rows
+CARD_FIELDS = ('name', 'set', 'number', 'rarity', 'market_price', 'price_cents', 'tcgplayer_url')
+
+_price_pattern = re.compile(r'-?\d+(?:\.\d+)?')
+_no_rows = ()
+
+
+def parse_price_cents(value):
+    """Cents from '$1,234.56', '1.5' or 1.5; NaN when the cell holds no price"""
+    if value is None or isinstance(value, bool):
+        return math.nan
+    if isinstance(value, (int, float, np.number)):
+        return math.nan if math.isnan(value) else round(float(value) * 100)
+    match = _price_pattern.search(str(value).replace(',', ''))
+    return round(float(match.group()) * 100) if match else math.nan
+
+
+def format_price(cents):
+    return f"${cents / 100:.2f}"
+
+
+def _smallest_code_dtype(count):
+    for dtype in (np.uint8, np.uint16, np.uint32):
+        if count <= np.iinfo(dtype).max + 1:
+            return dtype
+    return np.int64
+
+
+def _key_ids(column, normalize, ids, size):
+    """Per-row int64 id of each normalized value, registering new keys in ids; -1 where it normalizes to ''"""
+    def key_id(value):
+        key = normalize(value)
+        return ids.setdefault(key, len(ids)) if key else -1
+    if column.codes is not None:
+        # Normalize each distinct value once, not once per row
+        return np.array([key_id(value) for value in column.values], dtype=np.int64)[column.codes]
+    return np.fromiter((key_id(column[row_id]) for row_id in range(size)), dtype=np.int64, count=size)
+
+
+class CardColumn:
+    """One text column: codes into distinct values when values repeat, otherwise one packed UTF-8 buffer"""
+    __slots__ = ('codes', 'values', 'prefix', 'buffer', 'offsets')
+
+    def __init__(self, cells):
+        distinct = {}
+        codes = [distinct.setdefault(cell, len(distinct)) for cell in cells]
+        self.codes = self.values = self.prefix = self.buffer = self.offsets = None
+        if len(distinct) <= max(1, len(cells) * CATEGORICAL_MAX_RATIO):
+            self.codes = np.array(codes, dtype=_smallest_code_dtype(len(distinct)))
+            self.values = list(distinct)
+            return
+
+        # Mostly unique (links, ids): a shared prefix plus suffixes back to back, no object per cell
+        self.prefix = os.path.commonprefix(list(distinct)) if cells else ''
+        encoded = [cell[len(self.prefix):].encode('utf-8') for cell in cells]
+        self.buffer = b''.join(encoded)
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(e) for e in encoded], out=offsets[1:])
+        self.offsets = offsets.astype(np.uint32) if len(self.buffer) <= np.iinfo(np.uint32).max else offsets
+
+    def __getitem__(self, row_id):
+        if self.codes is not None:
+            return self.values[self.codes[row_id]]
+        start, end = self.offsets[row_id], self.offsets[row_id + 1]
+        return self.prefix + self.buffer[start:end].decode('utf-8')
+
+    def nbytes(self):
+        """Approximate retained size: arrays plus each distinct value once"""
+        if self.codes is None:
+            return sys.getsizeof(self.buffer) + self.offsets.nbytes + sys.getsizeof(self.prefix)
+        return self.codes.nbytes + sys.getsizeof(self.values) + sum(sys.getsizeof(v) for v in self.values)
+
+
+class CardRecord:
+    """Read-only view of one row; fields are looked up on access"""
+    __slots__ = ('store', 'row_id')
+
+    def __init__(self, store, row_id):
+        self.store = store
+        self.row_id = row_id
+
+    @property
+    def name(self):
+        return self.store.value(self.row_id, self.store.name_column, 'Unknown')
+
+    @property
+    def set(self):
+        return self.store.value(self.row_id, self.store.set_column, 'Unknown Set')
+
+    @property
+    def number(self):
+        return self.store.value(self.row_id, self.store.number_column, '???')
+
+    @property
+    def number_key(self):
+        """Normalized card number, as used for matching"""
+        return self.store.number_key(self.row_id)
+
+    @property
+    def rarity(self):
+        return self.store.value(self.row_id, self.store.rarity_column, 'Unknown')
+
+    @property
+    def price_cents(self):
+        """Market price in cents, or None when the sheet has no price"""
+        cents = self.store.price_cents[self.row_id]
+        return None if math.isnan(cents) else int(cents)
+
+    @property
+    def market_price(self):
+        return self.store.price_text(self.row_id)
+
+    @property
+    def tcgplayer_url(self):
+        return self.store.value(self.row_id, self.store.url_column, '')
+
+    def get(self, column, default=None):
+        if column == self.store.price_column:
+            return self.market_price
+        return self.store.value(self.row_id, column, default)
+
+    def project(self, fields):
+        """Only the requested CARD_FIELDS, in the order given"""
+        return {field: getattr(self, field) for field in fields}
+
+    def to_dict(self):
+        """Card fields in the shape the scan endpoints return"""
+        return {
+            'name': self.name,
+            'set': self.set,
+            'number': self.number,
+            'rarity': self.rarity,
+            'market_price': self.market_price,
+            'tcgplayer_url': self.tcgplayer_url,
+        }
+
+
+class CardStore:
+    def __init__(self, column_names, cells, name_column='Name', set_column='Set', number_column='Card Number',
+                 rarity_column='Rarity', price_column='Market Price', url_column='TCGPlayer Link',
+                 set_code_column='Set Code'):
+        # cells maps column name -> list of display strings, all the same length and in sheet order
+        self.column_names = list(column_names)
+        self.name_column = name_column
+        self.set_column = set_column
+        self.number_column = number_column
+        self.rarity_column = rarity_column
+        self.price_column = price_column
+        self.url_column = url_column
+        self.size = len(next(iter(cells.values()))) if cells else 0
+
+        prices = cells.get(price_column)
+        if prices is not None:
+            # Prices repeat a lot ('$0.25'), so each distinct cell is parsed once
+            parsed = {}
+            self.price_cents = np.array(
+                [parsed[p] if p in parsed else parsed.setdefault(p, parse_price_cents(p)) for p in prices],
+                dtype=np.float32
+            )
+            # Keep only the display strings that formatting the cents would not reproduce
+            self.price_overrides = {
+                row_id: text for row_id, text in enumerate(prices)
+                if math.isnan(self.price_cents[row_id]) or format_price(float(self.price_cents[row_id])) != text
+            }
+        else:
+            self.price_cents = np.full(self.size, np.nan, dtype=np.float32)
+            self.price_overrides = None
+
+        self.columns = {
+            column: CardColumn(values) for column, values in cells.items() if column != price_column
+        }
+
+        # Normalized number for each distinct display number; a packed (unique) column normalizes on access
+        numbers = self.columns.get(number_column)
+        self.number_keys = None
+        if numbers is not None and numbers.codes is not None:
+            self.number_keys = [normalize_card_number(n) for n in numbers.values]
+
+        self._build_set_number_index(set_code_column)
+
+    def _build_set_number_index(self, set_code_column):
+        """Group rows by (normalized set name or code, normalized number) into sorted runs of one array"""
+        # Set and number keys are hashed separately; their id pair is one integer, so the index
+        # holds no Python object per card: key ids -> position in a sorted array -> run of row ids
+        self.set_ids = {}
+        self.number_ids = {}
+        self.pair_keys = np.empty(0, dtype=np.int64)
+        self.pair_offsets = np.zeros(1, dtype=np.int64)
+        self.pair_rows = np.empty(0, dtype=np.int32)
+        numbers = self.columns.get(self.number_column)
+        set_columns = [self.columns[c] for c in (self.set_column, set_code_column) if c in self.columns]
+        if numbers is None or not set_columns or self.size == 0:
+            return
+
+        number_ids = _key_ids(numbers, normalize_card_number, self.number_ids, self.size)
+        pairs = []
+        for column in set_columns:
+            set_ids = _key_ids(column, normalize_name, self.set_ids, self.size)
+            rows = np.flatnonzero((set_ids >= 0) & (number_ids >= 0))
+            pairs.append((set_ids[rows] * len(self.number_ids) + number_ids[rows]) * self.size + rows)
+        # Sorted by key then row, and a set name equal to its code adds no duplicate rows
+        pairs = np.unique(np.concatenate(pairs))
+        keys, rows = np.divmod(pairs, self.size)
+        self.pair_keys, starts = np.unique(keys, return_index=True)
+        self.pair_offsets = np.append(starts, len(rows))
+        self.pair_rows = rows.astype(np.int32)
+
+    @classmethod
+    def from_dataframe(cls, df, **columns):
+        """Build from the sheet DataFrame, stringifying cells the way the result builder used to"""
+        if df is None:
+            return cls([], {}, **columns)
+        cells = {str(column): [str(value) for value in df[column].tolist()] for column in df.columns}
+        return cls([str(c) for c in df.columns], cells, **columns)
+
+    def __len__(self):
+        return self.size
+
+    def record(self, row_id):
+        return CardRecord(self, int(row_id))
+
+    def value(self, row_id, column, default=None):
+        col = self.columns.get(column)
+        return col[row_id] if col is not None else default
+
+    def price_text(self, row_id):
+        """The sheet's Market Price cell as displayed"""
+        if self.price_overrides is None:
+            return 'N/A'
+        text = self.price_overrides.get(row_id)
+        if text is not None:
+            return text
+        return format_price(float(self.price_cents[row_id]))
+
+    def number_key(self, row_id):
+        numbers = self.columns.get(self.number_column)
+        if numbers is None:
+            return ''
+        if numbers.codes is None:
+            return normalize_card_number(numbers[row_id])
+        return self.number_keys[numbers.codes[row_id]]
+
+    def lookup(self, set_name, number):
+        """Row ids of the cards with this set (name or code) and card number, in sheet order"""
+        set_id = self.set_ids.get(normalize_name(set_name))
+        number_id = self.number_ids.get(normalize_card_number(number))
+        if set_id is None or number_id is None:
+            return _no_rows
+        key = set_id * len(self.number_ids) + number_id
+        i = int(np.searchsorted(self.pair_keys, key))
+        if i == len(self.pair_keys) or self.pair_keys[i] != key:
+            return _no_rows
+        return tuple(self.pair_rows[self.pair_offsets[i]:self.pair_offsets[i + 1]].tolist())
+
+    def to_frame(self, row_ids):
+        """DataFrame of selected rows with the sheet's original columns"""
+        import pandas as pd
+        row_ids = [int(r) for r in row_ids]
+        data = {}
+        for column in self.column_names:
+            if column == self.price_column:
+                data[column] = [self.price_text(r) for r in row_ids]
+            else:
+                col = self.columns[column]
+                data[column] = [col[r] for r in row_ids]
+        return pd.DataFrame(data, columns=self.column_names)
+
+    def memory_usage(self):
+        """Approximate bytes held per column"""
+        usage = {column: col.nbytes() for column, col in self.columns.items()}
+        if self.price_overrides is not None:
+            usage[self.price_column] = self.price_cents.nbytes + sys.getsizeof(self.price_overrides) + sum(
+                sys.getsizeof(text) for text in self.price_overrides.values()
+            )
+        usage['set_number_index'] = (self.pair_keys.nbytes + self.pair_offsets.nbytes + self.pair_rows.nbytes
+                                     + sys.getsizeof(self.set_ids) + sys.getsizeof(self.number_ids))
+        if self.number_keys is not None:
+            usage['number_keys'] = sys.getsizeof(self.number_keys) + sum(sys.getsizeof(k) for k in self.number_keys)
+        return usage
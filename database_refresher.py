@@ -0,0 +1,102 @@
+"""
+Database Refresher
+Background thread that periodically re-checks the card spreadsheet for changes
+"""
+import os
+import threading
+import time
+from pathlib import Path
+
+DEFAULT_REFRESH_INTERVAL = int(os.environ.get('DATABASE_REFRESH_INTERVAL', '300'))
+
+
+class RefreshLock:
+    """Inter-process lock so only one worker polls Google Sheets; the others follow its snapshots"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._file = None
+
+    @property
+    def held(self):
+        return self._file is not None
+
+    def acquire(self):
+        """Try to become the refreshing process; once held, the lock is kept until the process exits"""
+        if self._file is not None:
+            return True
+        try:
+            import fcntl
+        except ImportError:
+            # No flock (Windows): every process refreshes for itself
+            return True
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            f = open(self.path, 'a')
+        except OSError as e:
+            print(f"Refresh lock unavailable ({e}); refreshing from this process")
+            return True
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            f.close()
+            return False
+        self._file = f
+        return True
+
+
+class DatabaseRefresher:
+    def __init__(self, refresh, interval=DEFAULT_REFRESH_INTERVAL, name='database-refresher'):
+        # refresh() returns True when it published a new version, False when nothing changed
+        self.refresh = refresh
+        self.interval = interval
+        self.name = name
+        self.last_check = None
+        self.last_error = None
+        self.refresh_count = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self, run_now=True):
+        """Start polling; a non-positive interval still allows the one immediate refresh"""
+        if self._thread is not None:
+            return self
+        self._thread = threading.Thread(target=self._run, args=(run_now,), name=self.name, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def check_now(self):
+        """Run one refresh cycle on the calling thread"""
+        try:
+            self.record_check(self.refresh())
+        except Exception as e:
+            self.record_check(False, e)
+
+    def record_check(self, published, error=None):
+        """Bookkeeping for one refresh cycle, also used by callers that poll on their own loop"""
+        if published:
+            self.refresh_count += 1
+        self.last_error = str(error) if error is not None else None
+        if error is not None:
+            print(f"Database refresh failed: {error}")
+        self.last_check = time.time()
+
+    def _run(self, run_now):
+        if run_now:
+            self.check_now()
+        if self.interval <= 0:
+            return
+        while not self._stop.wait(self.interval):
+            self.check_now()
+
+    def status(self):
+        """Refresher details for /status"""
+        return {
+            'refresh_interval': self.interval,
+            'last_refresh_check': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(self.last_check)) if self.last_check else None,
+            'refresh_count': self.refresh_count,
+            'last_refresh_error': self.last_error,
+        }
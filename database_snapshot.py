@@ -0,0 +1,152 @@
+"""
+Database Snapshot
+Versioned local Arrow snapshot of the card database for warm starts
+"""
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+
+SNAPSHOT_SCHEMA_VERSION = 1
+DEFAULT_SNAPSHOT_PATH = os.environ.get('DATABASE_SNAPSHOT_PATH', 'data/card_database.arrow')
+
+
+def manifest_path(path):
+    return Path(str(path) + '.json')
+
+
+def file_checksum(path):
+    """SHA-256 of a file, read in chunks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _arrow_safe(df):
+    """get_all_records() mixes ints and strings in one column; Arrow needs one type per column"""
+    df = df.copy()
+    for column in df.columns:
+        if df[column].dtype == object:
+            df[column] = df[column].map(lambda v: '' if v is None else str(v))
+    df.columns = [str(c) for c in df.columns]
+    return df
+
+
+def _write_atomic(path, write):
+    """Write to a sibling temp file and rename, so readers never see a partial file"""
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+
+
+def save_snapshot(df, path=DEFAULT_SNAPSHOT_PATH, source='google_sheets', version=None, modified_time=None):
+    """Write the DataFrame as an uncompressed (mmap-able) Feather file plus a checksum manifest"""
+    try:
+        import pyarrow as pa
+        import pyarrow.feather as feather
+
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        table = pa.Table.from_pandas(_arrow_safe(df), preserve_index=False)
+        _write_atomic(path, lambda tmp: feather.write_feather(table, tmp, compression='uncompressed'))
+
+        manifest = {
+            'schema_version': SNAPSHOT_SCHEMA_VERSION,
+            'sha256': file_checksum(path),
+            'rows': len(df),
+            'columns': list(table.column_names),
+            'source': source,
+            'data_version': version,
+            'sheet_modified_time': modified_time,
+            'created_at': time.time(),
+        }
+        _write_atomic(manifest_path(path), lambda tmp: tmp.write_text(json.dumps(manifest, indent=2)))
+        print(f"Database snapshot saved: {len(df)} cards -> {path}")
+        return manifest
+    except Exception as e:
+        print(f"Failed to save database snapshot: {e}")
+        return None
+
+
+def read_manifest(path=DEFAULT_SNAPSHOT_PATH):
+    """Snapshot manifest, or None if missing or unreadable"""
+    try:
+        return json.loads(manifest_path(path).read_text())
+    except (OSError, ValueError):
+        return None
+
+
+class SnapshotColumn:
+    """One column of a snapshot table, read the way the database builders read a Series"""
+
+    def __init__(self, column):
+        self.column = column
+
+    def tolist(self):
+        import pyarrow.types
+
+        values = self.column.to_pylist()
+        if self.column.null_count and pyarrow.types.is_floating(self.column.type):
+            # pandas reads missing floats as NaN
+            values = [float('nan') if v is None else v for v in values]
+        return values
+
+
+class SnapshotTable:
+    """The parts of the DataFrame interface CardDatabase uses (columns, df[column].tolist(), len),
+    backed by the memory-mapped Arrow table so a warm start does not need to import pandas"""
+
+    def __init__(self, table):
+        self.table = table
+        self.columns = list(table.column_names)
+
+    def __len__(self):
+        return self.table.num_rows
+
+    def __getitem__(self, column):
+        return SnapshotColumn(self.table.column(column))
+
+    def to_pandas(self):
+        return self.table.to_pandas()
+
+
+def load_snapshot(path=DEFAULT_SNAPSHOT_PATH, as_dataframe=True):
+    """Load a verified snapshot as (df, manifest), or None if it is missing, stale or corrupt.
+    With as_dataframe=False the table comes back as a SnapshotTable and pandas is never imported"""
+    try:
+        path = Path(path)
+        if not path.exists():
+            return None
+
+        manifest = read_manifest(path)
+        if manifest is None:
+            print(f"Ignoring database snapshot {path}: manifest missing")
+            return None
+        if manifest.get('schema_version') != SNAPSHOT_SCHEMA_VERSION:
+            print(f"Ignoring database snapshot {path}: schema version {manifest.get('schema_version')}, "
+                  f"expected {SNAPSHOT_SCHEMA_VERSION}")
+            return None
+        if file_checksum(path) != manifest.get('sha256'):
+            print(f"Ignoring database snapshot {path}: checksum mismatch")
+            return None
+
+        import pyarrow.feather as feather
+        table = feather.read_table(path, memory_map=True)
+        df = table.to_pandas() if as_dataframe else SnapshotTable(table)
+        if len(df) != manifest.get('rows'):
+            print(f"Ignoring database snapshot {path}: expected {manifest.get('rows')} rows, found {len(df)}")
+            return None
+
+        age = time.time() - manifest.get('created_at', 0)
+        print(f"✓ Database loaded from snapshot: {len(df)} cards ({age / 3600:.1f}h old)")
+        return df, manifest
+    except Exception as e:
+        print(f"Failed to load database snapshot: {e}")
+        return None
@@ -0,0 +1,28 @@
+"""
+Gunicorn Settings
+Loads the card database once in the master so every forked worker shares it copy-on-write
+"""
+import sys
+
+preload_app = True
+# Tells the app module not to start its own loader thread at import
+raw_env = ['DATABASE_PRELOAD=1']
+
+
+def _app_module(server):
+    return sys.modules.get(server.app.app_uri.split(':')[0])
+
+
+def when_ready(server):
+    # Runs in the master after the app is imported and before any worker is forked
+    module = _app_module(server)
+    if module is not None and hasattr(module, 'preload_database'):
+        server.log.info("Preloading card database in the master")
+        module.preload_database()
+
+
+def post_fork(server, worker):
+    # Threads don't survive fork, so each worker starts its own refresher
+    module = _app_module(server)
+    if module is not None and hasattr(module, 'start_refresher'):
+        module.start_refresher()
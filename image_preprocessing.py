@@ -0,0 +1,178 @@
+"""
+Image Preprocessing
+Shrinks phone photos to what the vision model needs before they are uploaded
+"""
+import io
+import os
+import threading
+import time
+
+# GPT-4 vision tiles the short side at 768px, so a card never needs more than ~1100px on its long side
+VISION_MAX_SIDE = int(os.environ.get('VISION_MAX_SIDE', '1024'))
+VISION_JPEG_QUALITY = int(os.environ.get('VISION_JPEG_QUALITY', '85'))
+# Cards are 63x88mm; accept detected regions whose short/long ratio is near that
+CARD_ASPECT = 63 / 88
+CARD_ASPECT_TOLERANCE = 0.12
+MIN_CARD_AREA = 0.08
+DETECTION_SIDE = 256
+# ISO base media brands of HEIF images (iPhone photos) and AVIF
+HEIC_BRANDS = (b'heic', b'heix', b'heim', b'heis', b'hevc', b'hevx', b'mif1', b'msf1')
+AVIF_BRANDS = (b'avif', b'avis')
+
+
+def sniff_mime_type(data, default='image/jpeg'):
+    """MIME type of an image from its magic bytes, for uploads that could not be decoded"""
+    head = bytes(data[:16])
+    if head.startswith(b'\xff\xd8\xff'):
+        return 'image/jpeg'
+    if head.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'image/png'
+    if head.startswith((b'GIF87a', b'GIF89a')):
+        return 'image/gif'
+    if head.startswith(b'RIFF') and head[8:12] == b'WEBP':
+        return 'image/webp'
+    if head[4:8] == b'ftyp':
+        if head[8:12] in HEIC_BRANDS:
+            return 'image/heic'
+        if head[8:12] in AVIF_BRANDS:
+            return 'image/avif'
+    return default
+
+
+class PreparedImage:
+    __slots__ = ('data', 'mime_type', 'original_bytes', 'original_size', 'size', 'cropped', 'elapsed_ms')
+
+    def __init__(self, data, mime_type, original_bytes, original_size, size, cropped, elapsed_ms):
+        self.data = data
+        self.mime_type = mime_type
+        self.original_bytes = original_bytes
+        self.original_size = original_size
+        self.size = size
+        self.cropped = cropped
+        self.elapsed_ms = elapsed_ms
+
+    def summary(self):
+        return (f"{self.original_bytes / 1024:.0f} KB {self.original_size} -> {len(self.data) / 1024:.0f} KB "
+                f"{self.size}{' cropped' if self.cropped else ''} in {self.elapsed_ms:.0f} ms")
+
+
+class PreprocessStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.images = 0
+        self.cropped = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.total_ms = 0.0
+
+    def record(self, prepared):
+        with self._lock:
+            self.images += 1
+            self.cropped += prepared.cropped
+            self.bytes_in += prepared.original_bytes
+            self.bytes_out += len(prepared.data)
+            self.total_ms += prepared.elapsed_ms
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'images': self.images,
+                'cropped': self.cropped,
+                'bytes_in': self.bytes_in,
+                'bytes_out': self.bytes_out,
+                'size_reduction': round(1 - self.bytes_out / self.bytes_in, 4) if self.bytes_in else 0.0,
+                'avg_ms': round(self.total_ms / self.images, 2) if self.images else 0.0,
+            }
+
+
+stats = PreprocessStats()
+
+
+def find_card_region(image):
+    """Bounding box of the card in a photo, or None if no card-shaped region stands out"""
+    from PIL import ImageFilter
+    import numpy as np
+
+    scale = DETECTION_SIDE / max(image.size)
+    small = image.resize((max(1, round(image.width * scale)), max(1, round(image.height * scale))))
+    pixels = np.asarray(small.filter(ImageFilter.GaussianBlur(1)), dtype=np.int16)
+
+    # The photo's outer ring is assumed to be table/background; the card is what differs from it
+    ring = max(2, min(small.size) // 20)
+    border = np.concatenate([
+        pixels[:ring].reshape(-1, 3), pixels[-ring:].reshape(-1, 3),
+        pixels[:, :ring].reshape(-1, 3), pixels[:, -ring:].reshape(-1, 3),
+    ])
+    background = np.median(border, axis=0)
+    border_distance = np.abs(border - background).sum(axis=1)
+    distance = np.abs(pixels - background).sum(axis=2)
+    foreground = distance > max(30.0, float(np.percentile(border_distance, 95)) + 15)
+
+    def span(profile):
+        strong = np.flatnonzero(profile > 0.25 * profile.max()) if profile.max() > 0 else []
+        if len(strong) == 0:
+            return None
+        return int(strong[0]), int(strong[-1]) + 1
+
+    rows, cols = span(foreground.mean(axis=1)), span(foreground.mean(axis=0))
+    if rows is None or cols is None:
+        return None
+    top, bottom = rows
+    left, right = cols
+    width, height = right - left, bottom - top
+    if width * height < MIN_CARD_AREA * small.width * small.height:
+        return None
+    if min(left, top, small.width - right, small.height - bottom) < 1.5 * ring:
+        # Reaches into the background ring: the card fills the frame, or we found artwork inside it
+        return None
+    aspect = min(width, height) / max(width, height)
+    if abs(aspect - CARD_ASPECT) > CARD_ASPECT_TOLERANCE:
+        return None
+
+    pad = 2
+    box = (max(0, left - pad), max(0, top - pad), min(small.width, right + pad), min(small.height, bottom + pad))
+    return tuple(min(round(v / scale), limit) for v, limit in zip(box, image.size * 2))
+
+
+def preprocess_image(image_bytes, max_side=VISION_MAX_SIDE, quality=VISION_JPEG_QUALITY):
+    """Upright, card-cropped, downscaled JPEG for the vision API; falls back to the original bytes"""
+    start = time.perf_counter()
+    try:
+        from PIL import Image, ImageOps
+
+        image = Image.open(io.BytesIO(image_bytes))
+        original_size = image.size
+        original_format = image.format
+        # 0x0112 is the EXIF Orientation tag; 1 means the pixels are already upright
+        upright = image.getexif().get(0x0112, 1) == 1
+        # Let the JPEG decoder skip detail we are about to throw away
+        image.draft('RGB', (max_side, max_side))
+        image = ImageOps.exif_transpose(image).convert('RGB')
+
+        box = find_card_region(image)
+        if box is not None:
+            image = image.crop(box)
+        if max(image.size) > max_side:
+            image.thumbnail((max_side, max_side), Image.LANCZOS)
+
+        buffer = io.BytesIO()
+        image.save(buffer, format='JPEG', quality=quality, optimize=True)
+        data = buffer.getvalue()
+        mime_type = 'image/jpeg'
+
+        size = image.size
+
+        if len(data) >= len(image_bytes) and box is None and upright and original_format == 'JPEG':
+            # Already small enough; re-encoding would only cost quality
+            data = image_bytes
+            size = original_size
+
+        prepared = PreparedImage(data, mime_type, len(image_bytes), original_size, size,
+                                 box is not None, (time.perf_counter() - start) * 1000)
+    except Exception as e:
+        print(f"Image preprocessing skipped: {e}")
+        prepared = PreparedImage(image_bytes, sniff_mime_type(image_bytes), len(image_bytes), None, None, False,
+                                 (time.perf_counter() - start) * 1000)
+
+    stats.record(prepared)
+    return prepared
@@ -0,0 +1,247 @@
+"""
+Inventory Queue
+Write-behind quantity changes for the inventory worksheet. Changes are coalesced per card in a local SQLite
+journal and flushed to Google Sheets in the background as one batch_update, so no request waits on Sheets
+"""
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from card_matcher import normalize_card_number
+from price_history import card_key
+from upstream import google_sheets
+
+DEFAULT_INVENTORY_QUEUE_PATH = os.environ.get('INVENTORY_QUEUE_PATH', 'data/inventory_queue.db')
+DEFAULT_FLUSH_INTERVAL = int(os.environ.get('INVENTORY_FLUSH_INTERVAL', '30'))
+INVENTORY_WORKSHEET = os.environ.get('INVENTORY_WORKSHEET', 'Inventory')
+SET_HEADER, NUMBER_HEADER, NAME_HEADER, QUANTITY_HEADER = INVENTORY_HEADERS = ('Set', 'Card Number', 'Name', 'Quantity')
+# Failed flushes wait interval * 2^failures, up to this many seconds
+MAX_FLUSH_BACKOFF = 900
+
+
+def is_quota_error(error):
+    """True for the Sheets API's 429 / RESOURCE_EXHAUSTED answers"""
+    response = getattr(error, 'response', None)
+    if getattr(response, 'status_code', None) == 429:
+        return True
+    text = str(error)
+    return 'RESOURCE_EXHAUSTED' in text or 'Quota exceeded' in text
+
+
+def _quantity(text):
+    try:
+        return int(float(text))
+    except (TypeError, ValueError):
+        return 0
+
+
+class InventoryQueue:
+    def __init__(self, open_worksheet, db_path=DEFAULT_INVENTORY_QUEUE_PATH, interval=DEFAULT_FLUSH_INTERVAL,
+                 should_flush=None):
+        # open_worksheet() returns the gspread Worksheet to write; should_flush() says whether this process
+        # flushes (only one should, or both would apply the same changes)
+        self.open_worksheet = open_worksheet
+        self.db_path = db_path
+        self.interval = interval
+        self.should_flush = should_flush
+        self._local = threading.local()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.failures = 0
+        self.last_flush = None
+        self.last_error = None
+        self.cards_flushed = 0
+
+        Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+        with self._connection() as conn:
+            # Quantity changes not yet sent, summed per card
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS pending (key TEXT PRIMARY KEY, set_name TEXT NOT NULL, '
+                'number TEXT NOT NULL, name TEXT NOT NULL, delta INTEGER NOT NULL)'
+            )
+            # Absolute cell values of a flush in progress; resending them after a crash is harmless
+            conn.execute('CREATE TABLE IF NOT EXISTS outbox (cell TEXT PRIMARY KEY, value TEXT NOT NULL)')
+            # Removals the sheet had no stock for, kept for someone to reconcile rather than dropped
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS unapplied (key TEXT PRIMARY KEY, set_name TEXT NOT NULL, '
+                'number TEXT NOT NULL, name TEXT NOT NULL, delta INTEGER NOT NULL)'
+            )
+
+    def _connection(self):
+        """One SQLite connection per thread; WAL so scans can queue changes while a flush commits"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=5)
+            conn.execute('PRAGMA journal_mode=WAL')
+            # A queued change must survive a crash right after the request that made it returns
+            conn.execute('PRAGMA synchronous=FULL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def add(self, set_name, number, name, delta=1):
+        """Queue a quantity change for one card; changes to the same card are summed until the next flush"""
+        key = card_key(set_name, normalize_card_number(number), name)
+        with self._connection() as conn:
+            conn.execute(
+                'INSERT INTO pending (key, set_name, number, name, delta) VALUES (?, ?, ?, ?, ?) '
+                'ON CONFLICT(key) DO UPDATE SET delta = delta + excluded.delta',
+                (key, str(set_name), str(number), str(name), int(delta))
+            )
+
+    def flush(self):
+        """Send everything queued as one batch_update; returns the number of cards written"""
+        with self._flush_lock:
+            conn = self._connection()
+            worksheet = None
+            outbox = conn.execute('SELECT cell, value FROM outbox').fetchall()
+            if outbox:
+                # The previous flush stopped between taking its changes and writing them
+                worksheet = self.open_worksheet()
+                self._write(worksheet, outbox)
+
+            pending = conn.execute('SELECT key, set_name, number, name, delta FROM pending WHERE delta != 0').fetchall()
+            if not pending:
+                return 0
+            worksheet = worksheet or self.open_worksheet()
+            cells, unapplied = self._cells(google_sheets.call(worksheet.get_all_values), pending)
+            # Taking the changes and recording the values they produce is one transaction,
+            # so each change reaches the sheet exactly once
+            with conn:
+                conn.executemany('INSERT OR REPLACE INTO outbox (cell, value) VALUES (?, ?)', cells)
+                conn.executemany(
+                    'INSERT INTO unapplied (key, set_name, number, name, delta) VALUES (?, ?, ?, ?, ?) '
+                    'ON CONFLICT(key) DO UPDATE SET delta = delta + excluded.delta', unapplied
+                )
+                conn.executemany('UPDATE pending SET delta = delta - ? WHERE key = ?',
+                                 [(delta, key) for key, _, _, _, delta in pending])
+                conn.execute('DELETE FROM pending WHERE delta = 0')
+            if unapplied:
+                print(f"Inventory: {len(unapplied)} removals exceeded the sheet's quantity; see unapplied_changes()")
+            if cells:
+                self._write(worksheet, cells)
+            return len(pending)
+
+    def _cells(self, values, pending):
+        """(A1 cell, JSON value) pairs that apply pending changes to the sheet's current values, and the
+        pending rows (with the part of their delta left over) of removals that would take a quantity below 0"""
+        from gspread.utils import rowcol_to_a1
+
+        headers = list(values[0]) if values else []
+        cells = []
+        columns = {}
+        for header in INVENTORY_HEADERS:
+            if header not in headers:
+                headers.append(header)
+                cells.append((rowcol_to_a1(1, len(headers)), json.dumps(header)))
+            columns[header] = headers.index(header)
+
+        def cell(row, header):
+            column = columns[header]
+            return row[column] if column < len(row) else ''
+
+        rows = {}
+        for row_number, row in enumerate(values[1:], start=2):
+            key = card_key(cell(row, SET_HEADER), normalize_card_number(cell(row, NUMBER_HEADER)), cell(row, NAME_HEADER))
+            rows.setdefault(key, (row_number, _quantity(cell(row, QUANTITY_HEADER))))
+
+        unapplied = []
+        next_row = max(len(values), 1) + 1
+        for key, set_name, number, name, delta in pending:
+            row_number, current = rows.get(key, (None, 0))
+            in_stock = max(current, 0)
+            if in_stock + delta < 0:
+                # Remove what is there; a card the sheet doesn't list gets no row
+                unapplied.append((key, set_name, number, name, in_stock + delta))
+                delta = -in_stock
+                if delta == 0:
+                    continue
+            if row_number is None:
+                row_number = next_row
+                next_row += 1
+                for header, value in ((SET_HEADER, set_name), (NUMBER_HEADER, number), (NAME_HEADER, name)):
+                    cells.append((rowcol_to_a1(row_number, columns[header] + 1), json.dumps(value)))
+            cells.append((rowcol_to_a1(row_number, columns[QUANTITY_HEADER] + 1), json.dumps(current + delta)))
+        return cells, unapplied
+
+    def _write(self, worksheet, cells):
+        from gspread.utils import a1_to_rowcol
+
+        positions = [a1_to_rowcol(cell) for cell, _ in cells]
+        last_row = max(row for row, _ in positions)
+        last_column = max(column for _, column in positions)
+        if last_row > worksheet.row_count:
+            google_sheets.call(worksheet.add_rows, last_row - worksheet.row_count)
+        if last_column > worksheet.col_count:
+            google_sheets.call(worksheet.add_cols, last_column - worksheet.col_count)
+        google_sheets.call(worksheet.batch_update,
+                           [{'range': cell, 'values': [[json.loads(value)]]} for cell, value in cells],
+                           value_input_option='RAW')
+        with self._connection() as conn:
+            conn.execute('DELETE FROM outbox')
+
+    def unapplied_changes(self):
+        """Removals that were not applied because the sheet had too few of the card, as
+        {'set', 'number', 'name', 'quantity'} with quantity the negative amount left over"""
+        rows = self._connection().execute(
+            'SELECT set_name, number, name, delta FROM unapplied WHERE delta != 0 ORDER BY key'
+        ).fetchall()
+        return [{'set': set_name, 'number': number, 'name': name, 'quantity': delta}
+                for set_name, number, name, delta in rows]
+
+    def flush_now(self):
+        """One flush cycle; returns the seconds to wait before the next one"""
+        if self.should_flush is not None and not self.should_flush():
+            return self.interval
+        try:
+            self.cards_flushed += self.flush()
+        except Exception as e:
+            self.failures += 1
+            self.last_error = str(e)
+            delay = min(self.interval * 2 ** self.failures, MAX_FLUSH_BACKOFF) * random.uniform(0.8, 1.2)
+            reason = 'Sheets quota exceeded' if is_quota_error(e) else f'failed: {e}'
+            print(f"Inventory flush {reason}; retrying in {delay:.0f}s")
+            return delay
+        self.failures = 0
+        self.last_error = None
+        self.last_flush = time.time()
+        return self.interval
+
+    def start(self):
+        if self._thread is None and self.interval > 0:
+            self._thread = threading.Thread(target=self._run, name='inventory-flush', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        delay = self.interval
+        while not self._stop.wait(delay):
+            delay = self.flush_now()
+
+    def stats(self):
+        """Queue details for /status"""
+        conn = self._connection()
+        cards, quantity = conn.execute('SELECT COUNT(*), COALESCE(SUM(delta), 0) FROM pending WHERE delta != 0').fetchone()
+        unapplied_cards, unapplied_quantity = conn.execute(
+            'SELECT COUNT(*), COALESCE(SUM(delta), 0) FROM unapplied WHERE delta != 0'
+        ).fetchone()
+        return {
+            'pending_cards': cards,
+            'pending_quantity': quantity,
+            'unconfirmed_cells': conn.execute('SELECT COUNT(*) FROM outbox').fetchone()[0],
+            'unapplied_cards': unapplied_cards,
+            'unapplied_quantity': unapplied_quantity,
+            'cards_flushed': self.cards_flushed,
+            'flush_interval': self.interval,
+            'last_flush': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(self.last_flush)) if self.last_flush else None,
+            'consecutive_failures': self.failures,
+            'last_error': self.last_error,
+        }
@@ -0,0 +1,29 @@
+"""
+Pagination
+Opaque cursor tokens that pin a page position to one database version
+"""
+import base64
+import json
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+def encode_cursor(version, *position):
+    """URL-safe token for a page position within one database version"""
+    raw = json.dumps([version, *position], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token, version):
+    """Position list from a token; raises InvalidCursor if it is malformed or from another version"""
+    try:
+        data = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+        if not isinstance(data, list) or not data or not all(isinstance(v, int) for v in data[1:]):
+            raise ValueError(token)
+    except ValueError:
+        raise InvalidCursor('Malformed cursor')
+    if data[0] != version:
+        raise InvalidCursor('The catalog changed since this cursor was issued; start again from the first page')
+    return data[1:]
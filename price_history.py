@@ -0,0 +1,229 @@
+"""
+Price History
+Append-only, columnar store of market prices from each database sync. Every sync stores only the prices that
+changed since the one before (delta encoding), and queries read the column files through memory maps
+"""
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+
+from card_index import normalize_name
+
+DEFAULT_PRICE_HISTORY_PATH = os.environ.get('PRICE_HISTORY_PATH', 'data/price_history')
+
+# Column files: one row per price change, appended in sync order
+CARD_IDS_FILE = 'card_ids.i32'
+PRICES_FILE = 'prices.f32'
+# One row per sync: timestamp (ms), rows committed, cards known. A sync's row is written last, so it is
+# the commit point; anything beyond the last sync row is a torn append and is ignored, then overwritten
+SYNCS_FILE = 'syncs.i64'
+# Card keys, one per line; the line number is the card id
+CARDS_FILE = 'cards.txt'
+# flock()ed while appending, as every gunicorn worker may record a sync
+LOCK_FILE = 'append.lock'
+SYNC_FIELDS = 3
+
+
+def card_key(set_name, number_key, name):
+    """Stable identity of a card across syncs: set, normalized number and name (reprints differ in set)"""
+    return f"{normalize_name(set_name)}|{number_key}|{normalize_name(name)}"
+
+
+def row_card_key(cards, row_id):
+    """card_key() of one CardStore row"""
+    return card_key(cards.value(row_id, cards.set_column, ''), cards.number_key(row_id),
+                    cards.value(row_id, cards.name_column, ''))
+
+
+def card_keys(cards):
+    """card_key() for every row of a CardStore"""
+    return [row_card_key(cards, row_id) for row_id in range(len(cards))]
+
+
+def _memmap(path, dtype, count):
+    if count == 0:
+        return np.empty(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode='r', shape=(count,))
+
+
+def _append(path, data, offset):
+    """Write bytes at offset, dropping anything past it (a torn earlier append)"""
+    with open(path, 'r+b' if path.exists() else 'wb') as f:
+        f.truncate(offset)
+        f.seek(offset)
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+class PriceHistory:
+    def __init__(self, directory=DEFAULT_PRICE_HISTORY_PATH):
+        self.directory = Path(directory)
+        self._lock = threading.Lock()
+        self._syncs_size = None
+        self._syncs = np.empty((0, SYNC_FIELDS), dtype=np.int64)
+        self._card_ids = np.empty(0, dtype=np.int32)
+        self._prices = np.empty(0, dtype=np.float32)
+        self._cards = {}
+        self._key_list = []
+        # Bytes of CARDS_FILE holding committed keys
+        self._cards_bytes = 0
+        self._last_prices = None
+
+    def _path(self, name):
+        return self.directory / name
+
+    def _refresh(self):
+        """Re-map the files if another process (the refresh leader) appended since we last looked"""
+        path = self._path(SYNCS_FILE)
+        try:
+            size = path.stat().st_size
+        except OSError:
+            size = 0
+        if size == self._syncs_size:
+            return
+        count = size // (8 * SYNC_FIELDS)
+        syncs = _memmap(path, np.int64, count * SYNC_FIELDS).reshape(count, SYNC_FIELDS)
+        rows = int(syncs[-1, 1]) if count else 0
+        card_count = int(syncs[-1, 2]) if count else 0
+        self._card_ids = _memmap(self._path(CARD_IDS_FILE), np.int32, rows)
+        self._prices = _memmap(self._path(PRICES_FILE), np.float32, rows)
+        if card_count != len(self._key_list):
+            lines = self._path(CARDS_FILE).read_bytes().split(b'\n')[:card_count] if card_count else []
+            self._key_list = [line.decode('utf-8') for line in lines]
+            self._cards = {key: card_id for card_id, key in enumerate(self._key_list)}
+            self._cards_bytes = sum(len(line) + 1 for line in lines)
+        self._syncs = syncs
+        self._syncs_size = size
+        self._last_prices = None
+
+    @contextmanager
+    def _append_lock(self):
+        """Exclusive across processes; without flock (Windows) only this process's lock applies"""
+        try:
+            import fcntl
+        except ImportError:
+            yield
+            return
+        with open(self._path(LOCK_FILE), 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _latest_prices(self):
+        """Price currently in effect for every card id (NaN when unknown), replayed from the change log"""
+        if self._last_prices is None:
+            last = np.full(len(self._key_list), np.nan, dtype=np.float32)
+            if len(self._card_ids):
+                # The last change of each card wins
+                ids = np.asarray(self._card_ids)[::-1]
+                unique_ids, first = np.unique(ids, return_index=True)
+                last[unique_ids] = np.asarray(self._prices)[::-1][first]
+            self._last_prices = last
+        return self._last_prices
+
+    def append(self, keys, prices_cents, timestamp=None):
+        """Record one sync: the price in cents (NaN for none) of each card key. Returns the rows written"""
+        timestamp_ms = int((time.time() if timestamp is None else timestamp) * 1000)
+        prices_cents = np.asarray(prices_cents, dtype=np.float32)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with self._lock, self._append_lock():
+            # Offsets must come from the files as they are now, not as this process last saw them
+            self._syncs_size = None
+            self._refresh()
+            if len(self._syncs) and timestamp_ms <= self._syncs[-1, 0]:
+                timestamp_ms = int(self._syncs[-1, 0]) + 1
+
+            new_cards = {}
+            ids = np.empty(len(keys), dtype=np.int32)
+            for row, key in enumerate(keys):
+                card_id = self._cards.get(key)
+                if card_id is None:
+                    card_id = new_cards.setdefault(key, len(self._key_list) + len(new_cards))
+                ids[row] = card_id
+            new_keys = list(new_cards)
+            card_count = len(self._key_list) + len(new_keys)
+
+            # Duplicate keys in one sheet keep their first row
+            ids, first = np.unique(ids, return_index=True)
+            current = np.full(card_count, np.nan, dtype=np.float32)
+            current[ids] = prices_cents[first]
+            previous = np.full(card_count, np.nan, dtype=np.float32)
+            previous[:len(self._key_list)] = self._latest_prices()
+            # Cards that disappeared from the sheet get a NaN row, so their last price stops there
+            changed = np.flatnonzero(~((current == previous) | (np.isnan(current) & np.isnan(previous))))
+
+            rows = len(self._card_ids)
+            _append(self._path(CARDS_FILE), ''.join(f'{key}\n' for key in new_keys).encode('utf-8'), self._cards_bytes)
+            _append(self._path(CARD_IDS_FILE), changed.astype(np.int32).tobytes(), rows * 4)
+            _append(self._path(PRICES_FILE), current[changed].tobytes(), rows * 4)
+            sync = np.array([timestamp_ms, rows + len(changed), card_count], dtype=np.int64)
+            _append(self._path(SYNCS_FILE), sync.tobytes(), len(self._syncs) * 8 * SYNC_FIELDS)
+            self._syncs_size = None
+            self._refresh()
+            self._last_prices = current
+            return len(changed)
+
+    def card_id(self, key):
+        with self._lock:
+            self._refresh()
+            return self._cards.get(key)
+
+    def history(self, key, start=None, end=None):
+        """Price changes of one card between start and end (unix seconds), plus min/max/average, or None.
+        The average is weighted by how long each price was in effect"""
+        with self._lock:
+            self._refresh()
+            card_id = self._cards.get(key)
+            if card_id is None:
+                return None
+            syncs, card_ids, prices = self._syncs, self._card_ids, self._prices
+
+        rows = np.flatnonzero(card_ids == card_id)
+        # Sync each change belongs to, and when it happened
+        sync_index = np.searchsorted(syncs[:, 1], rows, side='right')
+        times = syncs[sync_index, 0]
+        values = np.asarray(prices[rows], dtype=np.float64)
+
+        start_ms = int(start * 1000) if start is not None else int(times[0]) if len(times) else 0
+        end_ms = int(end * 1000) if end is not None else int(time.time() * 1000)
+        # The price in effect at start is the last change at or before it
+        first = max(int(np.searchsorted(times, start_ms, side='right')) - 1, 0)
+        last = int(np.searchsorted(times, end_ms, side='right'))
+        times, values = times[first:last], values[first:last]
+
+        # Each price holds until the next change, clipped to the range
+        begins = np.maximum(times, start_ms)
+        ends = np.append(times[1:], end_ms)
+        durations = np.clip(ends - begins, 0, None).astype(np.float64)
+        known = ~np.isnan(values) & (durations > 0)
+        points = [{'time': _iso(t), 'price_cents': None if np.isnan(v) else int(round(v))}
+                  for t, v in zip(times.tolist(), values.tolist())]
+        summary = {'changes': len(points), 'min_cents': None, 'max_cents': None, 'avg_cents': None}
+        if known.any():
+            summary.update({
+                'min_cents': int(values[known].min()),
+                'max_cents': int(values[known].max()),
+                'avg_cents': round(float(np.average(values[known], weights=durations[known])), 2),
+            })
+        return {'card_id': card_id, 'from': _iso(start_ms), 'to': _iso(end_ms), 'points': points, **summary}
+
+    def stats(self):
+        with self._lock:
+            self._refresh()
+            return {
+                'syncs': len(self._syncs),
+                'cards': len(self._key_list),
+                'rows': len(self._card_ids),
+                'last_sync': _iso(int(self._syncs[-1, 0])) if len(self._syncs) else None,
+            }
+
+
+def _iso(timestamp_ms):
+    return time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(timestamp_ms / 1000))
@@ -2,65 +2,265 @@
 Railway Pokemon TCG Scanner - Complete Implementation
 Uses authentic Google Sheets database and OpenAI for card recognition
 """
+# Imported first so the startup "import" phase covers everything this module pulls in
+from startup_timing import startup
 import os
-import pandas as pd
-import base64
+import csv
+import functools
+import gc
+import hashlib
+import io
 import json
 import tempfile
-from flask import Flask, render_template_string, request, jsonify
-import requests
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
+from urllib.parse import urlencode
+from flask import Flask, request, jsonify, Response
+# pandas and requests are imported where they are first used: a warm start from the snapshot needs neither
+from card_database import CardDatabase, content_version
+from card_index import normalize_name
+from card_matcher import text_similarity
+from card_store import CARD_FIELDS
+from pagination import InvalidCursor, decode_cursor, encode_cursor
+from price_history import DEFAULT_PRICE_HISTORY_PATH, PriceHistory, card_keys, row_card_key
+from database_refresher import DatabaseRefresher, RefreshLock
+from database_snapshot import DEFAULT_SNAPSHOT_PATH, load_snapshot, read_manifest, save_snapshot
+from recognition_cache import RecognitionCache, image_key
+from card_recognizer import CardRecognizer
+import image_preprocessing
+from inventory_queue import DEFAULT_INVENTORY_QUEUE_PATH, INVENTORY_HEADERS, INVENTORY_WORKSHEET, InventoryQueue
+import metrics
+from scan_jobs import ScanJobQueue, QueueFull
+from single_flight import SingleFlight
+import upstream
+from upstream import UpstreamError, UpstreamUnavailable
+from uploads import SCAN_MAX_REQUEST_BYTES, UploadTooLarge, megabytes, read_limited, spool_upload
+from vision_body import IMAGE_URL_PLACEHOLDER, VisionBody
+from web_assets import ASSET_CACHE_CONTROL, PAGE_CACHE_CONTROL, AssetBundle, PreparedBody, conditional_response
 
-app = Flask(__name__)
+app = Flask(__name__, static_folder=None)
 app.secret_key = os.environ.get('SECRET_KEY', 'ChillAuraTCG_Secret_Key_2024')
+# Larger bodies are refused with 413 before they are parsed; uploaded files are spooled to disk, not memory
+app.config['MAX_CONTENT_LENGTH'] = SCAN_MAX_REQUEST_BYTES
+# Templates are compiled and static files fingerprinted and compressed once, at import
+assets = AssetBundle(os.path.join(app.root_path, 'static'))
+page_templates = {name: app.jinja_env.get_template(name) for name in ('loading.html', 'index.html')}
+
+SPREADSHEET_ID = "1JicEp6N0vrXVPbE6L1JGTLiNexXyPP5OraHQbDAqcXc"
+OPENAI_BASE_URL = os.environ.get('OPENAI_BASE_URL', 'https://api.openai.com/v1').rstrip('/')
+# Public CSV export of the sheet, used when there are no service-account credentials
+SHEETS_EXPORT_BASE_URL = os.environ.get('SHEETS_EXPORT_BASE_URL', 'https://docs.google.com').rstrip('/')
+SHEETS_CSV_URL = f"{SHEETS_EXPORT_BASE_URL}/spreadsheets/d/{SPREADSHEET_ID}/export?format=csv&gid=0"
+# Become ready as soon as the snapshot (or nothing) is loaded; the first Sheets load then runs in the background
+FAST_START = os.environ.get('FAST_START', '1') == '1'
+SCAN_BATCH_CONCURRENCY = int(os.environ.get('SCAN_BATCH_CONCURRENCY', '8'))
+SCAN_BATCH_MAX_IMAGES = int(os.environ.get('SCAN_BATCH_MAX_IMAGES', '200'))
+SCAN_EVENTS_TIMEOUT = int(os.environ.get('SCAN_EVENTS_TIMEOUT', '300'))
+# Each event stream holds a server thread until its job finishes; keep some threads free for everything else
+SCAN_EVENT_STREAMS = int(os.environ.get('SCAN_EVENT_STREAMS', '4'))
+SEARCH_DEFAULT_LIMIT = 20
+SEARCH_MAX_LIMIT = int(os.environ.get('SEARCH_MAX_LIMIT', '100'))
+SEARCH_DEFAULT_FIELDS = ('name', 'set', 'number')
+# Rows per chunk written to a streaming /library response
+LIBRARY_CHUNK_ROWS = 500
+# An exact set + number hit is trusted unless the recognized name is this far from the card's
+EXACT_MATCH_MIN_NAME_SIMILARITY = 0.4
+# Returned when the model answers but not in JSON; never cached
+UNPARSED_CARD_INFO = {'name': 'Card detected', 'set': 'Unknown', 'number': '???', 'rarity': 'Unknown'}
+VISION_MODEL = 'gpt-4-vision-preview'
+VISION_PROMPT = ('Analyze this Pokemon card image and extract: card name, set name, card number, rarity. '
+                 'Return as JSON format: {"name": "", "set": "", "number": "", "rarity": ""}')
+# Cached recognitions are keyed by model and prompt as well as image, so editing either starts a fresh cache
+RECOGNITION_NAMESPACE = f"{VISION_MODEL}/{hashlib.sha256(VISION_PROMPT.encode('utf-8')).hexdigest()[:12]}"
 
 # Global variables
-df = None
+# `database` is only ever replaced wholesale, so a request that reads it once sees one consistent version
+database = None
 scanner_ready = False
+refresher = None
+_spreadsheet = None
+_inventory_worksheet = None
+_seen_modified_time = None
+# With several gunicorn workers only the lock holder talks to Google Sheets
+refresh_lock = RefreshLock(f'{DEFAULT_SNAPSHOT_PATH}.lock')
+recognition_cache = RecognitionCache()
+card_recognizer = CardRecognizer.load()
+# Identical images scanned at the same time (retries, double submits) share one recognition
+scan_flights = SingleFlight()
+# Prices from every sync, appended by whichever process fetches the sheet; empty PRICE_HISTORY_PATH disables it
+price_history = PriceHistory(DEFAULT_PRICE_HISTORY_PATH) if DEFAULT_PRICE_HISTORY_PATH else None
+# Quantity changes are journaled locally and written to the inventory worksheet in the background,
+# by the same worker that refreshes the database; empty INVENTORY_QUEUE_PATH disables inventory updates
+inventory_queue = InventoryQueue(
+    lambda: open_inventory_worksheet(), should_flush=refresh_lock.acquire
+) if DEFAULT_INVENTORY_QUEUE_PATH else None
+# Shared by all batch requests, so total in-flight recognitions never exceed the limit
+event_streams = threading.BoundedSemaphore(SCAN_EVENT_STREAMS)
+scan_executor = ThreadPoolExecutor(max_workers=SCAN_BATCH_CONCURRENCY, thread_name_prefix='scan')
+
+# Instrumentation exposed at /metrics; values are per process
+scan_stage_seconds = metrics.Histogram('pokescan_scan_stage_seconds', 'Time spent in each stage of a scan', ['stage'])
+# Bound once so the hot path skips the label lookup
+scan_stages = {stage: scan_stage_seconds.labels(stage) for stage in (
+    'read_upload', 'cache_lookup', 'local_match', 'preprocess', 'base64_encode',
+    'openai_request', 'parse_response', 'search_database', 'total'
+)}
+scans_total = metrics.Counter('pokescan_scans_total', 'Scans answered, by recognizer and outcome',
+                              ['recognized_by', 'outcome'])
+scans_in_flight = metrics.Gauge('pokescan_scans_in_flight', 'Scans being processed')
+openai_in_flight = metrics.Gauge('pokescan_openai_requests_in_flight', 'Vision API calls awaiting a response')
+openai_errors_total = metrics.Counter('pokescan_openai_errors_total',
+                                      'Failed vision API calls, by HTTP status or exception type', ['reason'])
+scans_coalesced_total = metrics.Counter('pokescan_scans_coalesced_total',
+                                       'Scans that waited for an identical in-flight scan instead of recognizing again')
+parse_fallbacks_total = metrics.Counter('pokescan_vision_parse_fallbacks_total',
+                                        'Vision answers that were not JSON and fell back to a placeholder')
+metrics.Counter('pokescan_recognition_cache_lookups_total', 'Recognition cache lookups by result',
+                ['result']).set_function(lambda: {
+    'memory_hit': recognition_cache.memory_hits, 'disk_hit': recognition_cache.disk_hits,
+    'miss': recognition_cache.misses
+})
+metrics.Gauge('pokescan_database_rows', 'Cards in the database version being served').set_function(
+    lambda: len(database) if database is not None else 0
+)
+database_load_seconds = metrics.Gauge('pokescan_database_load_seconds',
+                                      'Duration of the last database load, by source', ['source'])
+database_loads_total = metrics.Counter('pokescan_database_loads_total', 'Database versions published, by source',
+                                       ['source'])
+metrics.Gauge('pokescan_upstream_circuit_open', 'Whether calls to an upstream service are failing fast (1) or not',
+              ['upstream']).set_function(
+    lambda: {service.name: int(service.breaker.state == 'open') for service in upstream.upstreams}
+)
+metrics.Gauge('pokescan_scan_jobs', 'Scan jobs by state', ['state']).set_function(
+    lambda: {state: count for state, count in scan_jobs.stats().items() if state in ('queued', 'running')}
+)
+
+def publish_database(new_database, started=None):
+    """Swap in a fully built database version; started is the perf_counter() when its load began"""
+    global database, scanner_ready, _seen_modified_time
+    if started is not None:
+        database_load_seconds.labels(new_database.source).set(time.perf_counter() - started)
+    database_loads_total.labels(new_database.source).inc()
+    database = new_database
+    _seen_modified_time = new_database.modified_time
+    scanner_ready = True
+    startup.ready(f"Serving {len(new_database)} cards from {new_database.source}")
+
+def open_spreadsheet():
+    """Authorize with the service account and open the card spreadsheet (cached)"""
+    global _spreadsheet
+    if _spreadsheet is None:
+        import gspread
+        from google.oauth2.service_account import Credentials
+        
+        print("Google credentials found, attempting connection...")
+        creds_dict = json.loads(os.environ['GOOGLE_CREDENTIALS_JSON'])
+        
+        # Define required scopes for Google Sheets
+        scopes = [
+            'https://www.googleapis.com/auth/spreadsheets.readonly',
+            'https://www.googleapis.com/auth/drive.readonly'
+        ]
+        
+        credentials = Credentials.from_service_account_info(creds_dict, scopes=scopes)
+        gc = gspread.authorize(credentials)
+        gc.set_timeout(upstream.google_sheets.timeout)
+        
+        # Open the CHILLAURA TCG Library spreadsheet
+        _spreadsheet = upstream.google_sheets.call(gc.open_by_key, SPREADSHEET_ID)
+    return _spreadsheet
+
+def open_inventory_worksheet():
+    """The inventory worksheet, created if missing, through a client that may write (cached)"""
+    global _inventory_worksheet
+    if _inventory_worksheet is None:
+        import gspread
+        from google.oauth2.service_account import Credentials
+        
+        creds_dict = json.loads(os.environ['GOOGLE_CREDENTIALS_JSON'])
+        credentials = Credentials.from_service_account_info(
+            creds_dict, scopes=['https://www.googleapis.com/auth/spreadsheets']
+        )
+        gc = gspread.authorize(credentials)
+        gc.set_timeout(upstream.google_sheets.timeout)
+        sheet = upstream.google_sheets.call(gc.open_by_key, SPREADSHEET_ID)
+        try:
+            _inventory_worksheet = upstream.google_sheets.call(sheet.worksheet, INVENTORY_WORKSHEET)
+        except gspread.WorksheetNotFound:
+            _inventory_worksheet = upstream.google_sheets.call(sheet.add_worksheet, INVENTORY_WORKSHEET, rows=1000,
+                                                               cols=len(INVENTORY_HEADERS))
+    return _inventory_worksheet
+
+def sheet_modified_time(sheet):
+    """Drive modifiedTime of the spreadsheet, or None if the metadata is unavailable"""
+    try:
+        return upstream.google_sheets.call(sheet.get_lastUpdateTime)
+    except Exception as e:
+        print(f"Could not read spreadsheet modification time: {e}")
+        return None
+
+def fetch_database(sheet):
+    """Fetch the first worksheet as (df, content version), or None if it is empty"""
+    worksheet = upstream.google_sheets.call(sheet.get_worksheet, 0)  # First sheet
+    records = upstream.google_sheets.call(worksheet.get_all_records)
+    if not records:
+        print("Google Sheets returned empty data")
+        return None
+    import pandas as pd
+    new_df = pd.DataFrame(records)
+    return new_df, content_version(new_df)
+
+def fetch_csv_export():
+    """Fetch the sheet's public CSV export as (df, content version), or None if it is not shared publicly"""
+    import pandas as pd
+
+    response = upstream.google_sheets.request('GET', SHEETS_CSV_URL)
+    if response.status_code != 200 or 'DOCTYPE html' in response.text[:1000]:
+        print(f"CSV export unavailable: HTTP {response.status_code}")
+        return None
+    # Cells stay text, as the sheet shows them ("057/102", not 57)
+    new_df = pd.read_csv(io.StringIO(response.text), dtype=str, keep_default_na=False)
+    if new_df.empty:
+        print("CSV export returned empty data")
+        return None
+    return new_df, content_version(new_df)
 
 def load_database():
     """Load Pokemon card database from Google Sheets"""
-    global df, scanner_ready
-    
     try:
         print("Loading Pokemon card database from Google Sheets...")
+        started = time.perf_counter()
         
         # Try Google Sheets API with credentials
-        creds_json = os.environ.get('GOOGLE_CREDENTIALS_JSON')
-        if creds_json:
+        if os.environ.get('GOOGLE_CREDENTIALS_JSON'):
             try:
-                import gspread
-                from google.oauth2.service_account import Credentials
-                
-                print("Google credentials found, attempting connection...")
-                creds_dict = json.loads(creds_json)
-                
-                # Define required scopes for Google Sheets
-                scopes = [
-                    'https://www.googleapis.com/auth/spreadsheets.readonly',
-                    'https://www.googleapis.com/auth/drive.readonly'
-                ]
-                
-                credentials = Credentials.from_service_account_info(creds_dict, scopes=scopes)
-                gc = gspread.authorize(credentials)
-                
-                # Open the CHILLAURA TCG Library spreadsheet
-                sheet = gc.open_by_key("1JicEp6N0vrXVPbE6L1JGTLiNexXyPP5OraHQbDAqcXc")
-                worksheet = sheet.get_worksheet(0)  # First sheet
-                records = worksheet.get_all_records()
-                
-                if records:
-                    df = pd.DataFrame(records)
-                    print(f"✓ Database loaded from Google Sheets: {len(df)} cards")
-                    scanner_ready = True
+                sheet = open_spreadsheet()
+                modified_time = sheet_modified_time(sheet)
+                fetched = fetch_database(sheet)
+                if fetched:
+                    new_df, version = fetched
+                    publish_database(CardDatabase(new_df, version=version, modified_time=modified_time), started)
+                    print(f"✓ Database loaded from Google Sheets: {len(new_df)} cards")
+                    save_snapshot(new_df, version=version, modified_time=modified_time)
+                    record_prices(database)
                     return True
-                else:
-                    print("Google Sheets returned empty data")
                     
             except Exception as e:
                 print(f"Google Sheets authentication failed: {e}")
                 print("Verify that GOOGLE_CREDENTIALS_JSON environment variable is set correctly")
         else:
             print("GOOGLE_CREDENTIALS_JSON environment variable not found")
+            fetched = fetch_csv_export()
+            if fetched:
+                new_df, version = fetched
+                publish_database(CardDatabase(new_df, version=version, source='csv_export'), started)
+                print(f"✓ Database loaded from the CSV export: {len(new_df)} cards")
+                save_snapshot(new_df, source='csv_export', version=version)
+                record_prices(database)
+                return True
         
         # If Google Sheets fails, notify user that credentials are needed
         print("Failed to load database: Google Sheets authentication required")
@@ -71,382 +271,540 @@ def load_database():
         print(f"Database loading failed: {e}")
         return False
 
-def analyze_card_with_openai(image_data):
-    """Analyze Pokemon card using OpenAI Vision API"""
+def sheet_unchanged(modified_time):
+    """True when Drive metadata says the sheet has not changed since the last fetch"""
+    return database is not None and modified_time is not None and modified_time == _seen_modified_time
+
+def apply_fetched_database(new_df, version, modified_time, started=None, source='google_sheets'):
+    """Publish freshly fetched sheet data unless its content is unchanged; True if a new version went live"""
+    global _seen_modified_time
+    current = database
+    _seen_modified_time = modified_time
+    if current is not None and version == current.version:
+        # Metadata moved but the values did not (e.g. formatting edits); keep serving what we have
+        return False
+    
+    # Indexes are built here, off the request path; requests keep using `current` until the swap
+    publish_database(CardDatabase(new_df, version=version, source=source, modified_time=modified_time), started)
+    print(f"✓ Database refreshed from {source}: {len(new_df)} cards (version {version})")
+    save_snapshot(new_df, source=source, version=version, modified_time=modified_time)
+    record_prices(database)
+    return True
+
+def record_prices(new_database):
+    """Append a freshly fetched version's prices to the price history"""
+    if price_history is None:
+        return
     try:
-        api_key = os.environ.get('OPENAI_API_KEY')
-        if not api_key:
-            return None
-        
-        headers = {
-            'Authorization': f'Bearer {api_key}',
-            'Content-Type': 'application/json'
-        }
-        
-        payload = {
-            'model': 'gpt-4-vision-preview',
-            'messages': [
-                {
-                    'role': 'user',
-                    'content': [
-                        {
-                            'type': 'text',
-                            'text': 'Analyze this Pokemon card image and extract: card name, set name, card number, rarity. Return as JSON format: {"name": "", "set": "", "number": "", "rarity": ""}'
-                        },
-                        {
-                            'type': 'image_url',
-                            'image_url': {
-                                'url': f'data:image/jpeg;base64,{image_data}'
-                            }
+        changes = price_history.append(card_keys(new_database.cards), new_database.cards.price_cents,
+                                       new_database.loaded_at)
+        print(f"Price history: {changes} price changes recorded")
+    except Exception as e:
+        print(f"Failed to record price history: {e}")
+
+def refresh_database():
+    """Reload from Google Sheets only if the sheet changed since the current version"""
+    if database is None:
+        return load_database()
+    if not os.environ.get('GOOGLE_CREDENTIALS_JSON'):
+        # The export has no modification time, so compare content versions instead
+        started = time.perf_counter()
+        fetched = fetch_csv_export()
+        if not fetched:
+            return False
+        return apply_fetched_database(*fetched, None, started, source='csv_export')
+    
+    sheet = open_spreadsheet()
+    modified_time = sheet_modified_time(sheet)
+    if sheet_unchanged(modified_time):
+        return False
+    
+    started = time.perf_counter()
+    fetched = fetch_database(sheet)
+    if not fetched:
+        return False
+    return apply_fetched_database(*fetched, modified_time, started)
+
+def follow_snapshot():
+    """Pick up a version another worker published to the snapshot"""
+    manifest = read_manifest()
+    if manifest is None or (database is not None and manifest.get('data_version') in (None, database.version)):
+        return False
+    return load_database_snapshot()
+
+def refresh_shared_database():
+    """Refresh from Google Sheets in the lock-holding worker; the others reload its snapshots"""
+    if refresh_lock.acquire():
+        return refresh_database()
+    return follow_snapshot()
+
+def load_database_snapshot():
+    """Load the last good local snapshot, if there is one"""
+    started = time.perf_counter()
+    with startup.phase('snapshot_read'):
+        snapshot = load_snapshot(as_dataframe=False)
+    if snapshot is None:
+        return False
+    snapshot_table, manifest = snapshot
+    with startup.phase('database_build'):
+        new_database = CardDatabase(
+            snapshot_table,
+            version=manifest.get('data_version') or manifest.get('sha256', '')[:16],
+            source='snapshot',
+            modified_time=manifest.get('sheet_modified_time')
+        )
+    publish_database(new_database, started)
+    return True
+
+def load_initial_database():
+    """Local snapshot if there is one, otherwise Google Sheets (left to the refresher in fast-start mode)"""
+    loaded = load_database_snapshot()
+    if not loaded and FAST_START:
+        startup.ready("No database snapshot; serving the loading page while Google Sheets loads")
+    elif not loaded:
+        loaded = load_database()
+    return loaded
+
+def preload_database():
+    """Load the database in the gunicorn master (preload_app) so every forked worker shares one copy"""
+    loaded = load_initial_database()
+    # Keep the collector from writing to every shared object page after fork
+    gc.freeze()
+    return loaded
+
+def start_refresher():
+    """Start this process's background refresher; call after fork when preloading"""
+    global refresher
+    # Refresh immediately if we are serving a snapshot or still have nothing
+    refresher = DatabaseRefresher(refresh_shared_database).start(
+        run_now=database is None or database.source == 'snapshot'
+    )
+    start_inventory_flusher()
+    return refresher
+
+def start_inventory_flusher():
+    """Flush queued inventory changes in the background; without credentials they stay queued"""
+    if inventory_queue is not None and os.environ.get('GOOGLE_CREDENTIALS_JSON'):
+        inventory_queue.start()
+
+def warm_start():
+    """Serve from the local snapshot right away and keep refreshing from Google Sheets in the background"""
+    loaded = load_initial_database()
+    start_refresher()
+    return loaded
+
+def vision_request(image, mime_type='image/jpeg'):
+    """Headers and a VisionBody for a vision call on the raw image bytes, or None when OpenAI is not configured.
+    Close the body once the call returns"""
+    api_key = os.environ.get('OPENAI_API_KEY')
+    if not api_key:
+        return None
+    
+    headers = {
+        'Authorization': f'Bearer {api_key}',
+        'Content-Type': 'application/json'
+    }
+    
+    payload = {
+        'model': VISION_MODEL,
+        'messages': [
+            {
+                'role': 'user',
+                'content': [
+                    {
+                        'type': 'text',
+                        'text': VISION_PROMPT
+                    },
+                    {
+                        'type': 'image_url',
+                        'image_url': {
+                            'url': IMAGE_URL_PLACEHOLDER
                         }
-                    ]
-                }
-            ],
-            'max_tokens': 300
-        }
+                    }
+                ]
+            }
+        ],
+        'max_tokens': 300
+    }
+    with scan_stages['base64_encode'].time():
+        body = VisionBody(payload, image, mime_type)
+    headers['Content-Length'] = str(len(body))
+    return headers, body
+
+def parse_vision_response(result):
+    """Card info from a chat completion body"""
+    with scan_stages['parse_response'].time():
+        content = result['choices'][0]['message']['content']
+        try:
+            return json.loads(content)
+        except:
+            parse_fallbacks_total.inc()
+            return dict(UNPARSED_CARD_INFO)
+
+def analyze_card_with_openai(image, mime_type='image/jpeg'):
+    """Analyze Pokemon card using OpenAI Vision API; raises UpstreamError when OpenAI is rate limited or down"""
+    try:
+        vision = vision_request(image, mime_type)
+        if vision is None:
+            return None
+        headers, body = vision
         
-        response = requests.post(
-            'https://api.openai.com/v1/chat/completions',
-            headers=headers,
-            json=payload
-        )
+        with body, openai_in_flight.track_inprogress(), scan_stages['openai_request'].time():
+            response = upstream.openai_api.request(
+                'POST',
+                f'{OPENAI_BASE_URL}/chat/completions',
+                headers=headers,
+                data=body
+            )
         
         if response.status_code == 200:
-            result = response.json()
-            content = result['choices'][0]['message']['content']
-            try:
-                return json.loads(content)
-            except:
-                return {'name': 'Card detected', 'set': 'Unknown', 'number': '???', 'rarity': 'Unknown'}
+            return parse_vision_response(response.json())
         
+        if response.status_code >= 500:
+            raise UpstreamUnavailable(f'OpenAI answered HTTP {response.status_code}', status_code=response.status_code)
+        openai_errors_total.labels(response.status_code).inc()
         return None
         
+    except UpstreamError as e:
+        openai_errors_total.labels(e.status_code or type(e).__name__).inc()
+        raise
     except Exception as e:
+        openai_errors_total.labels(type(e).__name__).inc()
         print(f"OpenAI analysis error: {e}")
         return None
 
+def recognize_card(image_bytes):
+    """Card info for an image as (card_info, source): the cache, the local recognizer, then OpenAI"""
+    with scan_stages['cache_lookup'].time():
+        key = image_key(image_bytes, RECOGNITION_NAMESPACE)
+        card_info = recognition_cache.get(key)
+    if card_info is not None:
+        return card_info, 'cache'
+    
+    (card_info, source), shared = scan_flights.do(key, lambda: recognize_uncached(image_bytes, key))
+    if shared:
+        scans_coalesced_total.inc()
+    return card_info, source
+
+def recognize_uncached(image_bytes, key):
+    """The local recognizer, then OpenAI; caches what they recognize"""
+    # Confident perceptual-hash matches never reach the vision API
+    if card_recognizer is not None:
+        with scan_stages['local_match'].time():
+            card_info = card_recognizer.match(image_bytes)
+        if card_info is not None:
+            recognition_cache.put(key, card_info)
+            return card_info, 'local'
+    
+    # Upload only the upright, cropped, downscaled card rather than the raw phone photo
+    prepared = image_preprocessing.preprocess_image(image_bytes)
+    scan_stages['preprocess'].observe(prepared.elapsed_ms / 1000)
+    print(f"Vision upload prepared: {prepared.summary()}")
+    card_info = analyze_card_with_openai(prepared.data, prepared.mime_type)
+    if card_info and card_info != UNPARSED_CARD_INFO:
+        recognition_cache.put(key, card_info)
+    return card_info, 'openai'
+
+@app.errorhandler(413)
+def request_too_large(e):
+    return jsonify({'error': f'Request too large: at most {megabytes(SCAN_MAX_REQUEST_BYTES)}'}), 413
+
 @app.route('/health')
 def health():
     return jsonify({'status': 'healthy', 'scanner_ready': scanner_ready}), 200
 
 @app.route('/status')
 def status():
-    return jsonify({
+    return jsonify(status_payload())
+
+@app.route('/metrics')
+def prometheus_metrics():
+    return Response(metrics.REGISTRY.render(), content_type=metrics.CONTENT_TYPE)
+
+def status_payload():
+    db = database
+    result = {
         'scanner_ready': scanner_ready,
-        'database_size': len(df) if df is not None else 0,
+        'database_size': len(db) if db is not None else 0,
         'openai_available': bool(os.environ.get('OPENAI_API_KEY')),
         'google_sheets_configured': bool(os.environ.get('GOOGLE_CREDENTIALS_JSON')),
         'status': 'ready' if scanner_ready else 'loading'
-    })
+    }
+    if db is not None:
+        result.update(db.status())
+    if refresher is not None:
+        result.update(refresher.status())
+        result['refresh_leader'] = refresh_lock.held
+    result['worker_pid'] = os.getpid()
+    result['recognition_cache'] = recognition_cache.stats()
+    result['scan_coalescing'] = scan_flights.stats()
+    result['upstreams'] = {service.name: service.stats() for service in upstream.upstreams}
+    if price_history is not None:
+        result['price_history'] = price_history.stats()
+    if inventory_queue is not None:
+        result['inventory_queue'] = inventory_queue.stats()
+    result['local_reference_images'] = len(card_recognizer) if card_recognizer is not None else 0
+    result['image_preprocessing'] = image_preprocessing.stats.snapshot()
+    result['scan_jobs'] = scan_jobs.stats()
+    result['startup'] = startup.summary()
+    return result
+
+def current_page():
+    """The loading page until the database is ready, then the scanner page"""
+    openai_available = bool(os.environ.get('OPENAI_API_KEY'))
+    database_size = len(database) if database is not None else 0
+    if not scanner_ready:
+        return render_page('loading.html', google_sheets=bool(os.environ.get('GOOGLE_CREDENTIALS_JSON')),
+                           openai=openai_available, database_size=database_size)
+    return render_page('index.html', database_size=database_size, openai_available=openai_available)
+
+@functools.lru_cache(maxsize=32)
+def render_page(name, **context):
+    """Rendered once per distinct context; the loading page's auto-refresh hits this cache"""
+    html = page_templates[name].render(assets=assets.urls, **context)
+    return PreparedBody(html.encode('utf-8'), 'text/html; charset=utf-8')
+
+def send_prepared(prepared, cache_control):
+    status, body, headers = conditional_response(
+        prepared, request.headers.get('Accept-Encoding'), request.headers.get('If-None-Match'), cache_control
+    )
+    return Response(body, status=status, headers=headers)
 
 @app.route('/')
 def index():
-    if not scanner_ready:
-        return render_template_string('''
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <title>Pokemon TCG Scanner</title>
-            <meta http-equiv="refresh" content="5">
-            <style>
-                body { 
-                    font-family: Arial; 
-                    text-align: center; 
-                    padding: 50px; 
-                    background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); 
-                    color: white; 
-                    min-height: 100vh;
-                    margin: 0;
-                }
-                .container {
-                    max-width: 600px;
-                    margin: 0 auto;
-                    background: rgba(255,255,255,0.1);
-                    padding: 3rem;
-                    border-radius: 20px;
-                    backdrop-filter: blur(10px);
-                }
-                .loading { 
-                    font-size: 1.2rem; 
-                    margin-top: 20px; 
-                }
-                .status {
-                    background: rgba(255,255,255,0.2);
-                    padding: 1rem;
-                    border-radius: 10px;
-                    margin-top: 2rem;
-                    text-align: left;
-                }
-            </style>
-        </head>
-        <body>
-            <div class="container">
-                <h1>Pokemon TCG Scanner</h1>
-                <div class="loading">Loading database from Google Sheets...</div>
-                <div class="status">
-                    <strong>Status:</strong><br>
-                    • Google Sheets: {{ "Configured" if google_sheets else "Needs Configuration" }}<br>
-                    • OpenAI API: {{ "Ready" if openai else "Needs Configuration" }}<br>
-                    • Database: {{ database_size }} cards loaded
-                </div>
-                <p><small>If loading persists, check Railway environment variables</small></p>
-            </div>
-        </body>
-        </html>
-        ''', 
-        google_sheets=bool(os.environ.get('GOOGLE_CREDENTIALS_JSON')),
-        openai=bool(os.environ.get('OPENAI_API_KEY')),
-        database_size=len(df) if df is not None else 0
-        )
+    return send_prepared(current_page(), PAGE_CACHE_CONTROL)
+
+@app.route('/assets/<name>')
+def asset(name):
+    prepared = assets.get(name)
+    if prepared is None:
+        return jsonify({'error': 'Not found'}), 404
+    return send_prepared(prepared, ASSET_CACHE_CONTROL)
+
+@app.route('/card/<set_name>/<path:number>')
+def card_lookup(set_name, number):
+    """Exact lookup by set (name or code) and card number, e.g. /card/base-set/4/102"""
+    db = database
+    if db is None:
+        return jsonify({'error': 'Database not loaded. Please check Google Sheets configuration.'}), 503
+    rows = db.cards.lookup(set_name, number)
+    if not rows:
+        return jsonify({'error': 'Card not found'}), 404
+    return jsonify({'cards': [db.cards.record(row_id).to_dict() for row_id in rows]})
+
+@app.route('/price')
+def card_price():
+    """Market price by set and number, e.g. /price?set=Base+Set&number=4"""
+    db = database
+    if db is None:
+        return jsonify({'error': 'Database not loaded. Please check Google Sheets configuration.'}), 503
+    set_name = request.args.get('set', '')
+    number = request.args.get('number', '')
+    if not set_name or not number:
+        return jsonify({'error': 'Both set and number are required'}), 400
+    rows = db.cards.lookup(set_name, number)
+    if not rows:
+        return jsonify({'error': 'Card not found'}), 404
+    prices = []
+    for row_id in rows:
+        record = db.cards.record(row_id)
+        prices.append({
+            'name': record.name,
+            'set': record.set,
+            'number': record.number,
+            'market_price': record.market_price,
+            'price_cents': record.price_cents,
+        })
+    return jsonify({'prices': prices})
+
+def requested_fields(default):
+    """Fields named in ?fields=, or the default; raises ValueError for unknown names"""
+    value = request.args.get('fields')
+    if not value:
+        return default
+    fields = tuple(field.strip() for field in value.split(',') if field.strip())
+    unknown = [field for field in fields if field not in CARD_FIELDS]
+    if unknown or not fields:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}. Choose from {', '.join(CARD_FIELDS)}")
+    return fields
+
+def requested_limit(default, maximum):
+    try:
+        return min(max(int(request.args.get('limit', default)), 1), maximum)
+    except ValueError:
+        return default
+
+@app.route('/search')
+def search_cards():
+    """Typeahead: cards whose name has a word starting with ?q=, one cursor-paginated page at a time"""
+    db = database
+    if db is None:
+        return jsonify({'error': 'Database not loaded. Please check Google Sheets configuration.'}), 503
+    query = request.args.get('q', '')
+    if not query.strip():
+        return jsonify({'error': 'Missing search query'}), 400
+    try:
+        fields = requested_fields(SEARCH_DEFAULT_FIELDS)
+        resume = decode_cursor(request.args['cursor'], db.version) if request.args.get('cursor') else None
+        if resume is not None:
+            if len(resume) != 3:
+                raise InvalidCursor('Malformed cursor')
+            tier, position, skip = resume
+            if not 0 <= tier < len(db.card_index.prefix_tiers) or position < 0 or skip < 0:
+                raise InvalidCursor('Malformed cursor')
+    except (ValueError, InvalidCursor) as e:
+        return jsonify({'error': str(e)}), 400
     
-    return render_template_string('''
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <title>CHILLAURA Pokemon TCG Scanner</title>
-        <meta name="viewport" content="width=device-width, initial-scale=1">
-        <style>
-            * { margin: 0; padding: 0; box-sizing: border-box; }
-            body {
-                font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
-                background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-                min-height: 100vh;
-                color: #333;
-            }
-            .header {
-                background: rgba(255,255,255,0.95);
-                padding: 2rem;
-                text-align: center;
-                box-shadow: 0 4px 20px rgba(0,0,0,0.1);
-                margin-bottom: 2rem;
-            }
-            h1 {
-                color: #2c3e50;
-                font-size: 3rem;
-                margin-bottom: 0.5rem;
-            }
-            .subtitle {
-                color: #7f8c8d;
-                font-size: 1.2rem;
-            }
-            .container {
-                max-width: 900px;
-                margin: 0 auto;
-                padding: 0 1rem;
-            }
-            .stats {
-                background: rgba(255,255,255,0.9);
-                border-radius: 15px;
-                padding: 1.5rem;
-                margin-bottom: 2rem;
-                text-align: center;
-                color: #2c3e50;
-            }
-            .scanner-section {
-                background: white;
-                border-radius: 20px;
-                padding: 3rem;
-                box-shadow: 0 10px 30px rgba(0,0,0,0.1);
-                margin-bottom: 2rem;
-            }
-            .upload-area {
-                border: 3px dashed #3498db;
-                border-radius: 15px;
-                padding: 4rem 2rem;
-                text-align: center;
-                background: linear-gradient(135deg, #f8f9fa 0%, #e3f2fd 100%);
-                transition: all 0.3s ease;
-                cursor: pointer;
-            }
-            .upload-area:hover {
-                border-color: #2980b9;
-                transform: translateY(-5px);
-                box-shadow: 0 15px 35px rgba(52, 152, 219, 0.2);
-            }
-            .upload-icon {
-                font-size: 4rem;
-                margin-bottom: 1rem;
-            }
-            .btn {
-                background: linear-gradient(135deg, #3498db, #2980b9);
-                color: white;
-                padding: 15px 40px;
-                border: none;
-                border-radius: 30px;
-                font-size: 1.2rem;
-                cursor: pointer;
-                transition: all 0.3s ease;
-                margin: 20px;
-                box-shadow: 0 6px 20px rgba(52, 152, 219, 0.3);
-            }
-            .btn:hover:not(:disabled) {
-                transform: translateY(-3px);
-                box-shadow: 0 8px 25px rgba(52, 152, 219, 0.4);
-            }
-            .btn:disabled {
-                background: #bdc3c7;
-                cursor: not-allowed;
-                transform: none;
-                box-shadow: none;
-            }
-            .card-result {
-                background: white;
-                border-radius: 15px;
-                padding: 2rem;
-                margin: 1.5rem 0;
-                box-shadow: 0 8px 25px rgba(0,0,0,0.1);
-                border-left: 6px solid #3498db;
-                transition: transform 0.3s ease;
-            }
-            .card-result:hover {
-                transform: translateY(-3px);
-            }
-            .card-name {
-                font-size: 2rem;
-                font-weight: bold;
-                color: #2c3e50;
-                margin-bottom: 1rem;
-            }
-            .card-info {
-                display: grid;
-                grid-template-columns: repeat(auto-fit, minmax(200px, 1fr));
-                gap: 1.5rem;
-            }
-            .info-item {
-                background: #f8f9fa;
-                padding: 1rem;
-                border-radius: 10px;
-                border: 1px solid #e9ecef;
-            }
-            .info-label {
-                font-weight: bold;
-                color: #495057;
-                font-size: 0.9rem;
-                margin-bottom: 0.5rem;
-                text-transform: uppercase;
-            }
-            .info-value {
-                color: #2c3e50;
-                font-size: 1.1rem;
-                font-weight: 500;
-            }
-            .loading {
-                text-align: center;
-                padding: 3rem;
-                color: #7f8c8d;
-                font-size: 1.2rem;
-            }
-            .error {
-                background: #e74c3c;
-                color: white;
-                padding: 1.5rem;
-                border-radius: 10px;
-                margin: 1.5rem 0;
-                text-align: center;
-            }
-        </style>
-    </head>
-    <body>
-        <div class="header">
-            <h1>Pokemon TCG Scanner</h1>
-            <p class="subtitle">AI-Powered Card Recognition with Live Database</p>
-        </div>
-        
-        <div class="container">
-            <div class="stats">
-                <strong>Database:</strong> {{ database_size }} Pokemon cards loaded from Google Sheets<br>
-                <strong>AI Recognition:</strong> {{ 'Enabled' if openai_available else 'Configure OpenAI API' }}
-            </div>
-            
-            <div class="scanner-section">
-                <div class="upload-area" onclick="document.getElementById('cardImage').click()">
-                    <div class="upload-icon">📷</div>
-                    <h3>Upload Pokemon Card Image</h3>
-                    <p>AI will analyze your card and find matches in the live database</p>
-                    <input type="file" id="cardImage" accept="image/*" style="display: none;" />
-                </div>
-                
-                <div style="text-align: center;">
-                    <button class="btn" onclick="scanCard()" id="scanBtn" disabled>
-                        Analyze Card
-                    </button>
-                </div>
-                
-                <div id="results"></div>
-            </div>
-        </div>
-        
-        <script>
-        document.getElementById('cardImage').addEventListener('change', function(e) {
-            document.getElementById('scanBtn').disabled = !e.target.files[0];
-        });
-        
-        async function scanCard() {
-            const file = document.getElementById('cardImage').files[0];
-            if (!file) return;
-            
-            const btn = document.getElementById('scanBtn');
-            btn.disabled = true;
-            btn.textContent = 'Analyzing...';
-            
-            document.getElementById('results').innerHTML = '<div class="loading">AI analyzing card image...</div>';
-            
-            const formData = new FormData();
-            formData.append('file', file);
-            
-            try {
-                const response = await fetch('/scan', { method: 'POST', body: formData });
-                const result = await response.json();
-                
-                let html = '';
-                if (result.cards?.length > 0) {
-                    result.cards.forEach(card => {
-                        html += `
-                            <div class="card-result">
-                                <div class="card-name">${card.name}</div>
-                                <div class="card-info">
-                                    <div class="info-item">
-                                        <div class="info-label">Set</div>
-                                        <div class="info-value">${card.set}</div>
-                                    </div>
-                                    <div class="info-item">
-                                        <div class="info-label">Number</div>
-                                        <div class="info-value">${card.number}</div>
-                                    </div>
-                                    <div class="info-item">
-                                        <div class="info-label">Rarity</div>
-                                        <div class="info-value">${card.rarity}</div>
-                                    </div>
-                                    <div class="info-item">
-                                        <div class="info-label">Market Price</div>
-                                        <div class="info-value">${card.market_price || 'N/A'}</div>
-                                    </div>
-                                </div>
-                                ${card.tcgplayer_url ? `<div style="margin-top: 1rem; text-align: center;"><a href="${card.tcgplayer_url}" target="_blank" style="color: #3498db; text-decoration: none; font-weight: bold;">View on TCGPlayer →</a></div>` : ''}
-                            </div>
-                        `;
-                    });
-                } else if (result.error) {
-                    html = `<div class="error">${result.error}</div>`;
-                } else {
-                    html = '<div class="error">No matching cards found. Try a different image or angle.</div>';
-                }
-                
-                document.getElementById('results').innerHTML = html;
-            } catch (error) {
-                document.getElementById('results').innerHTML = '<div class="error">Error analyzing card. Please try again.</div>';
-            }
-            
-            btn.disabled = false;
-            btn.textContent = 'Analyze Card';
-        }
-        </script>
-    </body>
-    </html>
-    ''', 
-    database_size=len(df) if df is not None else 0, 
-    openai_available=bool(os.environ.get('OPENAI_API_KEY'))
+    distinct = request.args.get('distinct', '').lower() in ('1', 'true', 'yes')
+    rows, resume = db.card_index.complete(
+        query, requested_limit(SEARCH_DEFAULT_LIMIT, SEARCH_MAX_LIMIT), resume, distinct=distinct
     )
+    return jsonify({
+        'query': query,
+        'cards': [db.cards.record(row_id).project(fields) for row_id in rows],
+        'next_cursor': encode_cursor(db.version, *resume) if resume else None,
+    })
+
+@app.route('/price-history/<set_name>/<path:number>')
+def card_price_history(set_name, number):
+    """Price changes and min/max/avg of a card over a time range, e.g. /price-history/base-set/4?from=2024-01-01"""
+    db = database
+    if db is None:
+        return jsonify({'error': 'Database not loaded. Please check Google Sheets configuration.'}), 503
+    if price_history is None:
+        return jsonify({'error': 'Price history is disabled'}), 404
+    try:
+        start = parse_time(request.args.get('from'))
+        end = parse_time(request.args.get('to'))
+    except ValueError:
+        return jsonify({'error': 'from and to must be unix seconds or ISO 8601 dates'}), 400
+    rows = db.cards.lookup(set_name, number)
+    if not rows:
+        return jsonify({'error': 'Card not found'}), 404
+
+    cards = []
+    for row_id in rows:
+        record = db.cards.record(row_id)
+        cards.append({'name': record.name, 'set': record.set, 'number': record.number,
+                      'price_history': price_history.history(row_card_key(db.cards, row_id), start, end)})
+    return jsonify({'cards': cards})
+
+def parse_time(text):
+    """Unix seconds from '1718000000', '2024-06-10' or '2024-06-10T12:00:00Z'; None when absent"""
+    if not text:
+        return None
+    try:
+        return float(text)
+    except ValueError:
+        pass
+    moment = datetime.fromisoformat(text.replace('Z', '+00:00'))
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.timestamp()
+
+@app.route('/inventory', methods=['POST'])
+def update_inventory():
+    """Queue quantity changes, e.g. {"changes": [{"set": "Base Set", "number": "4", "quantity": 2}]}"""
+    db = database
+    if db is None:
+        return jsonify({'error': 'Database not loaded. Please check Google Sheets configuration.'}), 503
+    if inventory_queue is None:
+        return jsonify({'error': 'Inventory updates are disabled'}), 404
+    payload = request.get_json(silent=True)
+    changes = payload.get('changes', [payload]) if isinstance(payload, dict) else None
+    if not isinstance(changes, list) or not changes or not all(isinstance(change, dict) for change in changes):
+        return jsonify({'error': 'Expected a JSON object with set, number and quantity, or a list of them in changes'}), 400
+    
+    # Validate everything before queueing anything
+    queued = []
+    for position, change in enumerate(changes):
+        try:
+            quantity = requested_quantity(change.get('quantity', 1))
+        except ValueError as e:
+            return jsonify({'error': f'changes[{position}]: {e}'}), 400
+        rows = db.cards.lookup(change.get('set') or '', change.get('number') or '')
+        if change.get('name'):
+            name = normalize_name(change['name'])
+            rows = [row_id for row_id in rows if db.card_index.names[row_id] == name]
+        if not rows:
+            return jsonify({'error': f'changes[{position}]: Card not found'}), 404
+        record = db.cards.record(rows[0])
+        queued.append({'name': record.name, 'set': record.set, 'number': record.number, 'quantity': quantity})
+    for card in queued:
+        inventory_queue.add(card['set'], card['number'], card['name'], card['quantity'])
+    return jsonify({'queued': queued, 'inventory_queue': inventory_queue.stats()}), 202
+
+@app.route('/library')
+def library():
+    """Stream the catalog as NDJSON or CSV, optionally gzipped, revalidated by the database version"""
+    db = database
+    if db is None:
+        return jsonify({'error': 'Database not loaded. Please check Google Sheets configuration.'}), 503
+    output = request.args.get('format', 'ndjson').lower()
+    if output not in ('ndjson', 'csv'):
+        return jsonify({'error': 'format must be ndjson or csv'}), 400
+    try:
+        fields = requested_fields(CARD_FIELDS)
+        start = decode_cursor(request.args['cursor'], db.version) if request.args.get('cursor') else [0]
+        if len(start) != 1 or start[0] < 0:
+            raise InvalidCursor('Malformed cursor')
+        start = min(start[0], len(db))
+        limit = int(request.args['limit']) if request.args.get('limit') else None
+    except (ValueError, InvalidCursor) as e:
+        return jsonify({'error': str(e)}), 400
+    stop = len(db) if limit is None else min(len(db), start + max(limit, 1))
+    
+    # The same URL always yields the same rows for one database version
+    gzipped = request.accept_encodings.quality('gzip') > 0
+    etag = f'{db.version}-gz' if gzipped else str(db.version)
+    headers = {'ETag': f'"{etag}"', 'Cache-Control': 'no-cache', 'Vary': 'Accept-Encoding'}
+    if stop < len(db):
+        next_cursor = encode_cursor(db.version, stop)
+        headers['X-Next-Cursor'] = next_cursor
+        headers['Link'] = f'<{request.path}?{library_query(cursor=next_cursor)}>; rel="next"'
+    if request.if_none_match.contains(etag):
+        return Response(status=304, headers=headers)
+    
+    def chunks():
+        if output == 'csv':
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(fields)
+            yield pop_text(buffer).encode('utf-8')
+        for chunk_start in range(start, stop, LIBRARY_CHUNK_ROWS):
+            records = (db.cards.record(row_id) for row_id in range(chunk_start, min(chunk_start + LIBRARY_CHUNK_ROWS, stop)))
+            if output == 'csv':
+                writer.writerows([getattr(record, field) for field in fields] for record in records)
+                text = pop_text(buffer)
+            else:
+                text = ''.join(json.dumps(record.project(fields)) + '\n' for record in records)
+            yield text.encode('utf-8')
+    
+    def gzip_chunks():
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+        for chunk in chunks():
+            data = compressor.compress(chunk)
+            if data:
+                yield data
+        yield compressor.flush()
+    
+    if gzipped:
+        headers['Content-Encoding'] = 'gzip'
+    mimetype = 'text/csv' if output == 'csv' else 'application/x-ndjson'
+    return Response(gzip_chunks() if gzipped else chunks(), mimetype=mimetype, headers=headers)
+
+def pop_text(buffer):
+    """Everything written to a StringIO so far, leaving it empty"""
+    text = buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    return text
+
+def library_query(**overrides):
+    """The current query string with some parameters replaced"""
+    args = request.args.to_dict()
+    args.update(overrides)
+    return urlencode(args)
 
 @app.route('/scan', methods=['POST'])
 def scan_card():
@@ -460,48 +818,214 @@ def scan_card():
     if file.filename == '':
         return jsonify({'error': 'No file selected'}), 400
     
+    # Read image
     try:
-        # Read and encode image
-        image_data = base64.b64encode(file.read()).decode('utf-8')
-        
-        # Analyze with OpenAI if available
-        api_key = os.environ.get('OPENAI_API_KEY')
-        if api_key:
-            card_info = analyze_card_with_openai(image_data)
+        image_bytes = read_upload(file)
+    except UploadTooLarge as e:
+        return jsonify({'error': str(e)}), 413
+    result, status_code = scan_image(image_bytes)
+    try:
+        queue_scanned_card(result, requested_quantity(request.form.get('add_to_inventory')))
+    except ValueError as e:
+        result['inventory_error'] = str(e)
+    return jsonify(result), status_code, retry_after_headers(result)
+
+@app.route('/scan/batch', methods=['POST'])
+def scan_batch():
+    """Scan many images in one request, streaming one NDJSON line per image as each finishes"""
+    if not scanner_ready:
+        return jsonify({'error': 'Database not loaded. Please check Google Sheets configuration.'}), 503
+    
+    files = [f for f in request.files.getlist('files') + request.files.getlist('file') if f.filename]
+    if not files:
+        return jsonify({'error': 'No files uploaded'}), 400
+    if len(files) > SCAN_BATCH_MAX_IMAGES:
+        return jsonify({'error': f'Too many images: at most {SCAN_BATCH_MAX_IMAGES} per batch'}), 413
+    
+    # Copy uploads out now, as the request body is gone once the response starts streaming. They are
+    # spooled (to disk past UPLOAD_SPOOL_BYTES) and read into memory only when their scan runs
+    uploads = []
+    try:
+        for f in files:
+            uploads.append(spool_upload_file(f))
+    except UploadTooLarge as e:
+        for upload in uploads:
+            upload.close()
+        return jsonify({'error': f'{files[len(uploads)].filename}: {e}'}), 413
+    futures = {
+        scan_executor.submit(scan_spooled, upload): (position, f.filename)
+        for position, (f, upload) in enumerate(zip(files, uploads))
+    }
+    
+    def generate():
+        for future in as_completed(futures):
+            position, filename = futures[future]
+            result, status_code = future.result()
+            yield json.dumps({'index': position, 'filename': filename, 'status': status_code, **result}) + '\n'
+    
+    return Response(generate(), mimetype='application/x-ndjson')
+
+@app.route('/scan/jobs', methods=['POST'])
+def submit_scan_job():
+    """Queue a scan and return its job id immediately"""
+    if not scanner_ready:
+        return jsonify({'error': 'Database not loaded. Please check Google Sheets configuration.'}), 503
+    
+    if 'file' not in request.files:
+        return jsonify({'error': 'No file uploaded'}), 400
+    
+    file = request.files['file']
+    if file.filename == '':
+        return jsonify({'error': 'No file selected'}), 400
+    
+    try:
+        upload = spool_upload_file(file)
+    except UploadTooLarge as e:
+        return jsonify({'error': str(e)}), 413
+    try:
+        job = scan_jobs.submit(upload)
+    except QueueFull:
+        upload.close()
+        return jsonify({'error': 'Scanner is busy. Please try again shortly.'}), 503
+    
+    return jsonify({
+        'job_id': job.id,
+        'status': job.status,
+        'status_url': f'/scan/jobs/{job.id}',
+        'events_url': f'/scan/jobs/{job.id}/events'
+    }), 202
+
+@app.route('/scan/jobs/<job_id>')
+def scan_job_status(job_id):
+    job = scan_jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown or expired job'}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/scan/jobs/<job_id>/events')
+def scan_job_events(job_id):
+    """Server-sent events: the current status, then the result when the job finishes"""
+    job = scan_jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown or expired job'}), 404
+    if not event_streams.acquire(blocking=False):
+        # EventSource clients fall back to polling the status URL
+        return jsonify({'error': 'Too many event streams; poll status_url instead',
+                        'status_url': f'/scan/jobs/{job.id}'}), 503, {'Retry-After': '1'}
+    
+    def generate():
+        yield f"event: status\ndata: {json.dumps({'job_id': job.id, 'status': job.status})}\n\n"
+        deadline = time.time() + SCAN_EVENTS_TIMEOUT
+        while not job.wait(timeout=15):
+            if time.time() > deadline:
+                yield "event: timeout\ndata: {}\n\n"
+                return
+            # Keep proxies from closing an idle stream
+            yield ": keep-alive\n\n"
+        yield f"event: result\ndata: {json.dumps(job.to_dict())}\n\n"
+    
+    response = Response(generate(), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    # Runs when the stream ends or the client goes away, even if the generator never started
+    response.call_on_close(event_streams.release)
+    return response
+
+def scan_image(image_bytes):
+    """Recognize one image and look it up; returns the /scan response body and status code"""
+    with scans_in_flight.track_inprogress(), scan_stages['total'].time():
+        source = 'none'
+        try:
+            # Repeat scans come from the cache and known cards from the local recognizer;
+            # everything else needs OpenAI
+            card_info, source = recognize_card(image_bytes)
             if card_info:
                 # Search database for matches
-                matches = search_database(card_info)
+                with scan_stages['search_database'].time():
+                    matches = search_database(card_info)
                 if matches:
-                    return jsonify({'cards': matches})
-        
-        return jsonify({'error': 'Card analysis requires OpenAI API configuration'})
-        
-    except Exception as e:
-        return jsonify({'error': f'Analysis failed: {str(e)}'}), 500
+                    scans_total.labels(source, 'matched').inc()
+                    return {'cards': matches, 'recognized_by': source}, 200
+            
+            scans_total.labels(source, 'unmatched').inc()
+            return unrecognized_response(), 200
+            
+        except UpstreamError as e:
+            scans_total.labels(source, 'unavailable').inc()
+            return upstream_error_response(e), 503
+        except Exception as e:
+            scans_total.labels(source, 'error').inc()
+            return {'error': f'Analysis failed: {str(e)}'}, 500
+
+def unrecognized_response():
+    if not os.environ.get('OPENAI_API_KEY'):
+        return {'error': 'Card analysis requires OpenAI API configuration'}
+    return {'error': 'Card not recognized. Try another photo.'}
+
+def upstream_error_response(error):
+    """503 body for a scan that could not reach OpenAI; retry_after tells clients when to try again"""
+    body = {'error': f'Card analysis is temporarily unavailable: {error}'}
+    if error.retry_after is not None:
+        body['retry_after'] = max(round(error.retry_after), 1)
+    return body
+
+def retry_after_headers(result):
+    return {'Retry-After': str(result['retry_after'])} if 'retry_after' in result else None
+
+def read_upload(file):
+    with scan_stages['read_upload'].time():
+        return read_limited(file)
+
+def spool_upload_file(file):
+    with scan_stages['read_upload'].time():
+        return spool_upload(file)
+
+def scan_spooled(upload):
+    """scan_image on a SpooledUpload, which is closed afterwards"""
+    with upload:
+        image_bytes = upload.read()
+    return scan_image(image_bytes)
+
+def requested_quantity(value):
+    """Quantity change from a request field: None when absent, else a non-zero integer"""
+    if value is None or value == '':
+        return None
+    try:
+        quantity = int(value)
+    except (TypeError, ValueError):
+        raise ValueError('Quantity must be a whole number')
+    if quantity == 0:
+        raise ValueError('Quantity must not be 0')
+    return quantity
+
+def queue_scanned_card(result, quantity):
+    """Queue a quantity change for a scan's best match; only a local journal write, never a Sheets call"""
+    cards = result.get('cards')
+    if quantity is None or not cards:
+        return
+    if inventory_queue is None:
+        raise ValueError('Inventory updates are disabled')
+    card = cards[0]
+    inventory_queue.add(card['set'], card['number'], card['name'], quantity)
+    result['inventory'] = {'queued': quantity, 'name': card['name'], 'set': card['set'], 'number': card['number']}
 
 def search_database(card_info):
     """Search database for card matches"""
     try:
-        if df is None or len(df) == 0:
+        # Hold one version for the whole search, even if a refresh swaps it meanwhile
+        db = database
+        if db is None or len(db) == 0:
             return []
         
-        matches = []
-        card_name = card_info.get('name', '').lower()
+        # A clean set + number from the vision model identifies the card directly
+        matches = exact_matches(db, card_info)
+        if matches:
+            return matches
         
-        # Search by name similarity
-        for _, row in df.iterrows():
-            db_name = str(row.get('Name', '')).lower()
-            if card_name and (card_name in db_name or db_name in card_name):
-                matches.append({
-                    'name': str(row.get('Name', 'Unknown')),
-                    'set': str(row.get('Set', 'Unknown Set')),
-                    'number': str(row.get('Card Number', '???')),
-                    'rarity': str(row.get('Rarity', 'Unknown')),
-                    'market_price': str(row.get('Market Price', 'N/A')),
-                    'tcgplayer_url': str(row.get('TCGPlayer Link', '')) if 'TCGPlayer Link' in row else ''
-                })
-                if len(matches) >= 3:
-                    break
+        # Rank every candidate on name, number, set and rarity
+        for row_id, score in db.card_matcher.top_k(card_info, k=3):
+            match = db.cards.record(row_id).to_dict()
+            match['match_score'] = round(score, 3)
+            matches.append(match)
         
         return matches
         
@@ -509,9 +1033,33 @@ def search_database(card_info):
         print(f"Database search error: {e}")
         return []
 
+def exact_matches(db, card_info, k=3):
+    """Cards with exactly the recognized set and number whose name also roughly agrees"""
+    rows = db.cards.lookup(card_info.get('set'), card_info.get('number'))
+    if not rows:
+        return []
+    name = normalize_name(card_info.get('name'))
+    ranked = sorted(
+        ((text_similarity(name, db.card_index.names[row_id]) if name else 1.0, row_id) for row_id in rows),
+        key=lambda item: -item[0]
+    )
+    matches = []
+    for similarity, row_id in ranked[:k]:
+        if similarity < EXACT_MATCH_MIN_NAME_SIMILARITY:
+            break
+        match = db.cards.record(row_id).to_dict()
+        match['match_score'] = 1.0
+        matches.append(match)
+    return matches
+
+# Job state lives in this process, so clients must poll the worker that accepted the job;
+# serve with one gunicorn worker and several threads
+scan_jobs = ScanJobQueue(scan_spooled)
+startup.mark('import')
+
 if __name__ == '__main__':
     print("Starting Pokemon TCG Scanner...")
-    success = load_database()
+    success = warm_start()
     if not success:
         print("Warning: Database not loaded. Check environment configuration.")
     
@@ -0,0 +1,136 @@
+"""
+Recognition Cache
+Caches vision results by image content hash: in-process LRU plus an optional shared SQLite tier
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+DEFAULT_CACHE_SIZE = int(os.environ.get('RECOGNITION_CACHE_SIZE', '2048'))
+DEFAULT_CACHE_TTL = int(os.environ.get('RECOGNITION_CACHE_TTL', str(7 * 24 * 3600)))
+DEFAULT_CACHE_PATH = os.environ.get('RECOGNITION_CACHE_PATH', 'data/recognition_cache.db')
+# Expired rows are swept from SQLite once every this many writes
+PRUNE_EVERY = 200
+
+
+def image_key(image_bytes, namespace=''):
+    """Content hash of the uploaded image bytes, prefixed with the namespace (the model and prompt) that
+    produced the cached answer, so changing either stops old answers from being served"""
+    digest = hashlib.sha256(image_bytes).hexdigest()
+    return f'{namespace}:{digest}' if namespace else digest
+
+
+class RecognitionCache:
+    def __init__(self, max_entries=DEFAULT_CACHE_SIZE, ttl=DEFAULT_CACHE_TTL, db_path=DEFAULT_CACHE_PATH):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.db_path = db_path or None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._writes = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        if self.db_path:
+            try:
+                Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+                with self._connection() as conn:
+                    conn.execute(
+                        'CREATE TABLE IF NOT EXISTS recognition_cache '
+                        '(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)'
+                    )
+            except Exception as e:
+                print(f"Recognition cache: persistent tier disabled ({e})")
+                self.db_path = None
+
+    def _connection(self):
+        """One SQLite connection per thread; WAL lets every gunicorn worker read while one writes"""
+        conn = getattr(self._local, 'conn', None)
+        # A connection opened before a preload fork must not be used by the child
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=5)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _remember(self, key, value, expires_at):
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def get(self, key):
+        """Cached card info for an image hash, or None"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    self.memory_hits += 1
+                    return entry[1]
+                del self._entries[key]
+
+        if self.db_path:
+            try:
+                row = self._connection().execute(
+                    'SELECT value, expires_at FROM recognition_cache WHERE key = ? AND expires_at > ?', (key, now)
+                ).fetchone()
+                if row is not None:
+                    value = json.loads(row[0])
+                    self._remember(key, value, row[1])
+                    with self._lock:
+                        self.disk_hits += 1
+                    return value
+            except Exception as e:
+                print(f"Recognition cache read error: {e}")
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, value):
+        """Store card info for an image hash in both tiers"""
+        expires_at = time.time() + self.ttl
+        self._remember(key, value, expires_at)
+        if not self.db_path:
+            return
+        try:
+            with self._connection() as conn:
+                conn.execute(
+                    'INSERT OR REPLACE INTO recognition_cache (key, value, expires_at) VALUES (?, ?, ?)',
+                    (key, json.dumps(value), expires_at)
+                )
+                self._writes += 1
+                if self._writes % PRUNE_EVERY == 0:
+                    conn.execute('DELETE FROM recognition_cache WHERE expires_at <= ?', (time.time(),))
+        except Exception as e:
+            print(f"Recognition cache write error: {e}")
+
+    def stats(self):
+        """Hit/miss counters and ratios for /status"""
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            lookups = hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'memory_hits': self.memory_hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_ratio': round(hits / lookups, 4) if lookups else 0.0,
+                'miss_ratio': round(self.misses / lookups, 4) if lookups else 0.0,
+                'persistent': bool(self.db_path),
+            }
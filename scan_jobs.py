@@ -0,0 +1,128 @@
+"""
+Scan Jobs
+In-process job queue so slow recognitions run on background workers instead of web workers
+"""
+import os
+import queue
+import threading
+import time
+import uuid
+
+SCAN_JOB_WORKERS = int(os.environ.get('SCAN_JOB_WORKERS', '4'))
+SCAN_JOB_MAX_PENDING = int(os.environ.get('SCAN_JOB_MAX_PENDING', '100'))
+# Finished jobs are kept this long for clients to collect
+SCAN_JOB_TTL = int(os.environ.get('SCAN_JOB_TTL', '600'))
+
+
+class QueueFull(Exception):
+    pass
+
+
+class ScanJob:
+    __slots__ = ('id', 'status', 'result', 'status_code', 'created_at', 'started_at', 'finished_at', '_args', '_done')
+
+    def __init__(self, args):
+        self.id = uuid.uuid4().hex
+        self.status = 'queued'
+        self.result = None
+        self.status_code = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._args = args
+        self._done = threading.Event()
+
+    @property
+    def finished(self):
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        """Block until the job finishes; True if it did"""
+        return self._done.wait(timeout)
+
+    def to_dict(self):
+        data = {'job_id': self.id, 'status': self.status, 'created_at': self.created_at}
+        if self.started_at is not None:
+            data['queued_seconds'] = round(self.started_at - self.created_at, 3)
+        if self.finished:
+            data['run_seconds'] = round(self.finished_at - self.started_at, 3)
+            data['status_code'] = self.status_code
+            data['result'] = self.result
+        return data
+
+
+class ScanJobQueue:
+    def __init__(self, handler, workers=SCAN_JOB_WORKERS, max_pending=SCAN_JOB_MAX_PENDING, ttl=SCAN_JOB_TTL):
+        # handler(*args) returns (result, status_code), the same contract as scan_image
+        self.handler = handler
+        self.ttl = ttl
+        self._queue = queue.Queue(maxsize=max_pending)
+        self.workers = workers
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._workers = []
+
+    def _start_workers(self):
+        # Started on first use rather than at import, so a gunicorn master can preload the app and fork
+        with self._lock:
+            if self._workers:
+                return
+            self._workers = [
+                threading.Thread(target=self._work, name=f"scan-job-{i}", daemon=True) for i in range(self.workers)
+            ]
+            for worker in self._workers:
+                worker.start()
+
+    def submit(self, *args):
+        """Queue a job and return it immediately; raises QueueFull when the backlog is at its limit"""
+        self._start_workers()
+        self._prune()
+        job = ScanJob(args)
+        with self._lock:
+            self._jobs[job.id] = job
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            with self._lock:
+                del self._jobs[job.id]
+            raise QueueFull()
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            job.status = 'running'
+            job.started_at = time.time()
+            try:
+                job.result, job.status_code = self.handler(*job._args)
+                job.status = 'done' if job.status_code < 400 else 'failed'
+            except Exception as e:
+                job.result, job.status_code = {'error': f'Analysis failed: {str(e)}'}, 500
+                job.status = 'failed'
+            finally:
+                # Drop the upload as soon as it has been processed
+                job._args = None
+                job.finished_at = time.time()
+                job._done.set()
+                self._queue.task_done()
+
+    def _prune(self):
+        cutoff = time.time() - self.ttl
+        with self._lock:
+            expired = [job_id for job_id, job in self._jobs.items() if job.finished and job.finished_at < cutoff]
+            for job_id in expired:
+                del self._jobs[job_id]
+
+    def stats(self):
+        with self._lock:
+            jobs = list(self._jobs.values())
+        return {
+            'workers': self.workers,
+            'queued': sum(job.status == 'queued' for job in jobs),
+            'running': sum(job.status == 'running' for job in jobs),
+            'finished': sum(job.finished for job in jobs),
+        }
@@ -0,0 +1,84 @@
+"""
+Single Flight
+Coalesces concurrent identical work: while a call for a key is running, callers with the same key
+wait for its result instead of starting their own
+"""
+import asyncio
+import threading
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self, done):
+        self.done = done
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """For threads (the Flask app)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    def do(self, key, fn):
+        """(fn() or the in-flight call's result, True if it was shared); an exception is re-raised to every waiter"""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = self._calls[key] = _Call(threading.Event())
+                self.leaders += 1
+                leader = True
+            else:
+                self.coalesced += 1
+                leader = False
+
+        if not leader:
+            call.done.wait()
+        else:
+            try:
+                call.result = fn()
+            except BaseException as e:
+                call.error = e
+            finally:
+                # Later arrivals start a fresh call; by then the result is usually in the recognition cache
+                with self._lock:
+                    del self._calls[key]
+                call.done.set()
+
+        if call.error is not None:
+            raise call.error
+        return call.result, not leader
+
+    def stats(self):
+        with self._lock:
+            in_flight = len(self._calls)
+        return {'in_flight': in_flight, 'leaders': self.leaders, 'coalesced': self.coalesced}
+
+
+class AsyncSingleFlight(SingleFlight):
+    """For coroutines on one event loop (the ASGI app); no lock is needed between awaits"""
+
+    async def do(self, key, fn):
+        """(await fn() or the in-flight call's result, True if it was shared)"""
+        task = self._calls.get(key)
+        leader = task is None
+        if leader:
+            # Its own task, so cancelling the request that started it doesn't fail everyone waiting on it
+            task = self._calls[key] = asyncio.ensure_future(fn())
+            task.add_done_callback(lambda done: self._finished(key, done))
+            self.leaders += 1
+        else:
+            self.coalesced += 1
+        # shield: a caller that goes away (client disconnect) stops waiting without cancelling the shared call
+        return await asyncio.shield(task), not leader
+
+    def _finished(self, key, task):
+        del self._calls[key]
+        if not task.cancelled():
+            # Retrieved here too, so a failure nobody is still waiting for isn't logged as unhandled
+            task.exception()
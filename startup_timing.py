@@ -0,0 +1,91 @@
+"""
+Startup Timing
+Records how long each startup phase takes and logs the breakdown from process start to ready
+"""
+import os
+import threading
+import time
+
+
+def process_start_time():
+    """Wall-clock time the process was started, from /proc on Linux; None elsewhere"""
+    try:
+        with open('/proc/self/stat') as f:
+            # Field 22 (starttime, in clock ticks since boot) follows the parenthesised command name
+            start_ticks = int(f.read().rsplit(')', 1)[1].split()[19])
+        with open('/proc/uptime') as f:
+            uptime = float(f.read().split()[0])
+        # Both are measured from boot; /proc/stat's btime only has whole-second resolution
+        return time.time() - (uptime - start_ticks / os.sysconf('SC_CLK_TCK'))
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class _Phase:
+    __slots__ = ('timer', 'name', 'start')
+
+    def __init__(self, timer, name):
+        self.timer = timer
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.timer.record(self.name, time.perf_counter() - self.start)
+
+
+class StartupTimer:
+    def __init__(self, started_at=None):
+        # Offsets are measured on the wall clock so they line up with the process start time
+        self.started_at = started_at or process_start_time() or time.time()
+        self._last_mark = time.time()
+        # Interpreter start-up and whatever ran before this module was first imported (e.g. gunicorn)
+        self.phases = [('launch', self._last_mark - self.started_at)]
+        self.ready_after = None
+        self._lock = threading.Lock()
+
+    def phase(self, name):
+        """Context manager that records the block as a startup phase"""
+        return _Phase(self, name)
+
+    def record(self, name, seconds):
+        # Later reloads reuse the same code paths; only phases before ready belong to startup
+        with self._lock:
+            if self.ready_after is None:
+                self.phases.append((name, seconds))
+
+    def mark(self, name):
+        """Record the time since the previous mark (or since this timer was created) as a phase"""
+        now = time.time()
+        self.record(name, now - self._last_mark)
+        self._last_mark = now
+
+    def since_start(self):
+        return time.time() - self.started_at
+
+    def ready(self, label='ready'):
+        """Mark the process ready to serve and log the breakdown; only the first call counts"""
+        with self._lock:
+            if self.ready_after is not None:
+                return self.ready_after
+            self.ready_after = self.since_start()
+            phases = list(self.phases)
+        parts = ', '.join(f"{name} {seconds * 1000:.0f} ms" for name, seconds in phases)
+        print(f"✓ {label} {self.ready_after * 1000:.0f} ms after process start ({parts})")
+        return self.ready_after
+
+    def summary(self):
+        """Phase timings for /status, in milliseconds"""
+        with self._lock:
+            result = {name: round(seconds * 1000, 1) for name, seconds in self.phases}
+            ready_after = self.ready_after
+        return {
+            'ready_after_ms': round(ready_after * 1000, 1) if ready_after is not None else None,
+            'phases_ms': result,
+        }
+
+
+# Created at first import, so module imports before it are covered by the process start time
+startup = StartupTimer()
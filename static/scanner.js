@@ -0,0 +1,82 @@
+document.getElementById('cardImage').addEventListener('change', function(e) {
+    document.getElementById('scanBtn').disabled = !e.target.files[0];
+});
+
+function waitForJob(job) {
+    // Server-sent events deliver the result as soon as it is ready; polling is the fallback
+    return new Promise((resolve, reject) => {
+        const events = new EventSource(job.events_url);
+        events.addEventListener('result', e => { events.close(); resolve(JSON.parse(e.data).result); });
+        events.onerror = () => { events.close(); pollJob(job.status_url).then(resolve, reject); };
+    });
+}
+
+async function pollJob(url) {
+    while (true) {
+        const job = await (await fetch(url)).json();
+        if (job.result || job.error) return job.result || job;
+        await new Promise(resolve => setTimeout(resolve, 1000));
+    }
+}
+
+async function scanCard() {
+    const file = document.getElementById('cardImage').files[0];
+    if (!file) return;
+
+    const btn = document.getElementById('scanBtn');
+    btn.disabled = true;
+    btn.textContent = 'Analyzing...';
+
+    document.getElementById('results').innerHTML = '<div class="loading">AI analyzing card image...</div>';
+
+    const formData = new FormData();
+    formData.append('file', file);
+
+    try {
+        // Submit as a job so the server worker is not held for the whole analysis
+        const response = await fetch('/scan/jobs', { method: 'POST', body: formData });
+        const job = await response.json();
+        const result = job.job_id ? await waitForJob(job) : job;
+
+        let html = '';
+        if (result.cards?.length > 0) {
+            result.cards.forEach(card => {
+                html += `
+                    <div class="card-result">
+                        <div class="card-name">${card.name}</div>
+                        <div class="card-info">
+                            <div class="info-item">
+                                <div class="info-label">Set</div>
+                                <div class="info-value">${card.set}</div>
+                            </div>
+                            <div class="info-item">
+                                <div class="info-label">Number</div>
+                                <div class="info-value">${card.number}</div>
+                            </div>
+                            <div class="info-item">
+                                <div class="info-label">Rarity</div>
+                                <div class="info-value">${card.rarity}</div>
+                            </div>
+                            <div class="info-item">
+                                <div class="info-label">Market Price</div>
+                                <div class="info-value">${card.market_price || 'N/A'}</div>
+                            </div>
+                        </div>
+                        ${card.tcgplayer_url ? `<div style="margin-top: 1rem; text-align: center;"><a href="${card.tcgplayer_url}" target="_blank" style="color: #3498db; text-decoration: none; font-weight: bold;">View on TCGPlayer →</a></div>` : ''}
+                    </div>
+                `;
+            });
+        } else if (result.error) {
+            html = `<div class="error">${result.error}</div>`;
+        } else {
+            html = '<div class="error">No matching cards found. Try a different image or angle.</div>';
+        }
+
+        document.getElementById('results').innerHTML = html;
+    } catch (error) {
+        document.getElementById('results').innerHTML = '<div class="error">Error analyzing card. Please try again.</div>';
+    }
+
+    btn.disabled = false;
+    btn.textContent = 'Analyze Card';
+}
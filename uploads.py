@@ -0,0 +1,72 @@
+"""
+Uploads
+Size-limited reads of uploaded images, and spooled copies for scans that run after the request body is gone
+"""
+import os
+import tempfile
+
+# Largest single image accepted; phone photos are usually 2-12 MB
+SCAN_MAX_UPLOAD_BYTES = int(os.environ.get('SCAN_MAX_UPLOAD_BYTES', str(20 * 2**20)))
+# Largest request body, batches included
+SCAN_MAX_REQUEST_BYTES = int(os.environ.get('SCAN_MAX_REQUEST_BYTES', str(256 * 2**20)))
+# Spooled uploads up to this size stay in memory; larger ones spill to a temporary file
+UPLOAD_SPOOL_BYTES = int(os.environ.get('UPLOAD_SPOOL_BYTES', str(2**20)))
+COPY_CHUNK_BYTES = 64 * 1024
+
+
+def megabytes(size):
+    return f'{size / 2**20:.3g} MB'
+
+
+class UploadTooLarge(ValueError):
+    def __init__(self, limit=SCAN_MAX_UPLOAD_BYTES):
+        super().__init__(f'Image too large: at most {megabytes(limit)} per image')
+        self.limit = limit
+
+
+def read_limited(stream, limit=SCAN_MAX_UPLOAD_BYTES):
+    """The whole stream as bytes; raises UploadTooLarge without reading past limit + 1 bytes"""
+    data = stream.read(limit + 1)
+    if len(data) > limit:
+        raise UploadTooLarge(limit)
+    return data
+
+
+class SpooledUpload:
+    """An upload copied out of the request into a spooled temporary file, read when its scan runs"""
+
+    def __init__(self, file, size):
+        self.file = file
+        self.size = size
+
+    def read(self):
+        self.file.seek(0)
+        return self.file.read()
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def spool_upload(stream, limit=SCAN_MAX_UPLOAD_BYTES, spool_bytes=UPLOAD_SPOOL_BYTES):
+    """Copy a stream into a SpooledUpload in chunks, so a large image never sits whole in memory"""
+    spooled = tempfile.SpooledTemporaryFile(max_size=spool_bytes)
+    try:
+        size = 0
+        while True:
+            chunk = stream.read(COPY_CHUNK_BYTES)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > limit:
+                raise UploadTooLarge(limit)
+            spooled.write(chunk)
+    except BaseException:
+        spooled.close()
+        raise
+    return SpooledUpload(spooled, size)
@@ -0,0 +1,324 @@
+"""
+Upstream
+Outbound HTTP to OpenAI and Google Sheets: pooled keep-alive sessions with timeouts, a token-bucket rate limit
+that backs off when the service answers 429, and a circuit breaker that fails fast while the service is down
+"""
+import asyncio
+import os
+import threading
+import time
+
+# OpenAI requests per minute for this process; size it to the account's quota divided by the worker count
+OPENAI_REQUESTS_PER_MINUTE = float(os.environ.get('OPENAI_REQUESTS_PER_MINUTE', '500'))
+OPENAI_BURST = int(os.environ.get('OPENAI_BURST', '20'))
+OPENAI_TIMEOUT = float(os.environ.get('OPENAI_TIMEOUT', '60'))
+SHEETS_TIMEOUT = float(os.environ.get('SHEETS_TIMEOUT', '60'))
+# Longest a call waits for the rate limit before giving up
+UPSTREAM_MAX_WAIT = float(os.environ.get('UPSTREAM_MAX_WAIT', '10'))
+# Consecutive failures (connection errors, timeouts, 5xx) that open the circuit, and how long it stays open
+CIRCUIT_FAILURE_THRESHOLD = int(os.environ.get('CIRCUIT_FAILURE_THRESHOLD', '5'))
+CIRCUIT_RESET_SECONDS = float(os.environ.get('CIRCUIT_RESET_SECONDS', '30'))
+POOL_SIZE = int(os.environ.get('UPSTREAM_POOL_SIZE', '32'))
+# A 429 is retried this many times, as long as the wait fits in UPSTREAM_MAX_WAIT
+RATE_LIMIT_RETRIES = 2
+# 429s for calls that were already in flight when the rate was cut don't cut it again
+THROTTLE_WINDOW = 1.0
+
+
+class UpstreamError(Exception):
+    """The call was not made or not answered; retry_after is a hint in seconds"""
+
+    def __init__(self, message, retry_after=None, status_code=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+        # The HTTP status the service answered with, if it answered
+        self.status_code = status_code
+
+
+class RateLimited(UpstreamError):
+    pass
+
+
+class UpstreamUnavailable(UpstreamError):
+    pass
+
+
+def retry_after_seconds(headers):
+    """Retry-After as seconds, when the service sent it as a number"""
+    try:
+        return max(float(headers.get('retry-after')), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """rate calls per second with bursts of up to burst. A 429 cuts the rate by 30% (at most once per
+    THROTTLE_WINDOW) and pauses calls; each success then restores a twentieth of the configured rate"""
+
+    def __init__(self, rate, burst):
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.throttled_at = 0.0
+        self.consecutive_throttles = 0
+        self.throttles = 0
+        self._lock = threading.Lock()
+
+    def _fill(self, now):
+        self.tokens = min(self.tokens + (now - self.updated) * self.rate, self.burst)
+        self.updated = now
+
+    def reserve(self, max_wait=UPSTREAM_MAX_WAIT):
+        """Take a token; returns (True, seconds to wait before using it), or (False, seconds until one would
+        be free) without taking it when that is longer than max_wait"""
+        with self._lock:
+            now = time.monotonic()
+            self._fill(now)
+            self.tokens -= 1
+            wait = max(self.paused_until - now, -self.tokens / self.rate if self.tokens < 0 else 0.0)
+            if wait > max_wait:
+                self.tokens += 1
+                return False, wait
+            return True, wait
+
+    def throttle(self, retry_after=None):
+        """The service answered 429: slow down, and pause for Retry-After (or an exponential backoff)"""
+        with self._lock:
+            now = time.monotonic()
+            self._fill(now)
+            self.consecutive_throttles += 1
+            self.throttles += 1
+            if now - self.throttled_at >= THROTTLE_WINDOW:
+                self.throttled_at = now
+                self.rate = max(self.rate * 0.7, self.max_rate / 16)
+            pause = retry_after if retry_after is not None else min(2 ** (self.consecutive_throttles - 1), 60)
+            self.paused_until = max(self.paused_until, now + pause)
+            self.tokens = min(self.tokens, 0.0)
+            return pause
+
+    def recover(self):
+        with self._lock:
+            self.consecutive_throttles = 0
+            if self.rate < self.max_rate:
+                self._fill(time.monotonic())
+                self.rate = min(self.rate + self.max_rate / 20, self.max_rate)
+
+
+class CircuitBreaker:
+    """Closed: calls go through. Open: calls fail at once. After reset_timeout, one probe call is let through
+    (half open); its success closes the circuit and its failure opens it again"""
+
+    def __init__(self, failure_threshold=CIRCUIT_FAILURE_THRESHOLD, reset_timeout=CIRCUIT_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """True if a call may be made now"""
+        with self._lock:
+            if self.state == 'open' and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = 'half_open'
+                self._probing = False
+            if self.state == 'half_open':
+                if self._probing:
+                    return False
+                self._probing = True
+            return self.state != 'open'
+
+    def retry_after(self):
+        return max(self.reset_timeout - (time.monotonic() - self.opened_at), 0.0)
+
+    def release(self):
+        """The call ended without telling whether the service works; let another probe through"""
+        with self._lock:
+            self._probing = False
+
+    def record_success(self):
+        with self._lock:
+            self.state = 'closed'
+            self.failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == 'half_open' or self.failures >= self.failure_threshold:
+                if self.state != 'open':
+                    self.times_opened += 1
+                self.state = 'open'
+                self.opened_at = time.monotonic()
+                self._probing = False
+
+
+class Upstream:
+    """One outbound service. request() is for threads (requests); arequest() for coroutines (an httpx.AsyncClient)"""
+
+    def __init__(self, name, timeout, rate=None, burst=1, max_wait=UPSTREAM_MAX_WAIT, pool_size=POOL_SIZE):
+        self.name = name
+        self.timeout = timeout
+        self.limiter = TokenBucket(rate, burst) if rate else None
+        self.breaker = CircuitBreaker()
+        self.max_wait = max_wait
+        self.pool_size = pool_size
+        self._session = None
+        self._session_pid = None
+        self._session_lock = threading.Lock()
+
+    def session(self):
+        """requests.Session kept for the life of the process (a fresh one after fork) so connections are reused"""
+        if self._session is None or self._session_pid != os.getpid():
+            with self._session_lock:
+                if self._session is None or self._session_pid != os.getpid():
+                    import requests
+                    from requests.adapters import HTTPAdapter
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self.pool_size)
+                    session.mount('https://', adapter)
+                    session.mount('http://', adapter)
+                    self._session = session
+                    self._session_pid = os.getpid()
+        return self._session
+
+    def _admit(self):
+        """Seconds to wait before calling; raises UpstreamError if the call must not be made"""
+        # The breaker goes first, so calls refused while the circuit is open don't use up rate-limit budget
+        if not self.breaker.allow():
+            retry_after = self.breaker.retry_after()
+            raise UpstreamUnavailable(f'{self.name} is unavailable; try again in {retry_after:.0f}s',
+                                      retry_after=retry_after)
+        wait = 0.0
+        if self.limiter is not None:
+            admitted, wait = self.limiter.reserve(self.max_wait)
+            if not admitted:
+                # Hand back a half-open probe slot this call will not use
+                self.breaker.release()
+                raise RateLimited(f'{self.name} rate limit reached; try again in {max(wait, 1):.0f}s', retry_after=wait)
+        return wait
+
+    def _answered(self, status_code, headers, attempt):
+        """Record a response; returns None to use it, or the seconds to back off before retrying a 429"""
+        if status_code >= 500:
+            self.breaker.record_failure()
+            return None
+        self.breaker.record_success()
+        if status_code != 429:
+            if self.limiter is not None:
+                self.limiter.recover()
+            return None
+        pause = retry_after_seconds(headers)
+        if self.limiter is not None:
+            pause = self.limiter.throttle(pause)
+        elif pause is None:
+            pause = 2.0 ** attempt
+        if attempt >= RATE_LIMIT_RETRIES or pause > self.max_wait:
+            raise RateLimited(f'{self.name} rate limit reached; try again in {max(pause, 1):.0f}s', retry_after=pause,
+                              status_code=429)
+        return pause
+
+    def request(self, method, url, **kwargs):
+        """session.request() with the timeout, rate limit and circuit breaker applied"""
+        import requests
+
+        kwargs.setdefault('timeout', self.timeout)
+        body = kwargs.get('data')
+        pause = 0.0
+        for attempt in range(RATE_LIMIT_RETRIES + 1):
+            wait = max(self._admit(), pause)
+            if wait > 0:
+                time.sleep(wait)
+            if attempt and hasattr(body, 'seek'):
+                body.seek(0)
+            try:
+                response = self.session().request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                self.breaker.record_failure()
+                raise UpstreamUnavailable(f'{self.name} request failed: {e}') from e
+            except BaseException:
+                self.breaker.release()
+                raise
+            pause = self._answered(response.status_code, response.headers, attempt)
+            if pause is None:
+                return response
+
+    def call(self, fn, *args, **kwargs):
+        """fn(*args, **kwargs) for a client library that makes its own requests (gspread), under the same rate
+        limit and circuit breaker; its errors are re-raised as they are, and a 429 is not retried"""
+        import requests
+
+        wait = self._admit()
+        if wait > 0:
+            time.sleep(wait)
+        try:
+            result = fn(*args, **kwargs)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            self.breaker.record_failure()
+            raise UpstreamUnavailable(f'{self.name} request failed: {e}') from e
+        except Exception as e:
+            response = getattr(e, 'response', None)
+            status_code = getattr(response, 'status_code', None)
+            if isinstance(status_code, int):
+                # The service answered: let the breaker and limiter see it, but keep the library's error
+                try:
+                    self._answered(status_code, response.headers, RATE_LIMIT_RETRIES)
+                except RateLimited:
+                    pass
+            else:
+                self.breaker.release()
+            raise
+        except BaseException:
+            self.breaker.release()
+            raise
+        self._answered(200, {}, 0)
+        return result
+
+    async def arequest(self, client, method, url, content=None, **kwargs):
+        """client.request() with the same limits; content may be a callable building a fresh body per attempt"""
+        import httpx
+
+        kwargs.setdefault('timeout', self.timeout)
+        pause = 0.0
+        for attempt in range(RATE_LIMIT_RETRIES + 1):
+            wait = max(self._admit(), pause)
+            if wait > 0:
+                await asyncio.sleep(wait)
+            try:
+                response = await client.request(method, url, content=content() if callable(content) else content,
+                                                **kwargs)
+            except httpx.TransportError as e:
+                self.breaker.record_failure()
+                raise UpstreamUnavailable(f'{self.name} request failed: {e!r}') from e
+            except BaseException:
+                self.breaker.release()
+                raise
+            pause = self._answered(response.status_code, response.headers, attempt)
+            if pause is None:
+                return response
+
+    def stats(self):
+        """Upstream details for /status"""
+        result = {
+            'circuit': self.breaker.state,
+            'consecutive_failures': self.breaker.failures,
+            'circuit_opened': self.breaker.times_opened,
+            'timeout': self.timeout,
+        }
+        if self.limiter is not None:
+            result.update({
+                'rate_per_minute': round(self.limiter.rate * 60, 1),
+                'configured_rate_per_minute': round(self.limiter.max_rate * 60, 1),
+                'throttled': self.limiter.throttles,
+            })
+        return result
+
+
+openai_api = Upstream('OpenAI', OPENAI_TIMEOUT, rate=OPENAI_REQUESTS_PER_MINUTE / 60, burst=OPENAI_BURST)
+google_sheets = Upstream('Google Sheets', SHEETS_TIMEOUT)
+upstreams = (openai_api, google_sheets)
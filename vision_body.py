@@ -0,0 +1,74 @@
+"""
+Vision Body
+The OpenAI vision request body written to a spooled temporary file, base64-encoding the image in chunks,
+so no full-size base64 string, data URL or JSON encoding of the image is ever held in memory
+"""
+import asyncio
+import base64
+import json
+import os
+import tempfile
+
+# Bodies up to this size stay in memory; larger ones spill to a temporary file
+VISION_BODY_SPOOL_BYTES = int(os.environ.get('VISION_BODY_SPOOL_BYTES', str(2**20)))
+# A multiple of 3, so every chunk encodes to whole base64 groups with no padding mid-stream
+ENCODE_CHUNK_BYTES = 3 * 2**14
+READ_CHUNK_BYTES = 64 * 1024
+IMAGE_URL_PLACEHOLDER = '__IMAGE_DATA_URL__'
+
+
+class VisionBody:
+    """A JSON request body whose image data URL is written incrementally.
+    requests reads it as a file (Content-Length from len()); httpx iterates it or aiter_bytes()"""
+
+    def __init__(self, payload, image, mime_type, spool_bytes=VISION_BODY_SPOOL_BYTES):
+        # payload holds IMAGE_URL_PLACEHOLDER where the data URL goes
+        prefix, suffix = json.dumps(payload).split(IMAGE_URL_PLACEHOLDER)
+        self.file = tempfile.SpooledTemporaryFile(max_size=spool_bytes)
+        self.file.write(f'{prefix}data:{mime_type};base64,'.encode('utf-8'))
+        view = memoryview(image)
+        for start in range(0, len(view), ENCODE_CHUNK_BYTES):
+            self.file.write(base64.b64encode(view[start:start + ENCODE_CHUNK_BYTES]))
+        self.file.write(suffix.encode('utf-8'))
+        self.length = self.file.tell()
+        # Past spool_bytes the body is on disk, and reading it would block an event loop
+        self.on_disk = self.length > spool_bytes
+        self.file.seek(0)
+
+    def __len__(self):
+        return self.length
+
+    def read(self, size=-1):
+        return self.file.read(size)
+
+    def seek(self, offset, whence=0):
+        """Rewinds the body when a rate-limited call is retried"""
+        return self.file.seek(offset, whence)
+
+    def __iter__(self):
+        self.file.seek(0)
+        return iter(lambda: self.file.read(READ_CHUNK_BYTES), b'')
+
+    async def aiter_bytes(self):
+        """For httpx.AsyncClient, which treats any plain iterable as a sync stream. Reads from disk run
+        in the default executor"""
+        if not self.on_disk:
+            for chunk in self:
+                yield chunk
+            return
+        loop = asyncio.get_running_loop()
+        self.file.seek(0)
+        while True:
+            chunk = await loop.run_in_executor(None, self.file.read, READ_CHUNK_BYTES)
+            if not chunk:
+                return
+            yield chunk
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
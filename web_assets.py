@@ -0,0 +1,67 @@
+"""
+Web Assets
+Pages and static files prepared once: fingerprinted asset URLs, gzipped copies and ETags,
+so serving them is a header check and a memory copy
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+from werkzeug.http import parse_accept_header, parse_etags
+
+# Fingerprinted URLs change whenever the file does, so browsers may keep them for a year
+ASSET_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+# Pages embed live counts, so browsers revalidate them; unchanged pages cost a 304
+PAGE_CACHE_CONTROL = 'no-cache'
+
+
+class PreparedBody:
+    """A response body with its gzipped copy and content hash"""
+    __slots__ = ('body', 'gzipped', 'etag', 'content_type')
+
+    def __init__(self, body, content_type):
+        self.body = body
+        gzipped = gzip.compress(body, compresslevel=9, mtime=0)
+        self.gzipped = gzipped if len(gzipped) < len(body) else None
+        self.etag = hashlib.sha256(body).hexdigest()[:16]
+        self.content_type = content_type
+
+
+def conditional_response(prepared, accept_encoding, if_none_match, cache_control):
+    """(status, body, headers) for a PreparedBody given the request's Accept-Encoding and If-None-Match"""
+    gzipped = prepared.gzipped is not None and parse_accept_header(accept_encoding).quality('gzip') > 0
+    etag = f'{prepared.etag}-gz' if gzipped else prepared.etag
+    headers = {'ETag': f'"{etag}"', 'Cache-Control': cache_control, 'Vary': 'Accept-Encoding'}
+    if parse_etags(if_none_match).contains_weak(etag):
+        return 304, b'', headers
+    headers['Content-Type'] = prepared.content_type
+    if gzipped:
+        headers['Content-Encoding'] = 'gzip'
+    return 200, prepared.gzipped if gzipped else prepared.body, headers
+
+
+class AssetBundle:
+    """Every file in a directory, served at /<prefix>/<stem>.<hash>.<ext>"""
+
+    def __init__(self, directory, url_prefix='/assets'):
+        self.urls = {}
+        self.files = {}
+        if not os.path.isdir(directory):
+            return
+        for name in sorted(os.listdir(directory)):
+            path = os.path.join(directory, name)
+            if not os.path.isfile(path):
+                continue
+            with open(path, 'rb') as f:
+                body = f.read()
+            content_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+            if content_type.startswith('text/') or content_type.endswith('javascript'):
+                content_type += '; charset=utf-8'
+            prepared = PreparedBody(body, content_type)
+            stem, ext = os.path.splitext(name)
+            fingerprinted = f'{stem}.{prepared.etag[:10]}{ext}'
+            self.urls[name] = f'{url_prefix}/{fingerprinted}'
+            self.files[fingerprinted] = prepared
+
+    def get(self, fingerprinted):
+        return self.files.get(fingerprinted)